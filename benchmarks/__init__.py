@@ -0,0 +1,6 @@
+"""Benchmarks for loading, querying and writing the NEO data set.
+
+Each module can be run from the project root, for example:
+
+    $ python3 -m benchmarks.bench_memory
+"""
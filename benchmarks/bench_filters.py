@@ -0,0 +1,60 @@
+"""Measure the cost per row of applying a collection of filters.
+
+For each of the benchmark queries (see `benchmarks.run`), every close
+approach of a synthetic data set, linked to its NEO, is checked against the
+query's filters: once by calling each filter in turn, and once with the
+single predicate compiled by `create_filters(..., compiled=True)`.
+
+To run this benchmark from the project root, run:
+
+    $ python3 -m benchmarks.bench_filters [--scale 10]
+"""
+import argparse
+import pathlib
+import tempfile
+import time
+
+from benchmarks.generate import generate
+from benchmarks.run import QUERIES
+from database import NEODatabase
+from extract import load_data
+from filters import create_filters
+
+
+def best_time(function, repeat):
+    """Return the best wall-clock time of `repeat` calls to `function`."""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    """Run the benchmark and print nanoseconds per row for both predicates."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--scale', type=float, default=10,
+                        help="The size of the data, where 100 is the full data set.")
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        neos, approaches = load_data(*generate(pathlib.Path(workdir), scale=args.scale))
+    NEODatabase(neos, approaches)
+
+    print(f"{'query':<30} {'per filter':>12} {'compiled':>12} {'speedup':>8}")
+    for name, criteria in QUERIES.items():
+        filters = create_filters(**criteria)
+        compiled = create_filters(**criteria, compiled=True)
+        each = best_time(lambda: [all(filt(approach) for filt in filters)
+                                  for approach in approaches], args.repeat)
+        fused = best_time(lambda: list(map(compiled.predicate, approaches)),
+                          args.repeat)
+        per_row = 1e9 / len(approaches)
+        print(f"{name:<30} {each * per_row:9.0f} ns {fused * per_row:9.0f} ns "
+              f"{each / fused:7.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,51 @@
+"""Compare sequential and concurrent loading of the two data files.
+
+To run this benchmark from the project root, run:
+
+    $ python3 -m benchmarks.bench_load [--neofile data/neos.csv] [--cadfile data/cad.json]
+"""
+import argparse
+import os
+import pathlib
+import time
+
+from extract import load_data
+
+
+PROJECT_ROOT = pathlib.Path(__file__).parent.parent.resolve()
+TEST_NEO_FILE = PROJECT_ROOT / 'tests' / 'test-neos-2020.csv'
+TEST_CAD_FILE = PROJECT_ROOT / 'tests' / 'test-cad-2020.json'
+
+
+def best_wall_time(function, repeat):
+    """Return the best wall-clock time of `repeat` calls to `function`."""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    """Run the benchmark and print the wall-clock time of each load path."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--neofile', type=pathlib.Path, default=TEST_NEO_FILE)
+    parser.add_argument('--cadfile', type=pathlib.Path, default=TEST_CAD_FILE)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    timings = {}
+    for label, parallel in (('sequential', False), ('parallel', True)):
+        timings[label] = best_wall_time(
+            lambda: load_data(args.neofile, args.cadfile, parallel=parallel),
+            args.repeat)
+
+    print(f"{os.cpu_count()} CPUs")
+    for label, seconds in timings.items():
+        print(f"  {label:<10}: {seconds:7.3f} s")
+    print(f"  saving    : {1 - timings['parallel'] / timings['sequential']:7.1%}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,74 @@
+"""Measure the memory used per near-Earth object and close approach.
+
+The compact `__slots__` models are compared against the previous
+representation: plain `__dict__` objects holding a full `datetime` and their
+own copy of the designation string.
+
+To run this benchmark from the project root, run:
+
+    $ python3 -m benchmarks.bench_memory [--cadfile data/cad.json]
+"""
+import argparse
+import gc
+import pathlib
+import tracemalloc
+
+from database import NEODatabase
+from extract import iter_approach_rows, load_neos, load_approaches
+from helpers import cd_to_datetime
+
+
+PROJECT_ROOT = pathlib.Path(__file__).parent.parent.resolve()
+TEST_NEO_FILE = PROJECT_ROOT / 'tests' / 'test-neos-2020.csv'
+TEST_CAD_FILE = PROJECT_ROOT / 'tests' / 'test-cad-2020.json'
+
+
+class DictCloseApproach:
+    """The previous, `__dict__`-based shape of a `CloseApproach`."""
+
+    def __init__(self, **info):
+        self._designation = ''.join(info['des'])
+        self.time = cd_to_datetime(info['cd'])
+        self.distance = float(info['dist'])
+        self.velocity = float(info['v_rel'])
+        self.neo = None
+
+
+def traced_size(build):
+    """Return the result of `build()` and the bytes it keeps allocated."""
+    gc.collect()
+    tracemalloc.start()
+    try:
+        result = build()
+        gc.collect()
+        size, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return result, size
+
+
+def main():
+    """Run the benchmark and print bytes per object for both representations."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--neofile', type=pathlib.Path, default=TEST_NEO_FILE)
+    parser.add_argument('--cadfile', type=pathlib.Path, default=TEST_CAD_FILE)
+    args = parser.parse_args()
+
+    # Parse the rows up front so that only the objects themselves are traced.
+    rows = list(iter_approach_rows(args.cadfile))
+    old, old_size = traced_size(lambda: [DictCloseApproach(**row) for row in rows])
+    del old, rows
+
+    neos = load_neos(args.neofile)
+    new, new_size = traced_size(lambda: load_approaches(args.cadfile))
+    NEODatabase(neos, new)
+
+    count = len(new)
+    print(f"{count} close approaches")
+    print(f"  __dict__ + datetime: {old_size / count:8.1f} bytes/approach")
+    print(f"  __slots__ + minutes: {new_size / count:8.1f} bytes/approach")
+    print(f"  saving:              {1 - new_size / old_size:8.1%}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,83 @@
+"""Compare the SQLite backend against the in-memory `NEODatabase`.
+
+On a synthetic data set, this measures the one-time import into SQLite
+against building the in-memory database from the data files, the start-up of
+a process that reuses the SQLite file, and then each query of the benchmark
+suite, both to completion and limited to its first 10 results, plus the
+`--count` and `--stats` aggregates.
+
+To run this benchmark from the project root, run:
+
+    $ python3 -m benchmarks.bench_sqlite [--scale 100]
+"""
+import argparse
+import pathlib
+import tempfile
+import time
+
+from benchmarks.generate import generate
+from benchmarks.run import QUERIES
+from database import NEODatabase
+from extract import load_data
+from filters import create_filters, limit
+from sqlite_database import SQLiteNEODatabase, import_data
+
+
+def best_time(function, repeat):
+    """Return the best wall-clock time in seconds of `repeat` calls."""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    """Run the benchmark and print a table of timings for both backends."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--scale', type=float, default=100,
+                        help="The size of the data, where 100 is the full data set.")
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        workdir = pathlib.Path(workdir)
+        neofile, cadfile = generate(workdir, scale=args.scale)
+        path = workdir / 'neos.sqlite'
+
+        print(f"{'case':<40} {'memory':>10} {'sqlite':>10}")
+
+        def report(name, memory_s, sqlite_s):
+            print(f"{name:<40} {memory_s * 1000:8.1f}ms {sqlite_s * 1000:8.1f}ms")
+
+        report('build / import',
+               best_time(lambda: NEODatabase(*load_data(neofile, cadfile)), 1),
+               best_time(lambda: import_data(path, neofile, cadfile), 1))
+        memory = NEODatabase(*load_data(neofile, cadfile))
+        report('start-up (build / open)',
+               best_time(lambda: NEODatabase(*load_data(neofile, cadfile)), 1),
+               best_time(lambda: SQLiteNEODatabase(path).close(), args.repeat))
+        sqlite = SQLiteNEODatabase(path)
+
+        for name, criteria in QUERIES.items():
+            filters = create_filters(**criteria)
+            report(name,
+                   best_time(lambda: list(memory.query(filters)), args.repeat),
+                   best_time(lambda: list(sqlite.query(filters)), args.repeat))
+            report(f'{name} (limit 10)',
+                   best_time(lambda: list(limit(memory.query(filters), 10)), args.repeat),
+                   best_time(lambda: list(limit(sqlite.query(filters), 10)), args.repeat))
+
+        close = create_filters(**QUERIES['query_decade_close'])
+        report('count_decade_close',
+               best_time(lambda: memory.count(close), args.repeat),
+               best_time(lambda: sqlite.count(close), args.repeat))
+        report('stats_decade_close',
+               best_time(lambda: memory.stats(close), args.repeat),
+               best_time(lambda: sqlite.stats(close), args.repeat))
+        sqlite.close()
+
+
+if __name__ == '__main__':
+    main()
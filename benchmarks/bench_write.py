@@ -0,0 +1,63 @@
+"""Measure the throughput of exporting close approaches to CSV.
+
+The batched `write_to_csv` is compared against a reference writer that
+formats and writes one row at a time. By default, the export covers every
+close approach of a synthetic data set the size of the full NASA data.
+
+To run this benchmark from the project root, run:
+
+    $ python3 -m benchmarks.bench_write [--scale 100]
+"""
+import argparse
+import csv
+import pathlib
+import tempfile
+import time
+
+from benchmarks.generate import generate
+from database import NEODatabase
+from extract import load_data
+from filters import create_filters
+from write import write_to_csv
+
+
+def write_row_by_row(results, filename):
+    """Write results to CSV with one `writerow` call per approach."""
+    with open(filename, 'w', newline='') as csvfile:
+        writer = csv.writer(csvfile)
+        writer.writerow(('datetime_utc', 'distance_au', 'velocity_km_s',
+                         'designation', 'name', 'diameter_km',
+                         'potentially_hazardous'))
+        for res in results:
+            writer.writerow((res.time_str, res.distance, res.velocity,
+                             res._designation, res.neo.name or '',
+                             res.neo.diameter, res.neo.hazardous))
+
+
+def main():
+    """Run the benchmark and print rows per second for both writers."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--scale', type=float, default=100,
+                        help="The size of the data, where 100 is the full data set.")
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        workdir = pathlib.Path(workdir)
+        database = NEODatabase(*load_data(*generate(workdir, scale=args.scale)))
+        results = list(database.query(create_filters()))
+
+        for label, writer in (('row by row', write_row_by_row),
+                              ('batched', write_to_csv)):
+            outfile = workdir / f'{label.replace(" ", "-")}.csv'
+            best = float('inf')
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                writer(results, outfile)
+                best = min(best, time.perf_counter() - start)
+            print(f"{label:<11}: {len(results) / best:12,.0f} rows/s "
+                  f"({best:.3f} s for {len(results)} rows)")
+
+
+if __name__ == '__main__':
+    main()
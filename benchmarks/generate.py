@@ -0,0 +1,157 @@
+"""Generate synthetic `neos.csv` and `cad.json` files at a chosen scale.
+
+The generated files have the same layout as NASA's: the 75-column NEO CSV
+file (with other columns copied from rows of the test data set) and the close
+approach JSON payload with its `fields` header and chronologically ordered
+`data` rows. The distributions roughly follow the full data set - most NEOs
+have provisional designations and no name, few have a known diameter, about
+one in ten is potentially hazardous, and a few NEOs have many approaches.
+
+Scale 1 is 1% of the full data set; scale 100 is about its full size
+(24,000 NEOs and 406,800 close approaches).
+
+To generate a pair of files from the project root, run:
+
+    $ python3 -m benchmarks.generate --scale 10 --outdir /tmp/neo-10x
+"""
+import argparse
+import csv
+import datetime
+import json
+import pathlib
+import random
+
+from helpers import EPOCH
+
+
+PROJECT_ROOT = pathlib.Path(__file__).parent.parent.resolve()
+TEMPLATE_NEO_FILE = PROJECT_ROOT / 'tests' / 'test-neos-2020.csv'
+
+UNIT_NEOS = 240
+UNIT_APPROACHES = 4068
+
+CAD_FIELDS = ['des', 'orbit_id', 'jd', 'cd', 'dist', 'dist_min', 'dist_max',
+              'v_rel', 'v_inf', 't_sigma_f', 'h']
+_MONTHS = ('Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun',
+           'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec')
+_LETTERS = 'ABCDEFGHJKLMNOPQRSTUVWXY'
+_FIRST_MINUTE = (datetime.datetime(1900, 1, 1) - EPOCH) // datetime.timedelta(minutes=1)
+_LAST_MINUTE = (datetime.datetime(2100, 1, 1) - EPOCH) // datetime.timedelta(minutes=1)
+_JD_EPOCH = 2440587.5
+
+
+def _designations(count, rng):
+    """Return `count` unique designations, numbered and provisional."""
+    designations = []
+    seen = set()
+    number = 1000
+    while len(designations) < count:
+        if rng.random() < 0.3:
+            number += rng.randint(1, 50)
+            designation = str(number)
+        else:
+            designation = (f"{rng.randint(1950, 2020)} "
+                           f"{rng.choice(_LETTERS)}{rng.choice(_LETTERS)}"
+                           f"{rng.randint(0, 300) or ''}")
+        if designation not in seen:
+            seen.add(designation)
+            designations.append(designation)
+    return designations
+
+
+def write_neos(path, designations, rng):
+    """Write a NEO CSV file with one row per designation."""
+    with open(TEMPLATE_NEO_FILE) as template:
+        reader = csv.DictReader(template)
+        fieldnames = reader.fieldnames
+        templates = list(reader)
+
+    with open(path, 'w', newline='') as neocsv:
+        writer = csv.DictWriter(neocsv, fieldnames=fieldnames)
+        writer.writeheader()
+        for index, designation in enumerate(designations):
+            row = dict(rng.choice(templates))
+            name = f"Synth{index}" if rng.random() < 0.015 else ''
+            row.update({
+                'id': f"a{index:07d}", 'spkid': str(2000000 + index),
+                'full_name': f"{designation} {name}".strip(),
+                'pdes': designation, 'name': name,
+                'pha': 'Y' if rng.random() < 0.09 else 'N',
+                'diameter': (f"{rng.lognormvariate(-0.5, 1.0):.3f}"
+                             if rng.random() < 0.05 else ''),
+            })
+            writer.writerow(row)
+
+
+def _approach_row(designation, minute, rng):
+    """Return the JSON row of one close approach."""
+    when = EPOCH + datetime.timedelta(minutes=minute)
+    distance = rng.uniform(0.0001, 0.5) ** 1.5 * 1.4
+    spread = distance * rng.uniform(0.0, 0.01)
+    velocity = rng.gammavariate(4.0, 3.5)
+    hours = rng.choice((0, 0, 0, 1, 13, 50))
+    t_sigma_f = ('< 00:01' if not hours else
+                 f"{hours // 24}_{hours % 24:02d}:{rng.randint(0, 59):02d}"
+                 if hours >= 24 else f"{hours:02d}:{rng.randint(0, 59):02d}")
+    return [
+        designation, str(rng.randint(1, 300)),
+        f"{_JD_EPOCH + minute / 1440:.9f}",
+        f"{when.year:04d}-{_MONTHS[when.month - 1]}-{when.day:02d} "
+        f"{when.hour:02d}:{when.minute:02d}",
+        repr(distance), repr(distance - spread), repr(distance + spread),
+        repr(velocity), repr(max(velocity - rng.uniform(0, 0.5), 0.0)),
+        t_sigma_f, f"{rng.uniform(15, 30):.1f}",
+    ]
+
+
+def write_approaches(path, designations, count, rng):
+    """Write a close approach JSON file of `count` chronological rows."""
+    # A Pareto weight gives a few NEOs many approaches, as in the real data.
+    weights = [rng.paretovariate(1.5) for _ in designations]
+    owners = rng.choices(designations, weights=weights, k=count)
+    minutes = sorted(rng.randrange(_FIRST_MINUTE, _LAST_MINUTE)
+                     for _ in range(count))
+
+    with open(path, 'w') as jfile:
+        jfile.write('{"signature":{"source":"Synthetic NEO benchmark data",'
+                    '"version":"1.1"},')
+        jfile.write(f'"count":"{count}","fields":{json.dumps(CAD_FIELDS)},')
+        jfile.write('"data":[')
+        for index, (designation, minute) in enumerate(zip(owners, minutes)):
+            if index:
+                jfile.write(',')
+            jfile.write(json.dumps(_approach_row(designation, minute, rng)))
+        jfile.write(']}')
+
+
+def generate(outdir, scale=1, seed=0):
+    """Generate a `neos.csv` and `cad.json` pair in a directory.
+
+    :param outdir: A Path to the directory to write the files into.
+    :param scale: The size of the data, where 100 is the full data set.
+    :param seed: The seed of the random generator, for reproducible data.
+    :return: A tuple of the Paths of the NEO and close approach files.
+    """
+    rng = random.Random(seed)
+    outdir.mkdir(parents=True, exist_ok=True)
+    neofile, cadfile = outdir / 'neos.csv', outdir / 'cad.json'
+    designations = _designations(int(UNIT_NEOS * scale), rng)
+    write_neos(neofile, designations, rng)
+    write_approaches(cadfile, designations, int(UNIT_APPROACHES * scale), rng)
+    return neofile, cadfile
+
+
+def main():
+    """Generate a pair of data files as specified at the command line."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--scale', type=float, default=1,
+                        help="The size of the data, where 100 is the full data set.")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--outdir', type=pathlib.Path, required=True)
+    args = parser.parse_args()
+    for path in generate(args.outdir, args.scale, args.seed):
+        print(path)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,165 @@
+"""Load-test a running query server and report its throughput and latency.
+
+A number of concurrent clients each keep one connection open to the server
+(see `server.py`) and send requests, taken in turn from a list of request
+paths, until the total number of requests is reached. Every response is
+read in full. The throughput in requests per second and the 50th and 99th
+percentile latencies are reported, overall and per path.
+
+To run a load test from the project root, start a server and run:
+
+    $ python3 main.py serve --port 8000 &
+    $ python3 -m benchmarks.load_test --url http://127.0.0.1:8000 --concurrency 16
+    $ python3 -m benchmarks.load_test --path '/query?hazardous=true&limit=100' --requests 500
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import sys
+import time
+import urllib.parse
+
+
+# A mix of requests resembling those of the benchmark queries in
+# `benchmarks.run`.
+PATHS = [
+    '/inspect?pdes=433',
+    '/inspect?name=Halley&verbose=1',
+    '/query?date=2020-03-02',
+    '/query?start_date=2020-01-01&end_date=2029-12-31&distance_max=0.05&limit=100',
+    '/query?hazardous=true&distance_max=0.05&velocity_min=30',
+    '/query?start_date=2020-01-01&end_date=2029-12-31&distance_max=0.05&count=1',
+    '/query?hazardous=false&stats=1',
+    '/query?sort_by=distance&limit=20',
+]
+
+
+async def _read_response(reader):
+    """Read one HTTP response in full.
+
+    :return: A tuple of the status code and the length of the body.
+    """
+    status_line = await reader.readline()
+    if not status_line:
+        raise ConnectionError("The server closed the connection.")
+    status = int(status_line.split()[1])
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b'\n', b''):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        headers[name.strip().lower()] = value.strip()
+
+    if headers.get('transfer-encoding') == 'chunked':
+        length = 0
+        while True:
+            size = int((await reader.readline()).split(b';')[0], 16)
+            await reader.readexactly(size + 2)
+            length += size
+            if not size:
+                return status, length
+    length = int(headers.get('content-length', 0))
+    await reader.readexactly(length)
+    return status, length
+
+
+async def _client(host, port, paths, counter, total, timings):
+    """Send requests over one connection until `total` have been sent.
+
+    :param counter: A one-element list of the number of requests sent so far,
+    shared by all clients.
+    :param timings: A list to which (path, status, seconds, bytes) tuples are
+    appended.
+    """
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        while counter[0] < total:
+            path = paths[counter[0] % len(paths)]
+            counter[0] += 1
+            start = time.perf_counter()
+            writer.write(f'GET {path} HTTP/1.1\r\nHost: {host}\r\n\r\n'
+                         .encode('latin-1'))
+            await writer.drain()
+            status, length = await _read_response(reader)
+            timings.append((path, status, time.perf_counter() - start, length))
+    finally:
+        writer.close()
+
+
+def percentile(values, fraction):
+    """Return the value at a fraction of a list of values, sorted (nearest rank)."""
+    ordered = sorted(values)
+    return ordered[min(int(fraction * len(ordered)), len(ordered) - 1)]
+
+
+def summarize(timings, elapsed):
+    """Summarize the timings of a load test.
+
+    :param timings: A list of (path, status, seconds, bytes) tuples.
+    :param elapsed: The wall-clock duration of the test, in seconds.
+    :return: A dictionary of overall and per-path results.
+    """
+    def summary(entries):
+        latencies = [entry[2] for entry in entries]
+        return {'requests': len(entries),
+                'errors': sum(1 for entry in entries if entry[1] >= 400),
+                'p50_ms': 1000 * percentile(latencies, 0.50),
+                'p99_ms': 1000 * percentile(latencies, 0.99),
+                'mean_ms': 1000 * statistics.mean(latencies)}
+
+    paths = {}
+    for entry in timings:
+        paths.setdefault(entry[0], []).append(entry)
+    return {'requests_per_s': len(timings) / elapsed, 'seconds': elapsed,
+            **summary(timings),
+            'paths': {path: summary(entries) for path, entries in paths.items()}}
+
+
+async def load_test(url, paths, concurrency, requests):
+    """Run a load test against a server.
+
+    :param url: The base URL of the server.
+    :param paths: The request paths to cycle through.
+    :param concurrency: The number of concurrent connections.
+    :param requests: The total number of requests to send.
+    :return: A dictionary of results, as from `summarize`.
+    """
+    parts = urllib.parse.urlsplit(url)
+    host, port = parts.hostname or '127.0.0.1', parts.port or 80
+    counter, timings = [0], []
+    start = time.perf_counter()
+    await asyncio.gather(*(_client(host, port, paths, counter, requests, timings)
+                           for _ in range(concurrency)))
+    return summarize(timings, time.perf_counter() - start)
+
+
+def main():
+    """Run a load test as specified at the command line."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--url', default='http://127.0.0.1:8000')
+    parser.add_argument('--path', action='append', dest='paths',
+                        help="A request path to send (repeatable); by default, "
+                             "a mix of inspect and query requests.")
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--requests', type=int, default=1000)
+    parser.add_argument('--output', help="File in which to save the results as JSON.")
+    args = parser.parse_args()
+
+    results = asyncio.run(load_test(args.url, args.paths or PATHS,
+                                    args.concurrency, args.requests))
+    print(f"{results['requests']} requests in {results['seconds']:.2f} s: "
+          f"{results['requests_per_s']:.1f} requests/s, "
+          f"p50 {results['p50_ms']:.2f} ms, p99 {results['p99_ms']:.2f} ms, "
+          f"{results['errors']} errors", file=sys.stderr)
+    for path, result in results['paths'].items():
+        print(f"  {path:<80} p50 {result['p50_ms']:8.2f} ms  "
+              f"p99 {result['p99_ms']:8.2f} ms", file=sys.stderr)
+    if args.output:
+        with open(args.output, 'w') as outfile:
+            json.dump(results, outfile, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,182 @@
+"""Run the benchmark suite and record the results as JSON.
+
+Each benchmark case is timed on synthetic data (see `benchmarks.generate`) at
+one or more scales: loading both data files, building the `NEODatabase`, a
+set of representative queries, and writing query results to CSV and JSON.
+
+The results are written to a JSON file. Given the results of an earlier run
+with `--baseline`, every case that got slower by more than `--threshold` is
+reported as a regression, and the exit status is 1.
+
+To run the suite from the project root, run:
+
+    $ python3 -m benchmarks.run --scale 1 10 --output bench.json
+    $ python3 -m benchmarks.run --scale 1 10 --baseline bench.json
+"""
+import argparse
+import datetime
+import json
+import os
+import pathlib
+import platform
+import statistics
+import sys
+import tempfile
+import time
+
+from benchmarks.generate import generate
+from database import NEODatabase
+from extract import load_neos, load_approaches
+from filters import create_filters, limit
+from write import write_to_csv, write_to_json
+
+
+# Representative queries, as keyword arguments to `create_filters`.
+QUERIES = {
+    'query_all': {},
+    'query_date': {'date': datetime.date(2020, 3, 2)},
+    'query_decade_close': {'start_date': datetime.date(2020, 1, 1),
+                           'end_date': datetime.date(2029, 12, 31),
+                           'distance_max': 0.05},
+    'query_fast_far': {'start_date': datetime.date(2050, 1, 1),
+                       'distance_min': 0.2, 'velocity_min': 50},
+    'query_hazardous_close_fast': {'hazardous': True, 'distance_max': 0.05,
+                                   'velocity_min': 30},
+    'query_diameter_not_hazardous': {'start_date': datetime.date(2000, 1, 1),
+                                     'diameter_max': 0.1, 'hazardous': False},
+    'query_all_bounds': {'start_date': datetime.date(2020, 3, 1),
+                         'end_date': datetime.date(2020, 5, 31),
+                         'distance_min': 0.05, 'distance_max': 0.5,
+                         'velocity_min': 5, 'velocity_max': 25,
+                         'diameter_min': 0.5, 'diameter_max': 1.5,
+                         'hazardous': True},
+}
+
+
+def measure(function, repeat):
+    """Time `repeat` calls to `function`.
+
+    :return: A tuple of the result of the last call, and a dictionary of the
+    best and mean wall-clock times in seconds.
+    """
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        timings.append(time.perf_counter() - start)
+    return result, {'best_s': min(timings), 'mean_s': statistics.mean(timings)}
+
+
+def run_scale(scale, repeat, workdir):
+    """Run every benchmark case at one scale.
+
+    :return: A list of result dictionaries.
+    """
+    neofile, cadfile = generate(workdir / f'scale-{scale}', scale=scale)
+    results = []
+
+    def record(name, function, rows=None):
+        result, timing = measure(function, repeat)
+        count = len(result) if rows is None else rows
+        results.append({'name': name, 'scale': scale, 'rows': count, **timing})
+        print(f"  {name:<30} {timing['best_s']:9.4f} s  ({count} rows)",
+              file=sys.stderr)
+        return result
+
+    record('load_neos', lambda: load_neos(neofile))
+    approaches = record('load_approaches', lambda: load_approaches(cadfile))
+    database = record(
+        'build_database',
+        lambda: NEODatabase(load_neos(neofile), load_approaches(cadfile)),
+        rows=len(approaches))
+
+    for name, criteria in QUERIES.items():
+        filters = create_filters(**criteria)
+        record(name, lambda: list(database.query(filters)))
+    record('query_limit_10',
+           lambda: list(limit(database.query(create_filters()), 10)))
+    close = create_filters(**QUERIES['query_decade_close'])
+    record('count_decade_close', lambda: [database.count(close)])
+    record('stats_decade_close', lambda: [database.stats(close)])
+    record('query_top_20_closest', lambda: database.sort_rows(
+        database.match_rows(create_filters()), 'distance', k=20))
+    filter_sets = [create_filters(**criteria) for criteria in QUERIES.values()]
+    record('match_rows_each_query',
+           lambda: [row for filters in filter_sets
+                    for row in database.match_rows(filters)])
+    record('match_many_all_queries',
+           lambda: [row for rows in database.match_many(filter_sets)
+                    for row in rows])
+
+    exported = list(database.query(create_filters(
+        start_date=datetime.date(2000, 1, 1))))
+    for name, writer, suffix in (('write_to_csv', write_to_csv, '.csv'),
+                                 ('write_to_json', write_to_json, '.json')):
+        outfile = workdir / f'results-{scale}{suffix}'
+        record(name, lambda: writer(exported, outfile), rows=len(exported))
+    return results
+
+
+def compare(results, baseline, threshold):
+    """Find the cases that are slower than in a baseline run.
+
+    :return: A list of (name, scale, baseline seconds, seconds) tuples.
+    """
+    previous = {(result['name'], result['scale']): result['best_s']
+                for result in baseline['results']}
+    regressions = []
+    for result in results:
+        before = previous.get((result['name'], result['scale']))
+        if before is not None and result['best_s'] > before * (1 + threshold):
+            regressions.append((result['name'], result['scale'],
+                                before, result['best_s']))
+    return regressions
+
+
+def main():
+    """Run the suite as specified at the command line."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--scale', type=float, nargs='+', default=[1, 10],
+                        help="Scales to run at, where 100 is the full data set.")
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--output', type=pathlib.Path,
+                        help="File in which to save the results as JSON.")
+    parser.add_argument('--baseline', type=pathlib.Path,
+                        help="Results of an earlier run to compare against.")
+    parser.add_argument('--threshold', type=float, default=0.2,
+                        help="Relative slowdown that counts as a regression.")
+    args = parser.parse_args()
+
+    results = []
+    with tempfile.TemporaryDirectory() as workdir:
+        for scale in args.scale:
+            print(f"scale {scale}:", file=sys.stderr)
+            results.extend(run_scale(scale, args.repeat, pathlib.Path(workdir)))
+
+    report = {
+        'meta': {'timestamp': datetime.datetime.now().isoformat(timespec='seconds'),
+                 'python': platform.python_version(),
+                 'platform': platform.platform(),
+                 'cpu_count': os.cpu_count(),
+                 'repeat': args.repeat},
+        'results': results,
+    }
+    if args.output:
+        with open(args.output, 'w') as outfile:
+            json.dump(report, outfile, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+
+    if args.baseline:
+        with open(args.baseline) as infile:
+            regressions = compare(results, json.load(infile), args.threshold)
+        for name, scale, before, after in regressions:
+            print(f"REGRESSION {name} at scale {scale}: "
+                  f"{before:.4f} s -> {after:.4f} s", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
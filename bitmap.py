@@ -0,0 +1,163 @@
+"""Packed bitmap indexes over the rows of a database.
+
+A `Bitmap` marks a subset of the rows (close approaches) of a `NEODatabase`
+with one bit per row, packed eight rows to a byte with `np.packbits`. The
+database keeps one for each yes/no attribute of an approach's NEO that a
+query can filter on - whether it is potentially hazardous, whether its
+diameter is known, and whether it has a name - so that:
+
+- Bitmaps combine with bitwise AND, OR and NOT over whole bytes, eight rows
+  per operation, without unpacking them.
+- The rows that a combined bitmap marks within a window are found by
+  unpacking only the bytes of that window, so a query scans only those rows.
+- The number of marked rows in a window is counted from the packed bytes.
+"""
+import numpy as np
+
+
+# The number of set bits in each possible byte.
+_POPCOUNT = np.array([bin(byte).count('1') for byte in range(256)], dtype=np.uint8)
+
+
+class Bitmap:
+    """A packed set of row numbers, in `range(len(bitmap))`.
+
+    The bits past the last row are always zero, so that whole bytes can be
+    counted and combined.
+    """
+
+    def __init__(self, bits, length):
+        """Create a new `Bitmap` from packed bits.
+
+        :param bits: A uint8 NumPy array, with the bit of row `i` at position
+        `7 - i % 8` (the most significant bit first) of byte `i // 8`. It may
+        be longer than needed, to leave room for `extend`.
+        :param length: The number of rows.
+        """
+        self._bits = bits
+        self._length = length
+
+    @classmethod
+    def from_mask(cls, mask):
+        """Pack a boolean array, with one entry per row, into a `Bitmap`."""
+        mask = np.asarray(mask, dtype=bool)
+        return cls(np.packbits(mask), len(mask))
+
+    def __len__(self):
+        """Return the number of rows."""
+        return self._length
+
+    @property
+    def bits(self):
+        """The packed bytes of the rows, as a read-only view."""
+        bits = self._bits[:(self._length + 7) // 8]
+        bits.flags.writeable = False
+        return bits
+
+    def _check_length(self, other):
+        """Raise a `ValueError` unless `other` has as many rows as `self`."""
+        if len(other) != self._length:
+            raise ValueError(f"Can't combine bitmaps of {self._length} "
+                             f"and {len(other)} rows.")
+
+    def __and__(self, other):
+        """Return the rows in both `self` and `other`."""
+        self._check_length(other)
+        return Bitmap(self.bits & other.bits, self._length)
+
+    def __or__(self, other):
+        """Return the rows in either `self` or `other`."""
+        self._check_length(other)
+        return Bitmap(self.bits | other.bits, self._length)
+
+    def __invert__(self):
+        """Return the rows that aren't in `self`."""
+        bits = ~self.bits
+        if self._length % 8:
+            bits[-1] &= (0xFF << (8 - self._length % 8)) & 0xFF
+        return Bitmap(bits, self._length)
+
+    def _bounds(self, start, stop):
+        """Clip a window of rows to the bitmap."""
+        stop = self._length if stop is None else min(stop, self._length)
+        return max(start, 0), stop
+
+    def mask(self, start=0, stop=None):
+        """Unpack the rows of a window into a boolean array.
+
+        :param start: The first row of the window.
+        :param stop: The past-the-end row of the window, or `None` for the
+        end of the bitmap.
+        :return: A boolean array with one entry per row of the window.
+        """
+        start, stop = self._bounds(start, stop)
+        if start >= stop:
+            return np.zeros(0, dtype=bool)
+        offset = start % 8
+        bits = np.unpackbits(self._bits[start // 8:(stop + 7) // 8])
+        return bits[offset:offset + stop - start].view(bool)
+
+    def rows(self, start=0, stop=None):
+        """Find the rows of a window that are in the bitmap.
+
+        :return: An int64 array of row numbers, in increasing order.
+        """
+        start, stop = self._bounds(start, stop)
+        return np.flatnonzero(self.mask(start, stop)) + start
+
+    def count(self, start=0, stop=None):
+        """Count the rows of a window that are in the bitmap.
+
+        The whole bytes of the window are counted without unpacking them.
+        """
+        start, stop = self._bounds(start, stop)
+        first, last = -(-start // 8), stop // 8
+        if first >= last:
+            return int(np.count_nonzero(self.mask(start, stop)))
+        return int(_POPCOUNT[self._bits[first:last]].sum(dtype=np.int64)
+                   + np.count_nonzero(self.mask(start, first * 8))
+                   + np.count_nonzero(self.mask(last * 8, stop)))
+
+    def extend(self, mask):
+        """Append rows to the bitmap in place.
+
+        The bytes are kept in a buffer that grows geometrically, so a series
+        of appends takes amortized time proportional to the number of rows
+        appended; only the last, partial byte is repacked.
+
+        :param mask: A boolean array with one entry per appended row.
+        """
+        mask = np.asarray(mask, dtype=bool)
+        whole = self._length // 8
+        tail = np.concatenate([self.mask(whole * 8), mask])
+        packed = np.packbits(tail)
+        needed = whole + len(packed)
+        if len(self._bits) < needed or not self._bits.flags.writeable:
+            buffer = np.zeros(max(needed, 2 * len(self._bits)), dtype=np.uint8)
+            buffer[:whole] = self._bits[:whole]
+            self._bits = buffer
+        self._bits[whole:needed] = packed
+        self._length += len(mask)
+
+    def set_rows(self, rows, mask):
+        """Set or clear the bits of some rows in place.
+
+        Only the bytes of the given rows are touched, so this takes time
+        proportional to the number of rows rather than to the bitmap.
+
+        :param rows: An array of distinct row numbers, in `range(len(self))`.
+        :param mask: A boolean array with one entry per row of `rows`: whether
+        that row is in the bitmap.
+        """
+        rows = np.asarray(rows, dtype=np.int64)
+        mask = np.asarray(mask, dtype=bool)
+        if not self._bits.flags.writeable:
+            self._bits = self._bits.copy()
+        positions = rows // 8
+        bits = (0x80 >> (rows % 8)).astype(np.uint8)
+        np.bitwise_or.at(self._bits, positions[mask], bits[mask])
+        np.bitwise_and.at(self._bits, positions[~mask], ~bits[~mask])
+
+    def __repr__(self):
+        """Return `repr(self)`, a computer-readable representation."""
+        return f"Bitmap(rows={self.count()}, length={self._length})"
@@ -13,6 +13,125 @@ data on NEOs and close approaches extracted by `extract.load_neos` and
 
 You'll edit this file in Tasks 2 and 3.
 """
+import collections.abc
+import math
+import threading
+from math import nan
+
+import numpy as np
+
+import profiling
+from bitmap import Bitmap
+from filters import compile_filters
+from helpers import MINUTES_PER_DAY
+from models import NearEarthObject, CloseApproach
+from planner import ColumnStatistics, RangePredicate, plan_query
+from search import NameIndex
+
+
+# Stands in for the time of a close approach whose time is unknown.
+_NO_TIME = np.iinfo(np.int64).min
+
+# The columns by which query results can be sorted.
+SORT_KEYS = ('time', 'distance', 'velocity', 'diameter')
+
+# The number of rows masked at once by `query`, growing from the first to
+# the last size, so that a limited query can stop after a small first chunk.
+_FIRST_CHUNK = 1024
+_LAST_CHUNK = 1 << 16
+
+# The number of NEOs of a snapshot whose approaches are found by scanning the
+# NEO index, before it is grouped by NEO (see `_LazyObjects`).
+_NEO_SCANS = 32
+
+
+def aggregate(values):
+    """Compute the minimum, maximum and mean of an array of values.
+
+    Missing (NaN) values are left out. An aggregate of no values is `nan`.
+
+    :param values: A float NumPy array.
+    :return: A dictionary of 'min', 'max' and 'mean'.
+    """
+    values = values[~np.isnan(values)]
+    if not len(values):
+        return {'min': nan, 'max': nan, 'mean': nan}
+    return {'min': float(values.min()), 'max': float(values.max()),
+            'mean': float(values.mean())}
+
+
+def order_rows(rows, keys, descending=False, k=None):
+    """Order row numbers by a key per row, keeping the first `k`.
+
+    With `k`, a partial selection (`np.partition`) finds the `k`-th smallest
+    key first, and only the rows up to it are sorted, instead of sorting
+    every row. Rows with equal keys keep their order, and rows with a NaN key
+    come last in either direction.
+
+    :param rows: An array of row numbers.
+    :param keys: An array of the sort key of each row.
+    :param descending: Whether to put the largest keys first.
+    :param k: The number of rows to keep, or `None` to keep all of them.
+    :return: An array of the (first `k`) row numbers in sorted order.
+    """
+    rows = np.asarray(rows)
+    keys = np.asarray(keys, dtype=np.float64)
+    if descending:
+        keys = -keys
+    if k is not None and k < len(rows):
+        if k <= 0:
+            return rows[:0]
+        kth = np.partition(keys, k - 1)[k - 1]
+        if not np.isnan(kth):
+            candidates = np.flatnonzero(keys <= kth)
+            rows, keys = rows[candidates], keys[candidates]
+    return rows[np.argsort(keys, kind='stable')][:k]
+
+
+def _extend(column, values):
+    """Append values to a column, in place if its buffer has room.
+
+    The extended column is a view of the start of a larger buffer, which
+    grows geometrically, so a series of appends takes amortized time
+    proportional to the number of values appended rather than to the length
+    of the column. A column that isn't such a view, or whose buffer is full,
+    is first copied into a new buffer.
+
+    :param column: A one-dimensional NumPy array.
+    :param values: The values to append.
+    :return: The extended column.
+    """
+    count = len(column)
+    total = count + len(values)
+    buffer = column.base
+    if (not isinstance(buffer, np.ndarray) or buffer.base is not None
+            or buffer.dtype != column.dtype or len(buffer) < total
+            or not column.flags.c_contiguous
+            or buffer.ctypes.data != column.ctypes.data
+            or not buffer.flags.writeable):
+        buffer = np.empty(max(total, 2 * count), dtype=column.dtype)
+        buffer[:count] = column
+    buffer[count:total] = values
+    return buffer[:total]
+
+
+def _gather_neo_columns(neo_diameter, neo_hazardous, neo_named, approach_neo_index):
+    """Gather the diameter, hazardous flag and named flag of each approach's NEO.
+
+    :param neo_diameter: The diameter of each NEO.
+    :param neo_hazardous: Whether each NEO is potentially hazardous.
+    :param neo_named: Whether each NEO has a name.
+    :param approach_neo_index: For each approach, the index of its NEO, or
+    -1 if it has none.
+    :return: A dictionary of the 'diameter', 'hazardous' and 'named' columns.
+    """
+    neo_diameter = np.append(np.asarray(neo_diameter, dtype=np.float64), nan)
+    neo_hazardous = np.append(np.asarray(neo_hazardous, dtype=bool), False)
+    neo_named = np.append(np.asarray(neo_named, dtype=bool), False)
+    # An index of -1 selects the trailing NaN/False sentinel.
+    return {'diameter': neo_diameter[approach_neo_index],
+            'hazardous': neo_hazardous[approach_neo_index],
+            'named': neo_named[approach_neo_index]}
 
 
 class NEODatabase:
@@ -21,10 +140,18 @@ class NEODatabase:
     A `NEODatabase` contains a collection of NEOs and a collection of close
     approaches. It additionally maintains a few auxiliary data structures to
     help fetch NEOs by primary designation or by name and to help speed up
-    querying for close approaches that match criteria.
+    querying for close approaches that match criteria: the approach times
+    (as epoch minutes, and as epoch days for date filters), distances and
+    velocities, and the diameter, hazardous flag and named flag of each
+    approach's NEO, are kept as typed NumPy columns, and whether each
+    approach's NEO is hazardous, has a known diameter and has a name is kept
+    in packed bitmap indexes (see `bitmap.Bitmap`). Optional close approach
+    fields (such as `dist_min` or `h`, see `extract.APPROACH_FIELDS`) can be
+    kept as extra columns, which filters on them read instead of
+    `CloseApproach` attributes.
     """
 
-    def __init__(self, neos, approaches):
+    def __init__(self, neos, approaches, fields=None):
         """Create a new `NEODatabase`.
 
         As a precondition, this constructor assumes that the collections
@@ -42,50 +169,606 @@ class NEODatabase:
 
         :param neos: A collection of `NearEarthObject`s.
         :param approaches: A collection of `CloseApproach`es.
+        :param fields: An optional dictionary mapping the names of optional
+        close approach fields to NumPy arrays with one value per approach,
+        in the order of `approaches` (as from `extract.load_data`).
+        """
+        fields = fields or {}
+        # The names of the optional fields kept as columns.
+        self.fields = tuple(fields)
+        # The objects of a database from a snapshot that aren't created yet.
+        self._lazy = None
+        with profiling.stage('link') as timing:
+            approach_neo_index = self._link(neos, approaches)
+            timing.rows = len(self._approaches)
+        with profiling.stage('build_columns') as timing:
+            self._build_columns(approach_neo_index, fields)
+            timing.rows = len(self._approaches)
+        self._name_index = None
+        # Counts the changes made by `apply_neo_delta` and
+        # `apply_approach_delta`, so that cached results can be discarded.
+        self.version = 0
+
+    @classmethod
+    def from_snapshot(cls, columns, fields=None):
+        """Create a `NEODatabase` from the columns of a snapshot.
+
+        The approaches of a snapshot are already sorted by time and linked
+        to their NEOs, so its time, distance, velocity and NEO index columns
+        are adopted as they are, and the diameter, hazardous and named
+        columns are gathered from the NEO columns through the NEO index. No
+        NEO or close approach object is created up front: those of the rows
+        generated by `query` and `approaches_at`, and the NEOs that are looked
+        up, are created on first use (see `_LazyObjects`), and the rest only
+        once something needs all of them.
+
+        :param columns: A dictionary of the arrays of a snapshot (see
+        `snapshot.save_snapshot`): 'neo_designation', 'neo_name' (empty for
+        no name), 'neo_diameter' and 'neo_hazardous', with one entry per
+        NEO; 'designations', the distinct designations of the approaches;
+        and 'approach_designation' (an index into 'designations'),
+        'approach_time' (in epoch minutes), 'approach_distance',
+        'approach_velocity' and 'approach_neo_index', with one entry per
+        approach, in order of time.
+        :param fields: An optional dictionary mapping the names of optional
+        close approach fields to NumPy arrays, in the same order as the
+        approach columns.
+        :return: A new `NEODatabase`.
         """
-        import numpy as np
+        fields = fields or {}
+        # Plain arrays, rather than memory maps, are faster to index.
+        columns = {name: np.asarray(column) for name, column in columns.items()}
+        database = cls.__new__(cls)
+        database.fields = tuple(fields)
+        # The NEO index is copied, as linking an ingested NEO writes to it.
+        neo_index = np.array(columns['approach_neo_index'], dtype=np.int64)
+        database._lazy = _LazyObjects(columns, neo_index)
+        designations = columns['neo_designation'].tolist()
+        database._neo_positions = {pdes: index
+                                   for index, pdes in enumerate(designations)}
+        database._neos_name_to_pdes = {
+            name: pdes for pdes, name in zip(designations,
+                                             columns['neo_name'].tolist())
+            if name}
+
+        database._neo_index = neo_index
+        database._time = columns['approach_time']
+        database._columns = {'time': database._time // MINUTES_PER_DAY,
+                             'distance': columns['approach_distance'],
+                             'velocity': columns['approach_velocity']}
+        database._columns.update(_gather_neo_columns(
+            columns['neo_diameter'], columns['neo_hazardous'],
+            columns['neo_name'] != '', neo_index))
+        for name, values in fields.items():
+            database._columns[name] = np.asarray(values)
+        database._update_statistics()
+        database._update_bitmaps()
+        database._name_index = None
+        database.version = 0
+        return database
+
+    @property
+    def _neos(self):
+        """The list of `NearEarthObject`s."""
+        if self._lazy is not None:
+            self._materialize()
+        return self._neo_list
+
+    @_neos.setter
+    def _neos(self, neos):
+        self._neo_list = neos
+
+    @property
+    def _approaches(self):
+        """The list of `CloseApproach`es, one per row of the columns."""
+        if self._lazy is not None:
+            self._materialize()
+        return self._approach_list
+
+    @_approaches.setter
+    def _approaches(self, approaches):
+        self._approach_list = approaches
+
+    @property
+    def _pdes_to_neos(self):
+        """A dictionary mapping each primary designation to its NEO."""
+        if self._lazy is not None:
+            self._materialize()
+        return self._neos_by_pdes
 
-        debug = False
-        self._neos = neos
-        self._approaches = approaches
+    @_pdes_to_neos.setter
+    def _pdes_to_neos(self, neos):
+        self._neos_by_pdes = neos
 
+    def _materialize(self):
+        """Create every NEO and close approach of a snapshot that isn't yet."""
+        lazy = self._lazy
+        if lazy is None:
+            return
+        with profiling.stage('materialize') as timing:
+            neos, approaches = lazy.materialize()
+            timing.rows = len(neos) + len(approaches)
+        # The lists are stored before `_lazy` is cleared, so that a thread
+        # that sees it cleared finds them.
+        self._neos, self._approaches = neos, approaches
         self._pdes_to_neos = {neo.designation: neo for neo in neos}
-        self._pdes_to_approaches = dict()
-        self._neos_name_to_pdes = dict()
-
-        self._time_to_pdes = {approach.time: approach._designation
-                              for approach in self._approaches}
-        self._distance_to_pdes = {approach.distance: approach._designation
-                                  for approach in self._approaches}
-        self._velocity_to_pdes = {approach.velocity: approach._designation
-                                  for approach in self._approaches}
-        self._diameter_to_pdes = {neo.diameter: neo.designation
-                                  for neo in self._neos}
-
-        self._time_arr = np.array(self._time_to_pdes.keys())
-        self._distance_arr = np.array(self._distance_to_pdes.keys())
-        self._velocity_arr = np.array(self._velocity_to_pdes.keys())
-        self._diameter_arr = np.array(self._diameter_to_pdes.keys())
-
-        for approach in self._approaches:
+        self._lazy = None
+
+    def _neo(self, index):
+        """Return the NEO at an index of `self._neos`."""
+        if self._lazy is not None:
+            return self._lazy.neo(index)
+        return self._neo_list[index]
+
+    def _approach_lookup(self):
+        """Return a function from a row number to its `CloseApproach`."""
+        if self._lazy is not None:
+            return self._lazy.approach
+        return self._approach_list.__getitem__
+
+    def _link(self, neos, approaches):
+        """Link each close approach with its NEO, by designation.
+
+        :param neos: A collection of `NearEarthObject`s.
+        :param approaches: A collection of `CloseApproach`es.
+        :return: For each approach, the index of its NEO in `self._neos`, or
+        -1 if it has none.
+        """
+        self._neos = list(neos)
+        self._approaches = list(approaches)
+
+        self._index_neos()
+        return self._link_approaches(self._approaches)
+
+    def _index_neos(self):
+        """Map the designations and names of `self._neos` to the NEOs."""
+        self._pdes_to_neos = {neo.designation: neo for neo in self._neos}
+        self._neos_name_to_pdes = {neo.name: neo.designation
+                                   for neo in self._neos
+                                   if neo.name is not None}
+        self._neo_positions = {neo.designation: index
+                               for index, neo in enumerate(self._neos)}
+
+    def _link_approaches(self, approaches, quiet=False):
+        """Link close approaches with their NEOs in `self._neos`.
+
+        :param approaches: A list of unlinked `CloseApproach`es.
+        :param quiet: Whether to skip the message about an unknown NEO.
+        :return: For each approach, the index of its NEO, or -1.
+        """
+        neos = self._neos
+        approach_neo_index = np.full(len(approaches), -1, dtype=np.int64)
+        for row, approach in enumerate(approaches):
             pdes = approach._designation
             try:
-                approach.neo = self._pdes_to_neos[pdes]
+                index = self._neo_positions[pdes]
             except KeyError:
-                print(f'No neo with the pdes {pdes}'
-                      f'is found in the neos csv files')
+                if not quiet:
+                    print(f'No neo with the pdes {pdes} '
+                          f'is found in the neos csv files')
                 continue
 
-            try:
-                self._pdes_to_neos[pdes].approaches.append(approach)
-            except KeyError:
-                print(f'No neo with the pdes {pdes} is '
-                      f'found in the neos csv files')
+            neo = neos[index]
+            approach.neo = neo
+            neo.approaches.append(approach)
+            approach_neo_index[row] = index
+        return approach_neo_index
+
+    def _build_columns(self, approach_neo_index, fields):
+        """Sort the approaches by time and build the typed NumPy columns.
+
+        Every column has one entry per close approach, in the same order as
+        `self._approaches`, so a boolean mask over the columns selects rows
+        of `self._approaches` directly. The approaches are stably sorted by
+        time first, so the `self._time` column doubles as a sorted index for
+        date filters (see `_time_window`). A sample of each column is kept
+        in `self._statistics` for the query planner. The NEO attributes
+        (diameter, hazardous flag and named flag) are gathered through the
+        NEO index, with NaN and `False` for approaches whose NEO is unknown,
+        and the optional fields are reordered with the approaches.
+
+        :param approach_neo_index: For each approach, the index of its NEO
+        in `self._neos`, or -1 if it has none.
+        :param fields: A dictionary of optional field arrays, in the original
+        order of the approaches.
+        """
+        time = np.array([_NO_TIME if approach.minutes is None
+                         else approach.minutes
+                         for approach in self._approaches], dtype=np.int64)
+        order = np.argsort(time, kind='stable')
+        approaches = self._approaches
+        self._approaches = [approaches[row] for row in order.tolist()]
+        approach_neo_index = approach_neo_index[order]
+
+        self._neo_index = approach_neo_index
+        self._time = time[order]
+        self._columns = {
+            'time': self._time // MINUTES_PER_DAY,
+            'distance': np.array([approach.distance
+                                  for approach in self._approaches],
+                                 dtype=np.float64),
+            'velocity': np.array([approach.velocity
+                                  for approach in self._approaches],
+                                 dtype=np.float64),
+        }
+        self._columns.update(self._neo_columns(approach_neo_index))
+        for name, values in fields.items():
+            values = np.asarray(values)
+            if len(values) != len(order):
+                raise ValueError(f"The {name!r} field has {len(values)} values "
+                                 f"for {len(order)} close approaches.")
+            self._columns[name] = values[order]
+        self._update_statistics()
+        self._update_bitmaps()
+
+    def _neo_columns(self, approach_neo_index):
+        """Gather the diameter, hazardous flag and named flag of each approach's NEO.
+
+        :param approach_neo_index: For each approach, the index of its NEO
+        in `self._neos`, or -1 if it has none.
+        :return: A dictionary of the 'diameter', 'hazardous' and 'named' columns.
+        """
+        return _gather_neo_columns([neo.diameter for neo in self._neos],
+                                   [neo.hazardous for neo in self._neos],
+                                   [bool(neo.name) for neo in self._neos],
+                                   approach_neo_index)
+
+    def _update_statistics(self):
+        """Resample every column for the query planner."""
+        self._statistics = {name: ColumnStatistics(column)
+                            for name, column in self._columns.items()}
+
+    @staticmethod
+    def _bitmap_masks(columns):
+        """Compute the rows of each bitmap index, as boolean arrays.
+
+        :param columns: A dictionary of the columns of some approaches.
+        :return: A dictionary of the 'hazardous' (the NEO is potentially
+        hazardous), 'diameter' (the NEO's diameter is known) and 'named' (the
+        NEO has a name) masks.
+        """
+        return {'hazardous': columns['hazardous'],
+                'diameter': ~np.isnan(columns['diameter']),
+                'named': columns['named']}
+
+    def _update_bitmaps(self):
+        """Rebuild every bitmap index from the columns."""
+        masks = self._bitmap_masks(self._columns)
+        self._bitmaps = {name: Bitmap.from_mask(mask)
+                         for name, mask in masks.items()}
+
+    def _plan_bitmap(self, plan):
+        """Combine the bitmap terms of a plan with bitwise AND.
+
+        :param plan: A `planner.QueryPlan`.
+        :return: A `Bitmap` of the rows allowed by every term, or `None` if
+        the plan has none.
+        """
+        combined = None
+        for name, flag in plan.bitmaps:
+            bitmap = self._bitmaps[name] if flag else ~self._bitmaps[name]
+            combined = bitmap if combined is None else combined & bitmap
+        return combined
+
+    def apply_neo_delta(self, added=(), removed=(), updated=()):
+        """Add, remove and update NEOs in place.
+
+        Approaches that have no NEO are linked to an added NEO with their
+        designation; the approaches of a removed NEO are left without one.
+        Only the diameter, hazardous and named columns are regathered (with
+        NumPy, through the per-approach NEO index); no approach is visited
+        unless it is relinked.
+
+        :param added: A collection of new `NearEarthObject`s.
+        :param removed: A collection of this database's `NearEarthObject`s.
+        :param updated: A collection of pairs of one of this database's
+        `NearEarthObject`s and a new `NearEarthObject` whose name, diameter
+        and hazardous flag replace its own.
+        """
+        added, removed = list(added), list(removed)
+        for neo, new in updated:
+            neo.name, neo.diameter, neo.hazardous = new.name, new.diameter, new.hazardous
+
+        if removed:
+            gone = {id(neo) for neo in removed}
+            for neo in removed:
+                for approach in neo.approaches:
+                    approach.neo = None
+                neo.approaches = []
+            kept = [index for index, neo in enumerate(self._neos)
+                    if id(neo) not in gone]
+            # The trailing -1 maps the "no NEO" index to itself.
+            remap = np.full(len(self._neos) + 1, -1, dtype=np.int64)
+            remap[kept] = np.arange(len(kept))
+            self._neos = [self._neos[index] for index in kept]
+            self._neo_index = remap[self._neo_index]
+
+        self._neos.extend(added)
+        self._index_neos()
+        if added:
+            for row in np.flatnonzero(self._neo_index == -1).tolist():
+                approach = self._approaches[row]
+                index = self._neo_positions.get(approach._designation)
+                if index is not None:
+                    approach.neo = self._neos[index]
+                    approach.neo.approaches.append(approach)
+                    self._neo_index[row] = index
+
+        self._columns.update(self._neo_columns(self._neo_index))
+        self._update_statistics()
+        self._update_bitmaps()
+        self._name_index = None
+        self.version += 1
+
+    def apply_approach_delta(self, added=(), removed_rows=(), fields=None):
+        """Remove and insert close approaches, keeping the columns sorted.
+
+        Instead of rebuilding the database, the removed rows are dropped
+        from every column, and the added approaches are linked to their NEOs
+        and inserted into every column where they keep the time index sorted
+        (after any approaches at the same time). Only the added and removed
+        approaches are visited in Python.
+
+        :param added: A collection of new, unlinked `CloseApproach`es.
+        :param removed_rows: The row numbers (as from `match_rows`) of the
+        approaches to remove.
+        :param fields: An optional dictionary of the optional field arrays of
+        the added approaches, as for `NEODatabase`; missing fields are NaN.
+        """
+        added = list(added)
+        removed_rows = np.unique(np.asarray(removed_rows, dtype=np.int64))
+        if not added and not len(removed_rows):
+            return
+
+        if len(removed_rows):
+            for row in removed_rows.tolist():
+                approach = self._approaches[row]
+                if approach.neo is not None:
+                    approach.neo.approaches.remove(approach)
+                    approach.neo = None
+            approaches = self._approaches
+            keep = np.ones(len(approaches), dtype=bool)
+            keep[removed_rows] = False
+            self._approaches = [approaches[row]
+                                for row in np.flatnonzero(keep).tolist()]
+            self._time = self._time[keep]
+            self._neo_index = self._neo_index[keep]
+            self._columns = {name: column[keep]
+                             for name, column in self._columns.items()}
+            self._update_bitmaps()
+
+        if added:
+            self._insert_approaches(added, fields)
+
+        self._update_statistics()
+        self.version += 1
+
+    def _insert_approaches(self, added, fields=None):
+        """Link new close approaches and insert them into every column.
+
+        The approaches are stably sorted by time and placed after any
+        approaches at the same time. If none of them is earlier than the
+        last approach, as when a newer batch of data arrives, they are
+        appended with `_extend`, in time proportional to their number;
+        otherwise they are spliced in with `np.insert`. The bitmap indexes
+        are extended in place, or rebuilt after a splice.
+
+        :param added: A nonempty list of new, unlinked `CloseApproach`es.
+        :param fields: An optional dictionary of the optional field arrays of
+        the added approaches; the fields of the database that are missing
+        from it are NaN.
+        """
+        fields = fields or {}
+        time = np.array([_NO_TIME if approach.minutes is None
+                         else approach.minutes
+                         for approach in added], dtype=np.int64)
+        order = np.argsort(time, kind='stable')
+        added = [added[row] for row in order.tolist()]
+        time = time[order]
+        neo_index = self._link_approaches(added, quiet=True)
+        neos = [approach.neo for approach in added]
+        new_columns = {
+            'time': time // MINUTES_PER_DAY,
+            'distance': np.array([approach.distance for approach in added],
+                                 dtype=np.float64),
+            'velocity': np.array([approach.velocity for approach in added],
+                                 dtype=np.float64),
+            'diameter': np.array([nan if neo is None else neo.diameter
+                                  for neo in neos], dtype=np.float64),
+            'hazardous': np.array([neo is not None and neo.hazardous
+                                   for neo in neos], dtype=bool),
+            'named': np.array([neo is not None and bool(neo.name)
+                               for neo in neos], dtype=bool),
+        }
+        for name in self.fields:
+            values = fields.get(name)
+            new_columns[name] = (np.full(len(added), nan) if values is None
+                                 else np.asarray(values)[order])
+
+        if not len(self._time) or time[0] >= self._time[-1]:
+            self._approaches.extend(added)
+            self._time = _extend(self._time, time)
+            self._neo_index = _extend(self._neo_index, neo_index)
+            self._columns = {name: _extend(column, new_columns[name])
+                             for name, column in self._columns.items()}
+            for name, mask in self._bitmap_masks(new_columns).items():
+                self._bitmaps[name].extend(mask)
+            return
+
+        positions = np.searchsorted(self._time, time, side='right')
+        count = len(self._approaches)
+        rows = np.insert(np.arange(count), positions,
+                         count + np.arange(len(added)))
+        combined = self._approaches + added
+        self._approaches = [combined[row] for row in rows.tolist()]
+        self._time = np.insert(self._time, positions, time)
+        self._neo_index = np.insert(self._neo_index, positions, neo_index)
+        self._columns = {name: np.insert(column, positions, new_columns[name])
+                         for name, column in self._columns.items()}
+        self._update_bitmaps()
+
+    def add_neos(self, neos):
+        """Add new NEOs, skipping any whose designation is already known.
+
+        Close approaches that were added before their NEO (and so have none)
+        are linked to it. Apart from one vectorized scan of the NEO index for
+        such approaches, this takes time proportional to the number of NEOs
+        added and approaches linked: only the linked rows of the columns and
+        bitmap indexes are updated, and the name index is rebuilt on its next
+        use.
+
+        :param neos: A collection of new `NearEarthObject`s.
+        :return: A list of the NEOs that were added.
+        """
+        added = []
+        for neo in neos:
+            if neo.designation in self._pdes_to_neos:
+                continue
+            self._pdes_to_neos[neo.designation] = neo
+            if neo.name is not None:
+                self._neos_name_to_pdes[neo.name] = neo.designation
+            self._neo_positions[neo.designation] = len(self._neos)
+            self._neos.append(neo)
+            added.append(neo)
+        if not added:
+            return added
+
+        linked = []
+        for row in np.flatnonzero(self._neo_index == -1).tolist():
+            approach = self._approaches[row]
+            index = self._neo_positions.get(approach._designation)
+            if index is not None:
+                approach.neo = self._neos[index]
+                approach.neo.approaches.append(approach)
+                self._neo_index[row] = index
+                linked.append(row)
+        if linked:
+            linked_neos = [self._neos[index]
+                           for index in self._neo_index[linked].tolist()]
+            self._columns['diameter'][linked] = [neo.diameter for neo in linked_neos]
+            self._columns['hazardous'][linked] = [neo.hazardous for neo in linked_neos]
+            self._columns['named'][linked] = [bool(neo.name) for neo in linked_neos]
+            self._update_statistics()
+            masks = self._bitmap_masks({name: self._columns[name][linked]
+                                        for name in ('diameter', 'hazardous',
+                                                     'named')})
+            for name, mask in masks.items():
+                self._bitmaps[name].set_rows(linked, mask)
+        self._name_index = None
+        self.version += 1
+        return added
+
+    def add_approaches(self, approaches, fields=None):
+        """Add new close approaches, skipping any that are already known.
 
-            if debug:
-                print(f'success pdes: {pdes}')
-            if self._pdes_to_neos[pdes].name is not None:
-                self._neos_name_to_pdes[self._pdes_to_neos[pdes].name] = pdes
+        An approach is a duplicate if an approach of the same NEO at the same
+        time is already in the database, or earlier in `approaches`. The
+        approaches at each new time are found by binary search of the time
+        index, so with the insertion of `_insert_approaches`, adding a batch of
+        approaches later than every known one takes time proportional to the
+        size of the batch.
+
+        :param approaches: A collection of new, unlinked `CloseApproach`es.
+        :param fields: An optional dictionary of the optional field arrays of
+        `approaches`, as for `_insert_approaches`; the entries of the skipped
+        approaches are dropped with them.
+        :return: A list of the approaches that were added.
+        """
+        approaches = list(approaches)
+        time = np.array([_NO_TIME if approach.minutes is None
+                         else approach.minutes
+                         for approach in approaches], dtype=np.int64)
+        starts = np.searchsorted(self._time, time, side='left').tolist()
+        stops = np.searchsorted(self._time, time, side='right').tolist()
+
+        known = self._approaches
+        added = []
+        kept = []
+        seen = set()
+        for index, (approach, start, stop) in enumerate(zip(approaches, starts,
+                                                            stops)):
+            key = approach._designation, approach.minutes
+            if key in seen or any(
+                    known[row]._designation == approach._designation
+                    for row in range(start, stop)):
+                continue
+            seen.add(key)
+            added.append(approach)
+            kept.append(index)
+
+        if added:
+            if fields:
+                fields = {name: np.asarray(values)[kept]
+                          for name, values in fields.items()}
+            self._insert_approaches(added, fields)
+            self._update_statistics()
+            self.version += 1
+        return added
+
+    def _time_window(self, predicate):
+        """Find the rows allowed by a range of approach days.
+
+        As the approaches are sorted by time, the rows whose day lies in the
+        range are contiguous, and are found by binary search over
+        `self._time` in O(log n).
+
+        :param predicate: A `RangePredicate` on the `time` column (in days
+        since the epoch), or `None` for no restriction.
+        :return: A tuple of the first and past-the-end rows of the window.
+        """
+        start, stop = 0, len(self._time)
+        if predicate is None:
+            return start, stop
+        if predicate.low != -math.inf:
+            first_day = predicate.low + (not predicate.low_inclusive)
+            start = np.searchsorted(self._time, first_day * MINUTES_PER_DAY,
+                                    side='left')
+        if predicate.high != math.inf:
+            last_day = predicate.high - (not predicate.high_inclusive)
+            stop = np.searchsorted(self._time,
+                                   (last_day + 1) * MINUTES_PER_DAY,
+                                   side='left')
+        return int(start), int(max(start, stop))
+
+    def _matching_rows(self, plan, first_chunk=_FIRST_CHUNK):
+        """Generate the rows that satisfy the column predicates of a plan.
+
+        The rows of the time window are scanned in growing chunks. The
+        bitmap terms of the plan are first combined into one packed bitmap
+        (see `_plan_bitmap`). In each chunk, the rows that the bitmap allows
+        are unpacked first, and every predicate, from the most to the least
+        selective, is evaluated only over the rows that survived the bitmap
+        and the previous predicates. Without a bitmap, the first predicate
+        is evaluated over the whole chunk.
+
+        :param plan: A `planner.QueryPlan`.
+        :param first_chunk: The number of rows in the first chunk.
+        :yield: Arrays of matching row numbers, in increasing order.
+        """
+        if plan.empty:
+            return
+        start, stop = self._time_window(plan.index_ranges.get('time'))
+        bitmap = self._plan_bitmap(plan)
+        chunk_size = first_chunk
+        while start < stop:
+            chunk = slice(start, min(start + chunk_size, stop))
+            columns = {name: column[chunk]
+                       for name, column in self._columns.items()}
+            if bitmap is None:
+                rows = np.arange(chunk.stop - chunk.start)
+            else:
+                rows = np.flatnonzero(bitmap.mask(chunk.start, chunk.stop))
+            for predicate in plan.predicates:
+                if not len(rows):
+                    break
+                if len(rows) == len(columns['time']):
+                    rows = np.flatnonzero(predicate.mask(columns))
+                else:
+                    rows = rows[predicate.mask(_Gather(columns, rows))]
+            yield rows + chunk.start
+
+            start = chunk.stop
+            chunk_size = min(chunk_size * 2, _LAST_CHUNK)
 
     def get_neo_by_designation(self, designation):
         """Find and return an NEO by its primary designation.
@@ -103,8 +786,7 @@ class NEODatabase:
         the desired primary designation, or `None`.
         """
         try:
-            neo = self._pdes_to_neos[designation]
-            return neo
+            return self._neo(self._neo_positions[designation])
         except Exception:
             return None
 
@@ -124,10 +806,35 @@ class NEODatabase:
         """
         try:
             pdes = self._neos_name_to_pdes[name]
-            return self._pdes_to_neos[pdes]
+            return self._neo(self._neo_positions[pdes])
         except Exception:
             return None
 
+    @property
+    def name_index(self):
+        """The `search.NameIndex` of NEO names and designations.
+
+        It is only built on first use, as most sessions never search.
+        """
+        if self._name_index is None:
+            with profiling.stage('name_index') as timing:
+                self._name_index = NameIndex(self._neos)
+                timing.rows = len(self._name_index)
+        return self._name_index
+
+    def search_neos(self, text, limit=10, field=None):
+        """Find the NEOs whose name or designation best matches some text.
+
+        Unlike `get_neo_by_name` and `get_neo_by_designation`, the matching
+        ignores case and whitespace, and also finds prefixes and near misses.
+
+        :param text: The (partial or misspelled) name or designation to find.
+        :param limit: The maximum number of matches to return.
+        :param field: 'name' or 'designation' to only search that field.
+        :return: A list of `search.Match`es, best first.
+        """
+        return self.name_index.search(text, limit=limit, field=field)
+
     def query(self, filters):
         """Query Database.
 
@@ -140,27 +847,369 @@ class NEODatabase:
         If no arguments are provided, generate all known close approaches.
 
         The `CloseApproach` objects are generated in internal order,
-        which isn't guaranteed to be sorted meaninfully,
-        although is often sorted by time.
+        which is sorted by time.
+
+        The filters are first rewritten by `planner.plan_query`: bounds on
+        the same attribute are merged into ranges, and contradictory bounds
+        produce no results without scanning anything. Date ranges are
+        answered from the sorted time index, so only the rows inside their
+        window are examined. Within it, the column predicates run from the
+        most to the least selective, each on the rows the previous ones
+        kept; any other callables are compiled into one predicate (see
+        `filters.compile_filters`) and applied per row, and only to the rows
+        that survive. The window is scanned in growing chunks, so a consumer
+        that stops early (such as `filters.limit`) doesn't pay for the rest.
 
         :param filters: A collection of filters capturing
         user-specified criteria.
         :return: A stream of matching `CloseApproach` objects.
         """
-        if len(filters) == 0:
-            for approach in self._approaches:
-                yield approach
-        else:
-            for approach in self._approaches:
-                filter_res = False
-                for filt in filters:
-                    filter_res = filt(approach)
-                    if filter_res:
-                        continue
-                    else:
-                        break
-
-                if filter_res:
+        plan = plan_query(filters, self._statistics, indexed=('time',),
+                          bitmaps=self._bitmaps)
+        approach_at = self._approach_lookup()
+        if not plan.row_filters:
+            for rows in self._matching_rows(plan):
+                yield from map(approach_at, rows.tolist())
+            return
+        matches = compile_filters(plan.row_filters)
+        for rows in self._matching_rows(plan):
+            for row in rows.tolist():
+                approach = approach_at(row)
+                if matches(approach):
                     yield approach
-                else:
+
+    def match_rows(self, filters):
+        """Find the row numbers of all close approaches that match filters.
+
+        This evaluates the whole query at once, like `query` without early
+        stopping, but returns compact row numbers instead of objects, so the
+        result is cheap to keep (see `main.QueryCache`) and to turn into
+        approaches later with `approaches_at`.
+
+        :param filters: A collection of filters capturing
+        user-specified criteria.
+        :return: An int32 array of matching row numbers, in internal order.
+        """
+        plan = plan_query(filters, self._statistics, indexed=('time',),
+                          bitmaps=self._bitmaps)
+        return self._plan_rows(plan)
+
+    def match_many(self, filter_sets):
+        """Find the row numbers of the matches of several queries in one scan.
+
+        The union of the time windows of all the queries is scanned once, in
+        chunks. In each chunk, every distinct column predicate is evaluated
+        once and its mask is shared by all the queries that use it, as is
+        every bitmap term, and each query's mask is the AND of its masks
+        within its own time window.
+
+        :param filter_sets: A list of collections of filters.
+        :return: A list with an int32 array of matching row numbers for each
+        collection of filters, as from `match_rows`.
+        """
+        plans = [plan_query(filters, self._statistics, indexed=('time',),
+                            bitmaps=self._bitmaps)
+                 for filters in filter_sets]
+        windows = [(0, 0) if plan.empty
+                   else self._time_window(plan.index_ranges.get('time'))
+                   for plan in plans]
+        found = [[] for _ in plans]
+        live = [index for index, (start, stop) in enumerate(windows)
+                if start < stop]
+        start = min((windows[index][0] for index in live), default=0)
+        stop = max((windows[index][1] for index in live), default=0)
+
+        for chunk_start in range(start, stop, _LAST_CHUNK):
+            chunk_stop = min(chunk_start + _LAST_CHUNK, stop)
+            columns = {name: column[chunk_start:chunk_stop]
+                       for name, column in self._columns.items()}
+            masks = {}
+            for index in live:
+                first, last = windows[index]
+                if last <= chunk_start or first >= chunk_stop:
+                    continue
+                mask = np.zeros(chunk_stop - chunk_start, dtype=bool)
+                mask[max(first - chunk_start, 0):last - chunk_start] = True
+                for name, flag in plans[index].bitmaps:
+                    if (name, flag) not in masks:
+                        bits = self._bitmaps[name].mask(chunk_start, chunk_stop)
+                        masks[name, flag] = bits if flag else ~bits
+                    mask &= masks[name, flag]
+                for predicate in plans[index].predicates:
+                    # Equal ranges are the same predicate; others are only
+                    # shared by identity.
+                    key = (repr(predicate) if isinstance(predicate, RangePredicate)
+                           else id(predicate))
+                    if key not in masks:
+                        masks[key] = predicate.mask(columns)
+                    mask &= masks[key]
+                found[index].append(np.flatnonzero(mask) + chunk_start)
+
+        return [self._filter_rows(plan, np.concatenate(
+                    [np.empty(0, dtype=np.int64)] + parts))
+                for plan, parts in zip(plans, found)]
+
+    def _plan_rows(self, plan):
+        """Return an int32 array of all row numbers that satisfy a plan."""
+        rows = np.concatenate([np.empty(0, dtype=np.int64)]
+                              + list(self._matching_rows(plan, _LAST_CHUNK)))
+        return self._filter_rows(plan, rows)
+
+    def _filter_rows(self, plan, rows):
+        """Apply the row filters of a plan to the rows that satisfy its predicates.
+
+        :return: An int32 array of the remaining row numbers.
+        """
+        if plan.row_filters:
+            matches = compile_filters(plan.row_filters)
+            approach_at = self._approach_lookup()
+            rows = np.array([row for row in rows.tolist()
+                             if matches(approach_at(row))],
+                            dtype=np.int64)
+        return rows.astype(np.int32)
+
+    def count(self, filters):
+        """Count the close approaches that match filters.
+
+        No `CloseApproach` objects are visited unless a filter can't be
+        evaluated over the columns. If the only criteria are dates, the count
+        is read straight off the time index, and if the others are answered by
+        bitmap indexes alone (such as `--hazardous`), it is counted from the
+        packed bitmap within the time window.
+
+        :param filters: A collection of filters capturing
+        user-specified criteria.
+        :return: The number of matching close approaches.
+        """
+        plan = plan_query(filters, self._statistics, indexed=('time',),
+                          bitmaps=self._bitmaps)
+        if plan.empty:
+            return 0
+        if not plan.predicates and not plan.row_filters:
+            start, stop = self._time_window(plan.index_ranges.get('time'))
+            bitmap = self._plan_bitmap(plan)
+            if bitmap is not None:
+                return bitmap.count(start, stop)
+            return max(stop - start, 0)
+        return len(self._plan_rows(plan))
+
+    def summarize(self, rows):
+        """Aggregate the distance and velocity of close approaches by row.
+
+        Missing (NaN) values are left out of the aggregates. An aggregate of
+        no values is `nan`.
+
+        :param rows: An array of row numbers, as from `match_rows`.
+        :return: A dictionary with the number of rows under 'count', and a
+        dictionary of 'min', 'max' and 'mean' under 'distance' and 'velocity'.
+        """
+        return {'count': len(rows),
+                'distance': aggregate(self._columns['distance'][rows]),
+                'velocity': aggregate(self._columns['velocity'][rows])}
+
+    def stats(self, filters):
+        """Aggregate the distance and velocity of the matching close approaches.
+
+        :param filters: A collection of filters capturing
+        user-specified criteria.
+        :return: A dictionary of aggregates, as from `summarize`.
+        """
+        return self.summarize(self.match_rows(filters))
+
+    def sort_rows(self, rows, by, descending=False, k=None):
+        """Order row numbers by the value of a column, keeping the first `k`.
+
+        See `order_rows`. Rows with equal values keep their internal
+        (chronological) order, and rows with a missing value come last.
+
+        :param rows: An array of row numbers, as from `match_rows`.
+        :param by: The column to sort by, one of `SORT_KEYS`.
+        :param descending: Whether to put the largest values first.
+        :param k: The number of rows to keep, or `None` to keep all of them.
+        :return: An array of the (first `k`) row numbers in sorted order.
+        """
+        if by not in SORT_KEYS:
+            raise ValueError(f"Can't sort by {by!r}; expected one of {SORT_KEYS}.")
+        rows = np.asarray(rows)
+        if by == 'time':
+            keys = self._time[rows].astype(np.float64)
+            keys[self._time[rows] == _NO_TIME] = nan
+        else:
+            keys = self._columns[by][rows]
+        return order_rows(rows, keys, descending=descending, k=k)
+
+    def approaches_at(self, rows):
+        """Generate the close approaches at the given row numbers.
+
+        :param rows: An iterable of row numbers, as from `match_rows`.
+        :return: A stream of `CloseApproach` objects.
+        """
+        yield from map(self._approach_lookup(), np.asarray(rows).tolist())
+
+
+def _snapshot_neo(pdes, name, diameter, hazardous):
+    """Create a `NearEarthObject` from its values in a snapshot."""
+    info = {'pdes': pdes, 'diameter': diameter, 'pha': 'Y' if hazardous else 'N'}
+    if name:
+        info['name'] = str(name)
+    return NearEarthObject(**info)
+
+
+def _snapshot_approach(des, minutes, distance, velocity):
+    """Create a `CloseApproach` from its values in a snapshot."""
+    info = {'des': des, 'dist': distance, 'v_rel': velocity}
+    if minutes != _NO_TIME:
+        info['minutes'] = minutes
+    return CloseApproach(**info)
+
+
+class _LazyObjects:
+    """The NEOs and close approaches of a snapshot, created on first use.
+
+    An NEO is created together with all of its close approaches, so that
+    its `.approaches` are complete, and so a close approach of an NEO is
+    created by creating the NEO. The rows of the first few NEOs are found by
+    scanning the NEO index; after that, the NEO index is grouped by NEO with
+    one sort, which the rows of every later NEO are looked up in.
+
+    Objects are created under a lock, and an NEO and its approaches are only
+    stored once they are all created and linked, so that a thread that finds
+    an object without taking the lock (as a query in the server's executor
+    does) never sees a partly linked one.
+    """
+
+    def __init__(self, columns, neo_index):
+        """Wrap the columns of a snapshot, as for `NEODatabase.from_snapshot`.
+
+        :param columns: A dictionary of the arrays of a snapshot.
+        :param neo_index: For each approach, the index of its NEO, or -1.
+        """
+        self._columns = columns
+        self._neo_index = neo_index
+        self._designations = columns['designations'].tolist()
+        self._scans = 0
+        self._neo_rows = None
+        self._lock = threading.RLock()
+        # The objects created so far, or None.
+        self.neos = [None] * len(columns['neo_designation'])
+        self.approaches = [None] * len(neo_index)
+
+    def _rows_of(self, index):
+        """Return the rows of the approaches of an NEO, in order of time."""
+        if self._neo_rows is None and self._scans < _NEO_SCANS:
+            self._scans += 1
+            return np.flatnonzero(self._neo_index == index)
+        if self._neo_rows is None:
+            order = np.argsort(self._neo_index, kind='stable')
+            bounds = np.searchsorted(self._neo_index[order],
+                                     np.arange(len(self.neos) + 1))
+            self._neo_rows = order, bounds
+        order, bounds = self._neo_rows
+        return order[bounds[index]:bounds[index + 1]]
+
+    def _new_approaches(self, rows):
+        """Create the (unlinked) close approaches of an array of rows."""
+        columns = self._columns
+        designations = self._designations
+        return [_snapshot_approach(designations[code], minutes, distance, velocity)
+                for code, minutes, distance, velocity in zip(
+                    columns['approach_designation'][rows].tolist(),
+                    columns['approach_time'][rows].tolist(),
+                    columns['approach_distance'][rows].tolist(),
+                    columns['approach_velocity'][rows].tolist())]
+
+    def neo(self, index):
+        """Return the NEO at an index, creating it and its approaches."""
+        neo = self.neos[index]
+        if neo is not None:
+            return neo
+        with self._lock:
+            neo = self.neos[index]
+            if neo is None:
+                columns = self._columns
+                neo = _snapshot_neo(
+                    columns['neo_designation'][index], columns['neo_name'][index],
+                    columns['neo_diameter'][index], columns['neo_hazardous'][index])
+                rows = self._rows_of(index).tolist()
+                neo.approaches = self._new_approaches(rows)
+                for approach in neo.approaches:
+                    approach.neo = neo
+                for row, approach in zip(rows, neo.approaches):
+                    self.approaches[row] = approach
+                self.neos[index] = neo
+        return neo
+
+    def approach(self, row):
+        """Return the close approach of a row, creating it and its NEO."""
+        approach = self.approaches[row]
+        if approach is not None:
+            return approach
+        index = int(self._neo_index[row])
+        if index >= 0:
+            self.neo(index)
+            return self.approaches[row]
+        with self._lock:
+            if self.approaches[row] is None:
+                self.approaches[row] = self._new_approaches([row])[0]
+        return self.approaches[row]
+
+    def materialize(self):
+        """Create every NEO and close approach that isn't created yet.
+
+        :return: A tuple of the list of `NearEarthObject`s and the list of
+        `CloseApproach`es, linked together.
+        """
+        with self._lock:
+            columns = self._columns
+            neos, approaches = self.neos, self.approaches
+            created = {}
+            for index, values in enumerate(zip(
+                    columns['neo_designation'].tolist(), columns['neo_name'].tolist(),
+                    columns['neo_diameter'].tolist(),
+                    columns['neo_hazardous'].tolist())):
+                if neos[index] is None:
+                    created[index] = _snapshot_neo(*values)
+            # The approaches of the NEOs created earlier exist already, so the
+            # new approaches are only linked to the NEOs created above.
+            designations = self._designations
+            new_rows = {}
+            for row, (code, minutes, distance, velocity, index) in enumerate(zip(
+                    columns['approach_designation'].tolist(),
+                    columns['approach_time'].tolist(),
+                    columns['approach_distance'].tolist(),
+                    columns['approach_velocity'].tolist(),
+                    self._neo_index.tolist())):
+                if approaches[row] is not None:
                     continue
+                approach = new_rows[row] = _snapshot_approach(
+                    designations[code], minutes, distance, velocity)
+                if index >= 0:
+                    approach.neo = created[index]
+                    created[index].approaches.append(approach)
+            # Only store the objects once they are all linked.
+            for row, approach in new_rows.items():
+                approaches[row] = approach
+            for index, neo in created.items():
+                neos[index] = neo
+        return neos, approaches
+
+
+class _Gather(collections.abc.Mapping):
+    """A mapping of columns, narrowed on access to a subset of their rows."""
+
+    def __init__(self, columns, rows):
+        """Narrow each column of `columns` to the row numbers `rows`."""
+        self._columns = columns
+        self._rows = rows
+
+    def __getitem__(self, name):
+        """Return the selected rows of a column."""
+        return self._columns[name][self._rows]
+
+    def __iter__(self):
+        """Iterate over the column names."""
+        return iter(self._columns)
+
+    def __len__(self):
+        """Return the number of columns."""
+        return len(self._columns)
@@ -0,0 +1,201 @@
+"""Reload changed data files into a live `NEODatabase`.
+
+Rebuilding the database means reading both data files, building every
+object, linking them and rebuilding every column. When only one file has
+changed - typically a few close approaches added to or removed from the end
+of `cad.json` - most of that work is wasted. Instead:
+
+- `DataFiles` remembers the size and modification time of each data file,
+  so that only the files that changed since the last (re)load are read.
+- `diff_neos` and `diff_approaches` compare the columns read from a file
+  (see `extract.load_neo_columns` and `extract.load_approach_columns`) with
+  the database. NEOs are keyed by primary designation; close approaches by
+  their designation, time, distance and velocity, so that an approach whose
+  values changed counts as removed and added again. Objects are only built
+  for the rows that were added.
+- `reload` applies the differences with `NEODatabase.apply_neo_delta` and
+  `NEODatabase.apply_approach_delta`, which keep the sorted time index, the
+  columns, the planner statistics and the links between objects consistent.
+"""
+import collections
+import math
+import os
+
+import profiling
+from extract import (approaches_from_columns, field_arrays, load_approach_columns,
+                     load_neo_columns, neos_from_columns)
+
+
+# The roles of the data files, in the order in which they are reloaded.
+ROLES = ('neos', 'approaches')
+
+# A summary of the changes applied by `reload`, as counts of objects.
+ReloadSummary = collections.namedtuple(
+    'ReloadSummary',
+    'roles neos_added neos_removed neos_updated approaches_added '
+    'approaches_removed')
+
+
+class DataFiles:
+    """The NEO and close approach files of a database, and their last state."""
+
+    def __init__(self, neofile, cadfile):
+        """Remember the current state of both data files.
+
+        :param neofile: A Path to the CSV file of NEOs.
+        :param cadfile: A Path to the JSON file of close approaches.
+        """
+        self.paths = {'neos': neofile, 'approaches': cadfile}
+        self._stamps = {}
+        self.mark_loaded()
+
+    @staticmethod
+    def _stamp(path):
+        """Return the size and modification time of a file, or `None`."""
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        return stat.st_size, stat.st_mtime_ns
+
+    def changed(self):
+        """List the roles of the files that changed since they were loaded.
+
+        :return: A list of roles from `ROLES`.
+        """
+        return [role for role in ROLES
+                if self._stamp(self.paths[role]) != self._stamps[role]]
+
+    def mark_loaded(self, roles=ROLES):
+        """Remember the current state of some of the files.
+
+        :param roles: The roles of the files that were (re)loaded.
+        """
+        for role in roles:
+            self._stamps[role] = self._stamp(self.paths[role])
+
+
+def _same_float(first, second):
+    """Return whether two floats are equal, counting NaN as equal to NaN."""
+    return first == second or (math.isnan(first) and math.isnan(second))
+
+
+def diff_neos(database, columns):
+    """Compare the NEOs of a database with columns read from a NEO file.
+
+    :param database: A `NEODatabase`.
+    :param columns: A dictionary of columns, as for `load_neo_columns`.
+    :return: A tuple of a list of new `NearEarthObject`s, a list of the
+    database's NEOs that are no longer in the file, and a list of pairs of
+    one of the database's NEOs and a new `NearEarthObject` with its new
+    name, diameter or hazardous flag.
+    """
+    existing = database._pdes_to_neos
+    present = set()
+    added_rows = []
+    updated_rows = []
+    for row, (pdes, name, diameter, hazardous) in enumerate(zip(
+            columns['pdes'], columns['name'], columns['diameter'].tolist(),
+            columns['pha'].tolist())):
+        present.add(pdes)
+        neo = existing.get(pdes)
+        if neo is None:
+            added_rows.append(row)
+        elif (neo.name != name or neo.hazardous != hazardous
+              or not _same_float(neo.diameter, diameter)):
+            updated_rows.append(row)
+
+    def build(rows):
+        return neos_from_columns({
+            key: ([values[row] for row in rows] if isinstance(values, list)
+                  else values[rows])
+            for key, values in columns.items()})
+
+    added = build(added_rows)
+    updated = [(existing[new.designation], new) for new in build(updated_rows)]
+    removed = [neo for pdes, neo in existing.items() if pdes not in present]
+    return added, removed, updated
+
+
+def _approach_key(des, minutes, dist, v_rel):
+    """Return the key of a close approach, from its (possibly missing) values.
+
+    Missing distances and velocities default to 0.0, as in `CloseApproach`.
+    """
+    return (des, minutes, 0.0 if dist is None else float(dist),
+            0.0 if v_rel is None else float(v_rel))
+
+
+def diff_approaches(database, columns):
+    """Compare the close approaches of a database with columns from a file.
+
+    Close approaches are compared as a multiset, so duplicated rows are
+    added or removed one at a time.
+
+    :param database: A `NEODatabase`.
+    :param columns: A dictionary of columns, as for `load_approach_columns`,
+    with the optional fields of the database (`NEODatabase.fields`).
+    :return: A tuple of a list of new, unlinked `CloseApproach`es, a list
+    of the rows (as for `NEODatabase.match_rows`) of the approaches that are
+    no longer in the file, and a dictionary of the optional field arrays of
+    the new approaches (see `extract.field_arrays`).
+    """
+    incoming = collections.defaultdict(list)
+    for row, values in enumerate(zip(columns['des'], columns['minutes'],
+                                     columns['dist'], columns['v_rel'])):
+        incoming[_approach_key(*values)].append(row)
+
+    removed_rows = []
+    for row, approach in enumerate(database._approaches):
+        rows = incoming.get((approach._designation, approach.minutes,
+                             approach.distance, approach.velocity))
+        if rows:
+            rows.pop()
+        else:
+            removed_rows.append(row)
+
+    added_rows = sorted(row for rows in incoming.values() for row in rows)
+    added_columns = {key: [values[row] for row in added_rows]
+                     for key, values in columns.items()}
+    added = list(approaches_from_columns(added_columns))
+    return added, removed_rows, field_arrays(added_columns, database.fields)
+
+
+def reload(database, files, roles=None):
+    """Apply the changes in some data files to a live database.
+
+    The NEO file is reloaded before the close approach file, so that new
+    approaches are linked to new NEOs.
+
+    :param database: A `NEODatabase`.
+    :param files: The `DataFiles` of the database.
+    :param roles: The roles of the files to reload, by default those that
+    changed since they were last loaded.
+    :return: A `ReloadSummary` of the changes.
+    """
+    roles = [role for role in ROLES
+             if role in (files.changed() if roles is None else roles)]
+    counts = dict.fromkeys(ReloadSummary._fields[1:], 0)
+
+    if 'neos' in roles:
+        with profiling.stage('reload_neos') as timing:
+            columns = load_neo_columns(files.paths['neos'])
+            added, removed, updated = diff_neos(database, columns)
+            if added or removed or updated:
+                database.apply_neo_delta(added, removed, updated)
+            timing.rows = len(added) + len(removed) + len(updated)
+        counts.update(neos_added=len(added), neos_removed=len(removed),
+                      neos_updated=len(updated))
+
+    if 'approaches' in roles:
+        with profiling.stage('reload_approaches') as timing:
+            columns = load_approach_columns(files.paths['approaches'],
+                                            database.fields)
+            added, removed_rows, fields = diff_approaches(database, columns)
+            database.apply_approach_delta(added, removed_rows, fields)
+            timing.rows = len(added) + len(removed_rows)
+        counts.update(approaches_added=len(added),
+                      approaches_removed=len(removed_rows))
+
+    files.mark_loaded(roles)
+    return ReloadSummary(roles, **counts)
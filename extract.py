@@ -5,11 +5,18 @@ from CSV and JSON files.
 
 The `load_neos` function extracts NEO data from a CSV file, formatted as
 described in the project instructions, into a collection of `NearEarthObject`s.
+Large CSV files are split on line boundaries and parsed in several processes.
 
 The `load_approaches` function extracts close approach data from a JSON file,
 formatted as described in the project instructions, into a collection of
 `CloseApproach` objects.
 
+The `load_data` function reads both files at once, parsing them concurrently
+in two processes where possible. Given a selection of the optional close
+approach fields in `APPROACH_FIELDS` (such as `dist_min` or `h`), it also
+returns them as typed NumPy columns, one value per approach, rather than as
+attributes of each `CloseApproach`.
+
 The main module calls these functions with the arguments provided
 at the command line, and uses the resulting collections
 to build an `NEODatabase`.
@@ -18,13 +25,168 @@ You'll edit this file in Task 2.
 """
 
 
+import collections
+import concurrent.futures
+from concurrent.futures.process import BrokenProcessPool
 import csv
+import io
+import itertools
 import json
+import math
+import os
 import numpy as np
 
+import profiling
+from helpers import cd_to_minutes
 from models import NearEarthObject, CloseApproach
 
 
+# The number of close approach rows whose dates are converted at once.
+_BATCH_SIZE = 8192
+
+# The smallest part of the NEO CSV file that is parsed in its own process.
+_MIN_CHUNK_BYTES = 4 << 20
+
+# The optional fields of the close approach file that can be loaded as typed
+# columns, and their dtypes. Julian dates and distances keep full precision.
+APPROACH_FIELDS = {
+    'jd': np.float64,
+    'dist_min': np.float64,
+    'dist_max': np.float64,
+    'v_inf': np.float32,
+    't_sigma_f': np.float32,
+    'h': np.float32,
+}
+
+
+def _neo_chunk_columns(neo_csv_path, start, stop, header_index):
+    """Parse the rows in a byte range of an NEO CSV file into columns.
+
+    This runs in worker processes (see `load_neo_columns`). The byte range
+    must start and end on line boundaries.
+
+    :param neo_csv_path: A path to a CSV file containing
+                        data about near-Earth objects.
+    :param start: The offset of the first byte of the range.
+    :param stop: The offset just past the last byte of the range.
+    :param header_index: A mapping from each wanted column name to its
+    position in a row.
+    :return: A dictionary of columns, as for `load_neo_columns`.
+    """
+    with open(neo_csv_path, 'rb') as neocsv:
+        neocsv.seek(start)
+        text = neocsv.read(stop - start).decode('utf-8')
+    rows = list(csv.reader(io.StringIO(text, newline=None)))
+    width = header_index['width']
+    if any(len(row) != width for row in rows):
+        raise ValueError(f'{neo_csv_path}: a chunk boundary split a record.')
+
+    pdes, name, diameter, pha = (header_index[key] for key in
+                                 ('pdes', 'name', 'diameter', 'pha'))
+    return {
+        'pdes': [row[pdes] for row in rows],
+        'name': [row[name] or None for row in rows],
+        'diameter': np.array([float(row[diameter]) if row[diameter]
+                              else math.nan for row in rows],
+                             dtype=np.float64),
+        'pha': np.array([row[pha] == 'Y' for row in rows], dtype=bool),
+    }
+
+
+def _line_aligned_ranges(neo_csv_path, start, count):
+    """Split a file, from `start` to its end, into byte ranges of whole lines.
+
+    :return: A list of at most `count` (start, stop) pairs, in file order.
+    """
+    size = os.path.getsize(neo_csv_path)
+    bounds = [start]
+    with open(neo_csv_path, 'rb') as neocsv:
+        for i in range(1, count):
+            target = start + (size - start) * i // count
+            if target <= bounds[-1]:
+                continue
+            neocsv.seek(target - 1)
+            neocsv.readline()
+            if neocsv.tell() >= size:
+                break
+            if neocsv.tell() > bounds[-1]:
+                bounds.append(neocsv.tell())
+    bounds.append(size)
+    return list(zip(bounds[:-1], bounds[1:]))
+
+
+def load_neo_columns(neo_csv_path, workers=None,
+                     min_chunk_bytes=_MIN_CHUNK_BYTES):
+    """Read the NEO columns of interest from a CSV file into typed arrays.
+
+    Only the `pdes`, `name`, `diameter` and `pha` columns are kept. A large
+    file is split into byte ranges on line boundaries, which are parsed in
+    worker processes and merged back in order; a small file (or a single
+    worker) is parsed in this process. Records are assumed not to contain
+    line breaks inside quoted fields, which holds for NASA's data; if a
+    chunk boundary splits one anyway, the file is reparsed in one piece.
+
+    :param neo_csv_path: A path to a CSV file containing
+                        data about near-Earth objects.
+    :param workers: The number of worker processes, by default one per CPU.
+    :param min_chunk_bytes: The smallest byte range worth a worker process.
+    :return: A dictionary mapping `pdes` and `name` to lists of strings
+    (`None` for a missing name), `diameter` to a float64 array (NaN for an
+    unknown diameter) and `pha` to a boolean array.
+    """
+    with open(neo_csv_path, 'rb') as neocsv:
+        header = next(csv.reader([neocsv.readline().decode('utf-8')]))
+        data_start = neocsv.tell()
+    header_index = {key: header.index(key)
+                    for key in ('pdes', 'name', 'diameter', 'pha')}
+    header_index['width'] = len(header)
+
+    workers = workers or os.cpu_count() or 1
+    count = min(workers,
+                (os.path.getsize(neo_csv_path) - data_start)
+                // max(min_chunk_bytes, 1))
+    ranges = _line_aligned_ranges(neo_csv_path, data_start, max(count, 1))
+    if len(ranges) < 2:
+        return _neo_chunk_columns(neo_csv_path, data_start,
+                                  os.path.getsize(neo_csv_path), header_index)
+
+    try:
+        with concurrent.futures.ProcessPoolExecutor(len(ranges)) as pool:
+            chunks = list(pool.map(_neo_chunk_columns,
+                                   *zip(*((neo_csv_path, start, stop,
+                                           header_index)
+                                          for start, stop in ranges))))
+    except (OSError, NotImplementedError, RuntimeError, ValueError,
+            BrokenProcessPool):
+        return _neo_chunk_columns(neo_csv_path, data_start,
+                                  os.path.getsize(neo_csv_path), header_index)
+
+    return {
+        'pdes': [pdes for chunk in chunks for pdes in chunk['pdes']],
+        'name': [name for chunk in chunks for name in chunk['name']],
+        'diameter': np.concatenate([chunk['diameter'] for chunk in chunks]),
+        'pha': np.concatenate([chunk['pha'] for chunk in chunks]),
+    }
+
+
+def neos_from_columns(columns):
+    """Build `NearEarthObject`s from columns of NEO data.
+
+    :param columns: A dictionary of columns, as for `load_neo_columns`.
+    :return: A list of `NearEarthObject`s.
+    """
+    neos = []
+    for pdes, name, diameter, pha in zip(columns['pdes'], columns['name'],
+                                         columns['diameter'].tolist(),
+                                         columns['pha'].tolist()):
+        neo_info = {'pdes': pdes, 'diameter': diameter,
+                    'pha': 'Y' if pha else 'N'}
+        if name is not None:
+            neo_info['name'] = name
+        neos.append(NearEarthObject(**neo_info))
+    return neos
+
+
 def load_neos(neo_csv_path):
     """Read near-Earth object information from a CSV file.
 
@@ -32,52 +194,329 @@ def load_neos(neo_csv_path):
                         data about near-Earth objects.
     :return: A collection of `NearEarthObject`s.
     """
-    search_header_name = ['name', 'pdes', 'diameter', 'pha']
-    neo_infos = []
-    with open(neo_csv_path, 'r') as neocsv:
-        reader = csv.reader(neocsv)
-        header = np.array(next(reader))
+    with profiling.stage('load_neos') as timing:
+        neos = neos_from_columns(load_neo_columns(neo_csv_path))
+        timing.rows = len(neos)
+    return neos
+
+
+class _JSONStream:
+    """A bounded-memory reader of JSON values from a text file.
+
+    Only the current window of the file is kept in memory. Values are decoded
+    with `json.JSONDecoder.raw_decode`; a value that runs off the end of the
+    window is retried after reading another chunk.
+    """
+
+    def __init__(self, fileobj, chunk_size=1 << 16):
+        """Create a new `_JSONStream` over an open text file.
+
+        :param fileobj: A file-like object opened in text mode.
+        :param chunk_size: The number of characters to read at a time.
+        """
+        self._file = fileobj
+        self._chunk_size = chunk_size
+        self._decoder = json.JSONDecoder()
+        self._buf = ''
+        self._pos = 0
+        self._eof = False
+
+    def _fill(self):
+        """Read another chunk, dropping the consumed part of the window.
+
+        :return: Whether any more data was read.
+        """
+        if self._eof:
+            return False
+        chunk = self._file.read(self._chunk_size)
+        if not chunk:
+            self._eof = True
+            return False
+        self._buf = self._buf[self._pos:] + chunk
+        self._pos = 0
+        return True
 
-        header_name_index = [np.where(header == header_name)[0][0]
-                             for header_name in search_header_name]
+    def peek(self):
+        """Skip whitespace and return the next character, or '' at EOF."""
+        while True:
+            while (self._pos < len(self._buf)
+                   and self._buf[self._pos] in ' \t\r\n'):
+                self._pos += 1
+            if self._pos < len(self._buf):
+                return self._buf[self._pos]
+            if not self._fill():
+                return ''
 
-        ii = 0
-        for data_line in iter(reader):
-            ii += 1
-            neo_info = dict()
-            for index in header_name_index:
-                if data_line[index] is None or data_line[index] == '':
-                    continue
-                neo_info[header[index]] = data_line[index]
-            neo_infos.append(NearEarthObject(**neo_info))
+    def expect(self, char):
+        """Consume the next non-whitespace character, which must be `char`."""
+        found = self.peek()
+        if found != char:
+            raise ValueError(f'Expected {char!r} in JSON stream, '
+                             f'found {found!r}')
+        self._pos += 1
 
-    return neo_infos
+    def decode(self):
+        """Decode and consume the next complete JSON value."""
+        self.peek()
+        while True:
+            try:
+                value, end = self._decoder.raw_decode(self._buf, self._pos)
+            except json.JSONDecodeError:
+                if not self._fill():
+                    raise
+                continue
+            # A number may continue into the next chunk.
+            if end == len(self._buf) and self._fill():
+                continue
+            self._pos = end
+            return value
+
+    def iter_array(self):
+        """Decode the elements of the next JSON array one at a time.
+
+        :yield: Each element of the array, in order.
+        """
+        self.expect('[')
+        while self.peek() != ']':
+            yield self.decode()
+            if self.peek() == ',':
+                self.expect(',')
+        self.expect(']')
+
+
+def iter_approach_rows(cad_json_path):
+    """Stream the close approach records of a JSON file one at a time.
+
+    The file is read incrementally: the `"fields"` header is decoded, and
+    then the rows of the `"data"` array are decoded and yielded one by one,
+    so memory use doesn't grow with the size of the file. Other top-level
+    keys are skipped. If the `"data"` array precedes the `"fields"` header,
+    it is skipped over on a first pass and streamed on a second one.
+
+    :param cad_json_path: A path to a JSON file containing data
+        about close approaches.
+    :yield: A dictionary mapping each field name to its value in a row.
+    """
+    fields = None
+    for _ in range(2):
+        with open(cad_json_path, 'r') as jfile:
+            stream = _JSONStream(jfile)
+            stream.expect('{')
+            while stream.peek() != '}':
+                key = stream.decode()
+                stream.expect(':')
+                if key == 'data' and fields is not None:
+                    for row in stream.iter_array():
+                        yield dict(zip(fields, row))
+                    return
+                elif key == 'data':
+                    collections.deque(stream.iter_array(), maxlen=0)
+                elif key == 'fields':
+                    fields = stream.decode()
+                else:
+                    stream.decode()
+                if stream.peek() == ',':
+                    stream.expect(',')
+        if fields is None:
+            break
+    raise ValueError(f'{cad_json_path}: no "fields" header and "data" '
+                     f'array found.')
+
+
+def sigma_to_minutes(text):
+    """Convert a `t_sigma_f` time uncertainty to a number of minutes.
+
+    The uncertainty is formatted as `HH:MM` or `D_HH:MM`, possibly as an
+    upper bound such as `< 00:01`, which is taken at face value.
+
+    :param text: The uncertainty, as a string, or `None`.
+    :return: The uncertainty in minutes, or `nan` if it is missing.
+    """
+    if not text:
+        return math.nan
+    days, _, clock = text.lstrip('< ').rpartition('_')
+    hours, _, minutes = clock.partition(':')
+    return (int(days or 0) * 24 + int(hours)) * 60 + int(minutes)
+
+
+def _field_value(field, value):
+    """Convert the value of an optional field to a float, `nan` if missing."""
+    if field == 't_sigma_f':
+        return sigma_to_minutes(value)
+    return math.nan if value in ('', None) else float(value)
+
+
+def iter_approach_columns(cad_json_path, fields=()):
+    """Stream close approach data from a JSON file as batches of columns.
+
+    Rows are taken from `iter_approach_rows` in batches, so that the `cd`
+    calendar dates of a whole batch are converted with `cd_to_minutes` at
+    once rather than one `strptime` call per row. Missing values are `None`,
+    except in optional fields, where they are `nan`.
+
+    :param cad_json_path: A path to a JSON file containing data
+        about close approaches.
+    :param fields: Names of optional fields (from `APPROACH_FIELDS`) to read
+    as well, as floats (`t_sigma_f` in minutes, see `sigma_to_minutes`).
+    :yield: A dictionary mapping `des`, `minutes`, `dist`, `v_rel` and each
+    of `fields` to lists of values, one per row of the batch.
+    """
+    for field in fields:
+        if field not in APPROACH_FIELDS:
+            raise ValueError(f"Unknown close approach field {field!r}; "
+                             f"expected one of {tuple(APPROACH_FIELDS)}.")
+    rows = iter_approach_rows(cad_json_path)
+    while True:
+        batch = list(itertools.islice(rows, _BATCH_SIZE))
+        if not batch:
+            return
+
+        columns = {key: [None if row.get(key) == '' else row.get(key)
+                         for row in batch]
+                   for key in ('des', 'dist', 'v_rel')}
+        has_cd = [row.get('cd') not in ('', None) for row in batch]
+        minutes = iter(cd_to_minutes([row['cd'] for row, timed
+                                      in zip(batch, has_cd) if timed])
+                       .tolist())
+        columns['minutes'] = [next(minutes) if timed else None
+                              for timed in has_cd]
+        for field in fields:
+            columns[field] = [_field_value(field, row.get(field)) for row in batch]
+        yield columns
+
+
+def load_approach_columns(cad_json_path, fields=()):
+    """Read close approach data from a JSON file into columns.
+
+    Columns are plain lists of simple values, so they are cheap to send
+    between processes (see `load_data`).
+
+    :param cad_json_path: A path to a JSON file containing data
+        about close approaches.
+    :param fields: Names of optional fields to read as well.
+    :return: A dictionary of columns, as for `iter_approach_columns`.
+    """
+    columns = {key: [] for key in ('des', 'minutes', 'dist', 'v_rel', *fields)}
+    for batch in iter_approach_columns(cad_json_path, fields):
+        for key, values in batch.items():
+            columns[key].extend(values)
+    return columns
+
+
+def field_arrays(columns, fields):
+    """Convert the optional fields of close approach columns to NumPy arrays.
+
+    :param columns: A dictionary of columns, as for `load_approach_columns`.
+    :param fields: The names of the optional fields to convert.
+    :return: A dictionary mapping each field to an array of the dtype in
+    `APPROACH_FIELDS`.
+    """
+    return {field: np.array(columns[field], dtype=APPROACH_FIELDS[field])
+            for field in fields}
+
+
+def approaches_from_columns(columns):
+    """Build `CloseApproach` objects from columns of close approach data.
+
+    :param columns: A dictionary of columns, as for `iter_approach_columns`.
+    :yield: A `CloseApproach` for each row.
+    """
+    keys = ('des', 'minutes', 'dist', 'v_rel')
+    for values in zip(*(columns[key] for key in keys)):
+        yield CloseApproach(**{key: value for key, value in zip(keys, values)
+                               if value is not None})
+
+
+def iter_approaches(cad_json_path):
+    """Stream `CloseApproach` objects from a JSON file.
+
+    :param cad_json_path: A path to a JSON file containing data
+        about close approaches.
+    :yield: A `CloseApproach` for each record in the file.
+    """
+    for columns in iter_approach_columns(cad_json_path):
+        yield from approaches_from_columns(columns)
 
 
 def load_approaches(cad_json_path):
     """Read close approach data from a JSON file.
 
+    The file is parsed incrementally with `iter_approaches`, so the full
+    JSON document is never held in memory next to the parsed objects.
+
     :param cad_json_path: A path to a JSON file containing data
         about close approaches.
     :return: A collection of `CloseApproach`es.
     """
-    cad_infos = []
-    search_fields_keys = ['des', 'cd', 'dist', 'v_rel']
-
-    with open(cad_json_path, 'r') as jfile:
-        jfile_data = json.load(jfile)
-        fields_index = zip(jfile_data['fields'],
-                           range(len(jfile_data['fields'])))
-        fields_index = [(key, index) for key, index in fields_index
-                        if key in search_fields_keys]
-
-        for cad_data in jfile_data['data']:
-            cad_info = dict()
-            for key, index in fields_index:
-                if cad_data[index] != '' or cad_data[index] is not None:
-                    cad_info[key] = cad_data[index]
-                else:
-                    continue
-            cad_infos.append(CloseApproach(**cad_info))
+    with profiling.stage('load_approaches') as timing:
+        approaches = list(iter_approaches(cad_json_path))
+        timing.rows = len(approaches)
+    return approaches
+
+
+def _load_approaches_and_fields(cad_json_path, fields):
+    """Read close approaches and their optional fields from a JSON file.
+
+    :return: A tuple of a list of `CloseApproach`es and a dictionary of
+    typed arrays, as from `field_arrays`.
+    """
+    with profiling.stage('load_approaches') as timing:
+        columns = load_approach_columns(cad_json_path, fields)
+        approaches = list(approaches_from_columns(columns))
+        timing.rows = len(approaches)
+    return approaches, field_arrays(columns, fields)
+
+
+def load_data(neo_csv_path, cad_json_path, parallel=True, fields=()):
+    """Read both data files, parsing them concurrently if possible.
+
+    The two files are independent, so while a worker process parses the
+    close approach JSON file into columns, this process parses the NEO CSV
+    file; the approaches are then built from the columns sent back. If
+    `parallel` is false, there is a single CPU, or a worker process can't be
+    started (or dies), the files are parsed one after the other instead.
+
+    :param neo_csv_path: A path to a CSV file containing
+                        data about near-Earth objects.
+    :param cad_json_path: A path to a JSON file containing data
+        about close approaches.
+    :param parallel: Whether to try to parse the files concurrently.
+    :param fields: Names of optional close approach fields (from
+    `APPROACH_FIELDS`) to load as typed columns.
+    :return: A tuple of a collection of `NearEarthObject`s and a collection
+    of `CloseApproach`es, and, if `fields` are given, a dictionary mapping
+    each field to an array with one value per approach, as for the `fields`
+    of `NEODatabase`.
+    """
+    fields = tuple(fields)
+
+    def load_sequentially(neos=None):
+        if neos is None:
+            neos = load_neos(neo_csv_path)
+        if not fields:
+            return neos, load_approaches(cad_json_path)
+        return (neos, *_load_approaches_and_fields(cad_json_path, fields))
+
+    if not parallel or (os.cpu_count() or 1) < 2:
+        return load_sequentially()
+
+    try:
+        pool = concurrent.futures.ProcessPoolExecutor(max_workers=1)
+        cad_future = pool.submit(load_approach_columns, cad_json_path, fields)
+    except (OSError, NotImplementedError, RuntimeError):
+        return load_sequentially()
 
-    return cad_infos
+    with pool:
+        neos = load_neos(neo_csv_path)
+        try:
+            # Only the time spent waiting for the worker is counted here.
+            with profiling.stage('load_approaches'):
+                cad_columns = cad_future.result()
+        except BrokenProcessPool:
+            return load_sequentially(neos)
+    with profiling.stage('load_approaches') as timing:
+        approaches = list(approaches_from_columns(cad_columns))
+        timing.rows = len(approaches)
+    if not fields:
+        return neos, approaches
+    return neos, approaches, field_arrays(cad_columns, fields)
@@ -13,6 +13,12 @@ from a comparator (from the `operator` module), a reference value, and a class
 method `get` that subclasses can override to fetch an attribute of interest
 from the supplied `CloseApproach`.
 
+With `compiled=True`, `create_filters` returns a `CompiledFilters` instead: the
+same list of filters, which is also callable as a single predicate generated by
+`compile_filters`. The bounds on each attribute are merged, and each attribute
+of a close approach is read once and checked against all of its bounds with one
+chained comparison, instead of calling every filter (and its `get`) in turn.
+
 The `limit` function simply limits the maximum number of values produced by an
 iterator.
 
@@ -20,10 +26,15 @@ You'll edit this file in Tasks 3a and 3c.
 """
 
 
+import math
 import operator
 import itertools
 import sys
 
+from extract import APPROACH_FIELDS
+from helpers import MINUTES_PER_DAY, date_to_day
+from planner import RANGE_OPS, RangePredicate
+
 
 class UnsupportedCriterionError(NotImplementedError):
     """A filter criterion is unsupported."""
@@ -59,10 +70,13 @@ class AttributeFilter:
         self.op = op
         self.value = value
         self.attr = attr
+        # The value that the attribute is compared with: times are compared
+        # as whole days since the epoch.
+        self.operand = date_to_day(value) if attr == 'time' else value
 
     def __call__(self, approach):
         """Invoke `self(approach)`."""
-        return self.op(self.get(approach), self.value)
+        return self.op(self.get(approach), self.operand)
 
     def get(self, approach):
         """Get an attribute of interest from a close approach.
@@ -72,16 +86,18 @@ class AttributeFilter:
 
         :param approach: A `CloseApproach` on which to evaluate this filter.
         :return: The value of an attribute of interest, comparable to
-        `self.value` via `self.op`.
+        `self.value` via `self.op` (for `time`, as days since the epoch).
         """
         try:
             attribute = self.attr
             if attribute == 'time':
-                return (approach.time.date())
+                return approach.minutes // MINUTES_PER_DAY
             elif attribute == 'diameter':
                 return approach.neo.diameter
             elif attribute == 'hazardous':
                 return approach.neo.hazardous
+            elif attribute == 'named':
+                return bool(approach.neo.name)
 
             else:
                 return getattr(approach, attribute)
@@ -89,17 +105,165 @@ class AttributeFilter:
         except Exception:
             raise UnsupportedCriterionError
 
+    def mask(self, columns):
+        """Evaluate this filter over whole columns at once.
+
+        The `columns` mapping holds one NumPy array per attribute, with one
+        entry per close approach (see `NEODatabase`). The `time` column holds
+        approach days since the epoch, like the integer form of a `date`
+        value used by `__call__`.
+
+        :param columns: A mapping from attribute name to a column array.
+        :return: A boolean array, `True` where the row satisfies the filter.
+        """
+        try:
+            column = columns[self.attr]
+        except KeyError:
+            raise UnsupportedCriterionError
+        return self.op(column, self.operand)
+
     def __repr__(self):
         """For using the print() function on the AttributeFilter."""
         return (f'{self.__class__.__name__}(op=operator.{self.op.__name__}, '
                 f'value={self.value})')
 
 
+# The expression that reads each attribute of a `CloseApproach` in a compiled
+# predicate, as in `AttributeFilter.get`.
+_ATTRIBUTE_EXPRESSIONS = {
+    'time': f'approach.minutes // {MINUTES_PER_DAY}',
+    'diameter': 'approach.neo.diameter',
+    'hazardous': 'approach.neo.hazardous',
+    'named': 'bool(approach.neo.name)',
+}
+
+
+def compile_filters(filters):
+    """Compile a collection of filters into a single predicate function.
+
+    The `AttributeFilter`s on each attribute are merged into one range (see
+    `planner.RangePredicate`), and the source of a function that reads the
+    attribute once and compares it with both bounds in one chained
+    comparison is generated and compiled. The attributes of the approach
+    itself are checked before those of its NEO. Any other callables in the
+    collection are called, in order, after the ranges. As with the filters,
+    an attribute that can't be read raises `UnsupportedCriterionError`.
+
+    :param filters: A collection of filters, as from `create_filters`.
+    :return: A function of a `CloseApproach` that returns whether it
+    satisfies every filter.
+    """
+    ranges = {}
+    others = []
+    for filt in filters:
+        attr = getattr(filt, 'attr', None)
+        if (isinstance(filt, AttributeFilter) and filt.op in RANGE_OPS
+                and (attr in _ATTRIBUTE_EXPRESSIONS or attr.isidentifier())):
+            predicate = ranges.setdefault(attr, RangePredicate(attr))
+            predicate.restrict(filt.op, filt.operand)
+        else:
+            others.append(filt)
+
+    namespace = {'UnsupportedCriterionError': UnsupportedCriterionError}
+    conditions = []
+    for index, attr in enumerate(sorted(
+            ranges, key=lambda attr: attr in ('diameter', 'hazardous', 'named'))):
+        predicate = ranges[attr]
+        if predicate.empty:
+            conditions = ['False']
+            break
+        value = _ATTRIBUTE_EXPRESSIONS.get(attr, f'approach.{attr}')
+        low, high = f'_low_{index}', f'_high_{index}'
+        namespace[low], namespace[high] = predicate.low, predicate.high
+        if predicate.low == predicate.high:
+            conditions.append(f'{value} == {low}')
+            continue
+        condition = value
+        if predicate.low != -math.inf:
+            op = '<=' if predicate.low_inclusive else '<'
+            condition = f'{low} {op} {condition}'
+        if predicate.high != math.inf:
+            op = '<=' if predicate.high_inclusive else '<'
+            condition = f'{condition} {op} {high}'
+        if condition != value:
+            conditions.append(condition)
+    for index, filt in enumerate(others):
+        namespace[f'_filter_{index}'] = filt
+        conditions.append(f'_filter_{index}(approach)')
+
+    # Comparisons are already booleans; other filters may return any value.
+    expression = ' and '.join(conditions) or 'True'
+    if others:
+        expression = f'bool({expression})'
+    source = ('def predicate(approach):\n'
+              '    try:\n'
+              f'        return {expression}\n'
+              '    except (AttributeError, TypeError):\n'
+              '        raise UnsupportedCriterionError from None\n')
+    exec(compile(source, '<compiled filters>', 'exec'), namespace)
+    predicate = namespace['predicate']
+    predicate.source = source
+    return predicate
+
+
+class CompiledFilters(list):
+    """A collection of filters that is also one compiled predicate.
+
+    It is a list of the filters, as `create_filters` returns without
+    `compiled=True`, so it can be used wherever that list can; calling it
+    on a `CloseApproach` runs the predicate from `compile_filters`.
+
+    The predicate is compiled on the first call, and is compiled again after
+    the list changes, so it always checks the filters that are in the list.
+    """
+
+    def __init__(self, filters=()):
+        """Collect filters to compile.
+
+        :param filters: A collection of filters, as from `create_filters`.
+        """
+        super().__init__(filters)
+        self._predicate = None
+
+    @property
+    def predicate(self):
+        """The predicate compiled from the filters now in the list."""
+        if self._predicate is None:
+            self._predicate = compile_filters(self)
+        return self._predicate
+
+    def __call__(self, approach):
+        """Return whether a `CloseApproach` satisfies every filter."""
+        predicate = self._predicate
+        if predicate is None:
+            predicate = self.predicate
+        return predicate(approach)
+
+
+def _invalidating(name):
+    """Wrap a mutating `list` method to drop the compiled predicate."""
+    method = getattr(list, name)
+
+    def mutate(self, *args, **kwargs):
+        self._predicate = None
+        return method(self, *args, **kwargs)
+    mutate.__name__ = mutate.__qualname__ = name
+    mutate.__doc__ = method.__doc__
+    return mutate
+
+
+for _name in ('__setitem__', '__delitem__', '__iadd__', '__imul__', 'append',
+              'extend', 'insert', 'pop', 'remove', 'clear', 'sort', 'reverse'):
+    setattr(CompiledFilters, _name, _invalidating(_name))
+del _name
+
+
 def create_filters(date=None, start_date=None, end_date=None,
                    distance_min=None, distance_max=None,
                    velocity_min=None, velocity_max=None,
                    diameter_min=None, diameter_max=None,
-                   hazardous=None):
+                   hazardous=None, dist_min_max=None, h_max=None,
+                   v_inf_min=None, named=None, compiled=False):
     """Create a collection of filters from user-specified criteria.
 
     Each of these arguments is provided by the main module with a value from
@@ -138,6 +302,15 @@ def create_filters(date=None, start_date=None, end_date=None,
                         `CloseApproach`.
     :param hazardous: Whether the NEO of a matching `CloseApproach`
                     is potentially hazardous.
+    :param dist_min_max: A maximum minimum-possible (3-sigma) approach
+                    distance for a matching `CloseApproach`.
+    :param h_max: A maximum absolute magnitude for a matching
+                    `CloseApproach`.
+    :param v_inf_min: A minimum hyperbolic excess velocity for a matching
+                    `CloseApproach`.
+    :param named: Whether the NEO of a matching `CloseApproach` has a name.
+    :param compiled: Whether to return a `CompiledFilters`, which can also
+                    be called as one predicate on a `CloseApproach`.
     :return: A collection of filters for use with `query`.
     """
     AttributeFilter_collection = []
@@ -182,10 +355,60 @@ def create_filters(date=None, start_date=None, end_date=None,
         AttributeFilter_collection.append(AttributeFilter(operator.eq,
                                                           hazardous,
                                                           attr='hazardous'))
+    if named is not None:
+        AttributeFilter_collection.append(AttributeFilter(operator.eq,
+                                                          named,
+                                                          attr='named'))
+
+    # These optional fields are only kept as database columns (see
+    # `extract.APPROACH_FIELDS`), not as attributes of a `CloseApproach`.
+    if dist_min_max is not None:
+        AttributeFilter_collection.append(AttributeFilter(operator.le,
+                                                          dist_min_max,
+                                                          attr='dist_min'))
+    if h_max is not None:
+        AttributeFilter_collection.append(AttributeFilter(operator.le,
+                                                          h_max,
+                                                          attr='h'))
+    if v_inf_min is not None:
+        AttributeFilter_collection.append(AttributeFilter(operator.ge,
+                                                          v_inf_min,
+                                                          attr='v_inf'))
 
+    if compiled:
+        return CompiledFilters(AttributeFilter_collection)
     return AttributeFilter_collection
 
 
+def filters_key(filters):
+    """Return a hashable key identifying the criteria of a collection of filters.
+
+    The key doesn't depend on the order of the filters, so two collections
+    that encode the same criteria have the same key. Only `AttributeFilter`s
+    can be keyed; for any other collection, return `None`.
+
+    :param filters: A collection of filters, as from `create_filters`.
+    :return: A hashable key, or `None`.
+    """
+    if not all(isinstance(filt, AttributeFilter) for filt in filters):
+        return None
+    return frozenset((filt.attr, filt.op.__name__, filt.value)
+                     for filt in filters)
+
+
+def required_fields(filters):
+    """List the optional close approach fields that filters compare.
+
+    These fields (see `extract.APPROACH_FIELDS`) are only available as
+    database columns, so they must be loaded to evaluate the filters.
+
+    :param filters: A collection of filters, as from `create_filters`.
+    :return: A sorted list of field names.
+    """
+    return sorted({filt.attr for filt in filters
+                   if getattr(filt, 'attr', None) in APPROACH_FIELDS})
+
+
 def limit(iterator, n=None):
     """Produce a limited stream of values from an iterator.
 
@@ -9,9 +9,29 @@ The `datetime_to_str` function converts a Python `datetime` into a string.
 Although `datetime`s already have human-readable string representations, those
 representations display seconds, but NASA's data (and our datetimes!) don't
 provide that level of resolution, so the output format also will not.
+
+For bulk work, times are also represented as integer minutes since the Unix
+epoch. The `cd_to_minutes` function converts a whole column of `cd` strings
+into epoch minutes at once, using a fixed month lookup instead of `strptime`,
+and `minutes_to_datetime` and `datetime_to_minutes` convert single values
+between the two forms. The `minutes_to_strs` function formats a whole column of
+epoch minutes like `datetime_to_str`.
 """
 import datetime
 
+import numpy as np
+
+
+EPOCH = datetime.datetime(1970, 1, 1)
+MINUTES_PER_DAY = 24 * 60
+
+_CD_WIDTH = len('2020-Dec-31 12:00')
+_MONTHS = ('jan', 'feb', 'mar', 'apr', 'may', 'jun',
+           'jul', 'aug', 'sep', 'oct', 'nov', 'dec')
+_MONTH_KEYS = np.array([(ord(m[0]) << 16) | (ord(m[1]) << 8) | ord(m[2])
+                        for m in _MONTHS], dtype=np.int64)
+_MONTH_ORDER = np.argsort(_MONTH_KEYS)
+
 
 def cd_to_datetime(calendar_date):
     """Convert a NASA-formatted calendar date/time description into a datetime.
@@ -42,3 +62,120 @@ def datetime_to_str(dt):
     :return: That datetime, as a human-readable string without seconds.
     """
     return datetime.datetime.strftime(dt, "%Y-%m-%d %H:%M")
+
+
+def datetime_to_minutes(dt):
+    """Convert a naive Python datetime into whole minutes since the epoch.
+
+    :param dt: A naive Python datetime.
+    :return: The number of minutes from 1970-01-01 00:00 to `dt`, as an int.
+    """
+    return (dt - EPOCH) // datetime.timedelta(minutes=1)
+
+
+def minutes_to_datetime(minutes):
+    """Convert whole minutes since the epoch into a naive Python datetime.
+
+    :param minutes: A number of minutes since 1970-01-01 00:00.
+    :return: The corresponding naive `datetime`.
+    """
+    return EPOCH + datetime.timedelta(minutes=int(minutes))
+
+
+def date_to_day(date):
+    """Convert a `date` into whole days since the epoch.
+
+    Dividing epoch minutes by `MINUTES_PER_DAY` (rounding down) gives the
+    same day number, so dates compare directly against minute columns.
+
+    :param date: A Python `date` (or `datetime`, whose time is ignored).
+    :return: The number of days from 1970-01-01 to `date`, as an int.
+    """
+    return date.toordinal() - EPOCH.toordinal()
+
+
+def cd_to_minutes(calendar_dates):
+    """Convert a column of NASA-formatted calendar dates into epoch minutes.
+
+    This is the batch counterpart of `cd_to_datetime`: every value in the
+    result equals `datetime_to_minutes(cd_to_datetime(calendar_date))` for
+    the corresponding input. Strings in the fixed `YYYY-bb-DD hh:mm` layout
+    are decoded with NumPy arithmetic on their character codes and a fixed
+    (case-insensitive, English) month lookup; anything else falls back to
+    `cd_to_datetime`, which raises `ValueError` for malformed dates.
+
+    :param calendar_dates: An iterable of calendar dates in YYYY-bb-DD hh:mm
+    format.
+    :return: A NumPy int64 array of minutes since 1970-01-01 00:00.
+    """
+    dates = np.asarray(list(calendar_dates)
+                       if not isinstance(calendar_dates, np.ndarray)
+                       else calendar_dates, dtype=str)
+    minutes = np.zeros(dates.shape, dtype=np.int64)
+    if dates.size == 0:
+        return minutes
+
+    regular = np.flatnonzero(np.char.str_len(dates) == _CD_WIDTH)
+    chars = (dates[regular].astype(f'U{_CD_WIDTH}')
+             .view(np.uint32).reshape(-1, _CD_WIDTH).astype(np.int64))
+    digits = chars - ord('0')
+
+    def number(*positions):
+        value = np.zeros(len(chars), dtype=np.int64)
+        for position in positions:
+            value = value * 10 + digits[:, position]
+        return value
+
+    year = number(0, 1, 2, 3)
+    day = number(9, 10)
+    hour = number(12, 13)
+    minute = number(15, 16)
+    # Setting the 0x20 bit lower-cases ASCII letters.
+    letters = chars[:, 5:8] | 0x20
+    key = (letters[:, 0] << 16) | (letters[:, 1] << 8) | letters[:, 2]
+    slot = np.searchsorted(_MONTH_KEYS[_MONTH_ORDER], key).clip(0, 11)
+    month = _MONTH_ORDER[slot]
+
+    numeric = np.array([0, 1, 2, 3, 9, 10, 12, 13, 15, 16])
+    valid = ((digits[:, numeric] >= 0) & (digits[:, numeric] <= 9)).all(axis=1)
+    valid &= ((chars[:, 4] == ord('-')) & (chars[:, 8] == ord('-'))
+              & (chars[:, 11] == ord(' ')) & (chars[:, 14] == ord(':')))
+    valid &= (_MONTH_KEYS[month] == key) & (year >= 1)
+    valid &= (hour < 24) & (minute < 60) & (day >= 1)
+
+    months = (year - 1970) * 12 + month
+    month_start = months.astype('datetime64[M]').astype('datetime64[D]')
+    month_end = (months + 1).astype('datetime64[M]').astype('datetime64[D]')
+    valid &= day <= (month_end - month_start).astype(np.int64)
+
+    days = month_start.astype(np.int64) + day - 1
+    minutes[regular] = (days * MINUTES_PER_DAY) + hour * 60 + minute
+
+    irregular = np.ones(dates.shape, dtype=bool)
+    irregular[regular[valid]] = False
+    for index in np.flatnonzero(irregular):
+        minutes[index] = datetime_to_minutes(cd_to_datetime(str(dates[index])))
+    return minutes
+
+
+def minutes_to_strs(minutes):
+    """Format a column of epoch minutes as human-readable strings.
+
+    This is the batch counterpart of `datetime_to_str`: each string is the
+    same as `datetime_to_str(minutes_to_datetime(m))` (for four-digit years).
+
+    A missing time (`None`) is formatted as an empty string, which is how a
+    CSV row shows an approach without a time.
+
+    :param minutes: An iterable of minutes since 1970-01-01 00:00 (or `None`).
+    :return: A list of strings in YYYY-MM-DD hh:mm format.
+    """
+    minutes = list(minutes)
+    known = [m for m in minutes if m is not None]
+    stamps = np.datetime_as_string(
+        np.asarray(known, dtype=np.int64).astype('datetime64[m]'))
+    strs = [stamp[:10] + ' ' + stamp[11:] for stamp in stamps.tolist()]
+    if len(strs) == len(minutes):
+        return strs
+    strs = iter(strs)
+    return ['' if m is None else next(strs) for m in minutes]
@@ -2,12 +2,15 @@
 """Explore a dataset of near-Earth objects and their close approaches to Earth.
 See `README.md` for a detailed discussion of this project.
 This script can be invoked from the command line::
-    $ python3 main.py {inspect,query,interactive} [args]
+    $ python3 main.py {inspect,query,batch,ingest,interactive,serve} [args]
 The `inspect` subcommand looks up an NEO by name or by primary designation, and
 optionally lists all of that NEO's known close approaches:
     $ python3 main.py inspect --pdes 1P
     $ python3 main.py inspect --name Halley
     $ python3 main.py inspect --verbose --name Halley
+Names and designations are matched regardless of case and spacing, and if no NEO
+matches, the closest names or designations are suggested. In the interactive
+shell, the Tab key completes them after `--name` or `--pdes`.
 The `query` subcommand searches for close approaches that match given criteria:
     $ python3 main.py query --date 1969-07-29
     $ python3 main.py query --start-date 2020-01-01 --end-date 2020-01-31 --max-distance 0.025
@@ -15,37 +18,107 @@ The `query` subcommand searches for close approaches that match given criteria:
     $ python3 main.py query --date 2020-03-14 --max-velocity 25 --min-diameter 0.5 --hazardous
     $ python3 main.py query --start-date 2000-01-01 --max-diameter 0.1 --not-hazardous
     $ python3 main.py query --hazardous --max-distance 0.05 --min-velocity 30
-The set of results can be limited in size and/or saved to an output file in CSV
-or JSON format:
+    $ python3 main.py query --start-date 2020-01-01 --named --hazardous
+The set of results can be limited in size and/or saved to an output file in CSV,
+JSON or newline-delimited JSON format:
     $ python3 main.py query --limit 5 --outfile results.csv
     $ python3 main.py query --limit 15 --outfile results.json
+    $ python3 main.py query --limit 15 --outfile results.ndjson
+The results can be sorted by time, distance, velocity or diameter; with a limit,
+only the top matches are selected:
+    $ python3 main.py query --start-date 2020-01-01 --sort-by distance --limit 20
+    $ python3 main.py query --hazardous --sort-by velocity --desc --limit 5
+To only count the matches, or summarize their distances and velocities, without
+listing them:
+    $ python3 main.py query --start-date 2020-01-01 --count
+    $ python3 main.py query --hazardous --max-distance 0.05 --stats
+The optional fields of the close approach file (`jd`, `dist_min`, `dist_max`,
+`v_inf`, `t_sigma_f` and `h`) are only loaded, as typed columns, when selected with
+`--fields` or used by a query's `--max-dist-min`, `--max-h` or `--min-v-inf`
+filter. The snapshot keeps the fields it was built with, and is rebuilt with
+the selected ones if it lacks any of them:
+    $ python3 main.py query --max-dist-min 0.01 --max-h 22 --count
+    $ python3 main.py --fields dist_min h v_inf interactive
+The `batch` subcommand runs a file of queries, one per line with the same options
+as `query` (blank lines and lines starting with `#` are skipped). The data is
+loaded once, all the queries are answered by a single scan of the database, and
+the matches are written to all the `--outfile`s in a single pass:
+    $ python3 main.py batch reports.txt
 The `interactive` subcommand loads the NEO database and spawns an interactive
 command shell that can repeatedly execute `inspect` and `query` commands without
-having to wait to reload the database each time. However, it doesn't hot-reload.
+having to wait to reload the database each time. Its `reload` command applies
+the changes to `--neofile` or `--cadfile` to the loaded database, reading only the
+files that changed; with `--watch`, this happens before each command:
+    $ python3 main.py interactive --watch
 If needed, the script can load data from data files other than the default with
-`--neofile` or `--cadfile`.
+`--neofile` or `--cadfile`. After the first load, a binary snapshot of the
+database is kept next to the close approach file and reused until either data
+file changes; `--no-snapshot` skips it. When the data files are parsed, they are
+parsed concurrently in two processes, unless `--sequential` is given.
+Alternatively, `--sqlite` keeps the data in an indexed SQLite file, imported from
+the data files on first use, which any number of processes can then open:
+    $ python3 main.py --sqlite neos.sqlite query --max-distance 0.01 --count
+The `ingest` subcommand appends newer batches of NEOs or close approaches (in the
+formats of `--neofile` and `--cadfile`) to the snapshot or to the `--sqlite` file,
+skipping any NEO or approach (by designation and time) that is already there.
+Ingested records are kept until the snapshot is rebuilt from changed data files:
+    $ python3 main.py ingest --approaches cad-page.json
+    $ python3 main.py --sqlite neos.sqlite ingest --neos new-neos.csv --approaches cad-page.json
+The `serve` subcommand loads the database once and answers `inspect` and `query`
+requests over a local HTTP/JSON API (see `server.py`), streaming large results:
+    $ python3 main.py serve --port 8000
+    $ curl 'http://127.0.0.1:8000/query?start_date=2020-01-01&distance_max=0.05&limit=5'
+To see where the time of a run goes, `--profile` prints the wall-clock and CPU time
+and row count of each stage (loading, linking, querying and writing), and
+`--profile-out` saves cProfile data of the whole run:
+    $ python3 main.py --profile --profile-out run.prof query --outfile results.csv
 """
 import argparse
 import cmd
+import collections
+import cProfile
 import datetime
 import pathlib
+import re
 import shlex
 import sys
 import time
 
-from extract import load_neos, load_approaches
-from database import NEODatabase
-from filters import create_filters, limit
-from write import write_to_csv, write_to_json
+import numpy as np
+
+import profiling
+from delta import DataFiles, reload
+from extract import (APPROACH_FIELDS, approaches_from_columns, field_arrays,
+                     load_approach_columns, load_data, load_neos)
+from database import NEODatabase, SORT_KEYS
+from filters import create_filters, filters_key, limit, required_fields
+from search import normalize
+from write import WRITERS, write_to_csv, write_to_json, write_to_ndjson
+from snapshot import holds_ingested, load_snapshot, save_snapshot, snapshot_path
+from server import serve
+from sqlite_database import SQLiteNEODatabase, append_data, import_data
 
 # Paths to the root of the project and the `data` subfolder.
 PROJECT_ROOT = pathlib.Path(__file__).parent.resolve()
 DATA_ROOT = PROJECT_ROOT / 'data'
 
+# The value typed so far after the last `--pdes` or `--name` option of a line.
+_INSPECT_VALUE = re.compile(r'(?:^|\s)(-p|--pdes|-n|--name)\s+((?:(?!\s-)[^\'"])*)$')
+
 # The current time, for use with the kill-on-change feature of the interactive shell.
 _START = time.time()
 
 
+class JoinWords(argparse.Action):
+    """Store the words of a multi-word argument as one space-separated string.
+    This lets designations such as `2020 AY1` be given without quotes.
+    """
+
+    def __call__(self, parser, namespace, values, option_string=None):
+        """Join the words of the argument and store them."""
+        setattr(namespace, self.dest, ' '.join(values))
+
+
 def date_fromisoformat(date_string):
     """Return a `datetime.date` corresponding to a string in YYYY-MM-DD format.
     In Python 3.7+, there is `datetime.date.fromisoformat`, but alas - we're
@@ -77,6 +150,26 @@ def make_parser():
     parser.add_argument('--cadfile', default=(DATA_ROOT / 'cad.json'),
                         type=pathlib.Path,
                         help="Path to JSON file of close approach data.")
+    parser.add_argument('--no-snapshot', dest='snapshot', action='store_false',
+                        help="Neither read nor write the binary snapshot of the database "
+                             "kept next to the close approach data file.")
+    parser.add_argument('--sequential', dest='parallel', action='store_false',
+                        help="Parse the data files one after the other, "
+                             "instead of concurrently in two processes.")
+    parser.add_argument('--sqlite', type=pathlib.Path,
+                        help="Use this SQLite database file instead of loading the data "
+                             "into memory. If it doesn't exist, the data files are "
+                             "imported into it first.")
+    parser.add_argument('--fields', nargs='+', choices=tuple(APPROACH_FIELDS), default=[],
+                        help="Also load these optional fields of the close approach file "
+                             "as typed columns. The fields compared by a query's filters "
+                             "are loaded anyway.")
+    parser.add_argument('--profile', action='store_true',
+                        help="Print the wall-clock and CPU time and the row count of "
+                             "each stage of the run (in the interactive shell, of "
+                             "each command) to standard error.")
+    parser.add_argument('--profile-out', type=pathlib.Path,
+                        help="Save cProfile data for the whole run to this file.")
     subparsers = parser.add_subparsers(dest='cmd')
 
     # Add the `inspect` subcommand parser.
@@ -85,9 +178,10 @@ def make_parser():
     inspect.add_argument('-v', '--verbose', action='store_true',
                          help="Additionally, print all known close approaches of this NEO.")
     inspect_id = inspect.add_mutually_exclusive_group(required=True)
-    inspect_id.add_argument('-p', '--pdes',
-                            help="The primary designation of the NEO to inspect (e.g. '433').")
-    inspect_id.add_argument('-n', '--name',
+    inspect_id.add_argument('-p', '--pdes', nargs='+', action=JoinWords,
+                            help="The primary designation of the NEO to inspect "
+                                 "(e.g. '433' or '2020 AY1').")
+    inspect_id.add_argument('-n', '--name', nargs='+', action=JoinWords,
                             help="The IAU name of the NEO to inspect (e.g. 'Halley').")
 
     # Add the `query` subcommand parser.
@@ -132,21 +226,190 @@ def make_parser():
     filters.add_argument('--not-hazardous', dest='hazardous', default=None, action='store_false',
                          help="If specified, only return close approaches of NEOs that "
                               "are not potentially hazardous.")
+    filters.add_argument('--named', dest='named', default=None, action='store_true',
+                         help="If specified, only return close approaches of NEOs that "
+                              "have a name.")
+    filters.add_argument('--unnamed', dest='named', default=None, action='store_false',
+                         help="If specified, only return close approaches of NEOs that "
+                              "don't have a name.")
+    filters.add_argument('--max-dist-min', dest='dist_min_max', type=float,
+                         help="In astronomical units. Only return close approaches whose "
+                              "minimum possible (3-sigma) distance is as near or nearer to "
+                              "Earth as the given distance.")
+    filters.add_argument('--max-h', dest='h_max', type=float,
+                         help="Only return close approaches of NEOs whose absolute "
+                              "magnitude (H) is as bright or brighter than the given one.")
+    filters.add_argument('--min-v-inf', dest='v_inf_min', type=float,
+                         help="In kilometers per second. Only return close approaches whose "
+                              "hyperbolic excess velocity is as fast or faster than the "
+                              "given velocity.")
     query.add_argument('-l', '--limit', type=int,
                        help="The maximum number of matches to return. "
                             "Defaults to 10 if no --outfile is given.")
     query.add_argument('-o', '--outfile', type=pathlib.Path,
-                       help="File in which to save structured results. "
-                            "If omitted, results are printed to standard output.")
+                       help="File in which to save structured results (.csv, .json, "
+                            ".ndjson or .jsonl). If omitted, results are printed to "
+                            "standard output.")
+    query.add_argument('--sort-by', choices=SORT_KEYS,
+                       help="Sort the matches by this attribute (ascending, unless "
+                            "--desc is given). Matches missing it come last.")
+    query.add_argument('--desc', action='store_true',
+                       help="With --sort-by, put the largest values first.")
+    aggregate = query.add_mutually_exclusive_group()
+    aggregate.add_argument('--count', action='store_true',
+                           help="Only print the number of matches.")
+    aggregate.add_argument('--stats', action='store_true',
+                           help="Only print the number of matches and the minimum, "
+                                "maximum and mean of their distances and velocities.")
+
+    # Add the `batch` subcommand parser.
+    batch = subparsers.add_parser('batch',
+                                  description="Run a file of queries, one per line with the "
+                                              "options of `query`, in a single scan.")
+    batch.add_argument('specfile', type=pathlib.Path,
+                       help="Path to a file of queries, e.g. "
+                            "`--start-date 2020-01-01 --hazardous --outfile pha.csv`.")
+
+    # Add the `ingest` subcommand parser.
+    ingest = subparsers.add_parser('ingest',
+                                   description="Append new NEOs and close approaches to the "
+                                               "snapshot of the database (or the `--sqlite` "
+                                               "file), skipping those already present.")
+    ingest.add_argument('--neos', type=pathlib.Path,
+                        help="Path to a CSV file of new near-Earth objects, "
+                             "in the format of `--neofile`.")
+    ingest.add_argument('--approaches', type=pathlib.Path,
+                        help="Path to a JSON file of new close approaches (such as a "
+                             "page of the CAD API), in the format of `--cadfile`.")
 
     repl = subparsers.add_parser('interactive',
                                  description="Start an interactive command session "
                                              "to repeatedly run `interact` and `query` commands.")
     repl.add_argument('-a', '--aggressive', action='store_true',
                       help="If specified, kill the session whenever a project file is modified.")
+    repl.add_argument('--cache-size', type=int, default=16,
+                      help="The number of distinct query results to keep in memory "
+                           "(0 disables the cache). Defaults to 16.")
+    repl.add_argument('-w', '--watch', action='store_true',
+                      help="If specified, reload the data files that changed before "
+                           "each command.")
+
+    server = subparsers.add_parser('serve',
+                                   description="Answer `inspect` and `query` requests "
+                                               "over a local HTTP/JSON API.")
+    server.add_argument('--host', default='127.0.0.1',
+                        help="The address to listen on. Defaults to 127.0.0.1.")
+    server.add_argument('--port', type=int, default=8000,
+                        help="The port to listen on. Defaults to 8000.")
     return parser, inspect, query
 
 
+def load_database(neofile, cadfile, snapshot=True, parallel=True, fields=()):
+    """Build an `NEODatabase` from the data files, reusing a snapshot if possible.
+    If a snapshot of these data files exists and is up to date, it is loaded
+    instead of parsing the files. Otherwise the files are parsed and, if
+    `snapshot` is set, a fresh snapshot is saved for the next run. The snapshot
+    holds the optional close approach fields that it was built with, and is only
+    used if it has all of `fields`. A snapshot holding records added by `ingest`
+    is never replaced, as they would be lost.
+    :param neofile: A Path to the CSV file of near-Earth objects.
+    :param cadfile: A Path to the JSON file of close approach data.
+    :param snapshot: Whether to read and write the snapshot cache.
+    :param parallel: Whether to parse the data files concurrently.
+    :param fields: Names of optional close approach fields to load as columns.
+    :return: The `NEODatabase` containing data on NEOs and their close approaches.
+    """
+    if snapshot:
+        cached = load_snapshot(neofile, cadfile, fields)
+        if cached is not None:
+            return cached
+
+    database = NEODatabase(*load_data(neofile, cadfile, parallel=parallel, fields=fields))
+    if snapshot and holds_ingested(cadfile):
+        print(f"The snapshot {snapshot_path(cadfile)} holds ingested records that "
+              f"aren't in the data files, so it isn't replaced and they are left out "
+              f"of this run; delete it to rebuild it from the data files.",
+              file=sys.stderr)
+    elif snapshot:
+        try:
+            with profiling.stage('save_snapshot'):
+                save_snapshot(database, neofile, cadfile)
+        except OSError as err:
+            print(f"Unable to save a snapshot of the database: {err}", file=sys.stderr)
+    return database
+
+
+def open_sqlite_database(path, neofile, cadfile):
+    """Open a SQLite NEO database, importing the data files into it if it doesn't exist.
+    The import only happens once; to re-import changed data files, delete the
+    SQLite file.
+    :param path: A Path to the SQLite database file.
+    :param neofile: A Path to the CSV file of near-Earth objects.
+    :param cadfile: A Path to the JSON file of close approach data.
+    :return: A `SQLiteNEODatabase`.
+    """
+    if not path.exists():
+        with profiling.stage('import_sqlite') as timing:
+            neo_count, approach_count = import_data(path, neofile, cadfile)
+            timing.rows = neo_count + approach_count
+        print(f"Imported {neo_count} NEOs and {approach_count} close approaches "
+              f"into {path}.", file=sys.stderr)
+    return SQLiteNEODatabase(path)
+
+
+def ingest(args):
+    """Perform the `ingest` subcommand.
+    The new NEOs are added before the new close approaches, so that the approaches
+    are linked to them. With `--sqlite`, they are appended to the SQLite file with
+    `append_data`; otherwise, they are added to the loaded `NEODatabase` with
+    `add_neos` and `add_approaches`, and a new snapshot of it is saved. As the
+    ingested records are only kept in that snapshot, it is saved with every optional
+    close approach field, so that no later query needs to rebuild it.
+    :param args: All arguments from the command line, as parsed by the top-level parser.
+    """
+    if args.neos is None and args.approaches is None:
+        print("Nothing to ingest: give `--neos` and/or `--approaches`.", file=sys.stderr)
+        return
+    if args.sqlite:
+        open_sqlite_database(args.sqlite, args.neofile, args.cadfile).close()
+        with profiling.stage('ingest') as timing:
+            neo_count, approach_count = append_data(args.sqlite, args.neos,
+                                                    args.approaches)
+            timing.rows = neo_count + approach_count
+        target = args.sqlite
+    elif not args.snapshot:
+        print("Ingested records are kept in the snapshot (or a `--sqlite` file), "
+              "so `ingest` can't be used with `--no-snapshot`.", file=sys.stderr)
+        return
+    else:
+        fields = tuple(APPROACH_FIELDS)
+        database = load_snapshot(args.neofile, args.cadfile, fields)
+        if database is None:
+            if holds_ingested(args.cadfile):
+                print(f"The snapshot {snapshot_path(args.cadfile)} holds ingested "
+                      f"records but is out of date or lacks some optional fields; "
+                      f"delete it to rebuild it from the data files.", file=sys.stderr)
+                return
+            database = load_database(args.neofile, args.cadfile,
+                                     parallel=args.parallel, fields=fields)
+        with profiling.stage('ingest') as timing:
+            neos = database.add_neos(load_neos(args.neos)) if args.neos else []
+            approaches = []
+            if args.approaches:
+                # Read the database's optional fields of the new approaches too.
+                columns = load_approach_columns(args.approaches, database.fields)
+                approaches = database.add_approaches(
+                    approaches_from_columns(columns),
+                    fields=field_arrays(columns, database.fields))
+            neo_count, approach_count = len(neos), len(approaches)
+            timing.rows = neo_count + approach_count
+        with profiling.stage('save_snapshot'):
+            ingested = bool(neo_count or approach_count) or holds_ingested(args.cadfile)
+            target = save_snapshot(database, args.neofile, args.cadfile,
+                                   ingested=ingested)
+    print(f"Added {neo_count} NEOs and {approach_count} close approaches to {target}.")
+
+
 def inspect(database, pdes=None, name=None, verbose=False):
     """Perform the `inspect` subcommand.
     This function fetches an NEO by designation or by name. If a matching NEO is
@@ -154,7 +417,9 @@ def inspect(database, pdes=None, name=None, verbose=False):
     all of the NEO's known close approaches is printed if `verbose=True`).
     Otherwise, a message is printed noting that there are no matching NEOs.
     At least one of `pdes` and `name` must be given. If both are given, prefer
-    to look up the NEO by the primary designation.
+    to look up the NEO by the primary designation. If there is no exact match,
+    a match that only differs in case or whitespace is accepted; otherwise,
+    the closest names or designations are suggested.
     :param database: The `NEODatabase` containing data on NEOs and their close approaches.
     :param pdes: The primary designation of an NEO for which to search.
     :param name: The name of an NEO for which to search.
@@ -162,15 +427,27 @@ def inspect(database, pdes=None, name=None, verbose=False):
     :return: The matching `NearEarthObject`, or None if not found.
     """
     # Fetch the NEO of interest.
-    if pdes:
-        neo = database.get_neo_by_designation(pdes)
-    else:
-        neo = database.get_neo_by_name(name)
+    with profiling.stage('lookup'):
+        if pdes:
+            neo = database.get_neo_by_designation(pdes)
+        else:
+            neo = database.get_neo_by_name(name)
 
-    # Ensure that we have received an NEO.
+    # Fall back to a case- and whitespace-insensitive match, or else suggest
+    # the closest names or designations.
     if not neo:
-        print("No matching NEOs exist in the database.", file=sys.stderr)
-        return None
+        field = 'designation' if pdes else 'name'
+        with profiling.stage('search'):
+            matches = database.search_neos(pdes or name, limit=5, field=field)
+        exact = [match for match in matches if match.kind == 'exact']
+        if len(exact) == 1:
+            neo = database.get_neo_by_designation(exact[0].neo.designation)
+        else:
+            print("No matching NEOs exist in the database.", file=sys.stderr)
+            if matches:
+                print("Did you mean: " + ", ".join(match.key for match in matches) + "?",
+                      file=sys.stderr)
+            return None
 
     # Display information about this NEO, and optionally its close approaches if verbose.
     print(neo)
@@ -180,40 +457,275 @@ def inspect(database, pdes=None, name=None, verbose=False):
     return neo
 
 
-def query(database, args):
+def query(database, args, cache=None):
     """Perform the `query` subcommand.
     Create a collection of filters with `create_filters` and supply them to the
     database's `query` method to produce a stream of matching results.
     If an output file wasn't given, print these results to stdout, limiting to
     10 entries if no limit was specified. If an output file was given, use the
-    file's extension to infer whether the file should hold CSV or JSON data, and
-    then write the results to the output file in that format.
+    file's extension to infer whether the file should hold CSV, JSON or
+    newline-delimited JSON (`.ndjson` or `.jsonl`) data, and then write the
+    results to the output file in that format.
+    With `--count` or `--stats`, only print aggregates of the matches, computed
+    from the database's columns without listing the matching close approaches.
+    With `--sort-by`, all matches are found first and the first `--limit` of
+    them, in sorted order, are selected by `NEODatabase.sort_rows`.
+    If a `QueryCache` is given, the matching rows are looked up in (or added
+    to) the cache, so that repeating a query with only a different `--limit` or
+    `--outfile` doesn't scan the database again.
     :param database: The `NEODatabase` containing data on NEOs and their close approaches.
     :param args: All arguments from the command line, as parsed by the top-level parser.
+    :param cache: An optional `QueryCache` of matching rows.
     """
     # Construct a collection of filters from arguments supplied at the command line.
-    filters = create_filters(
+    filters = filters_from_args(args)
+    missing = [field for field in required_fields(filters)
+               if field not in getattr(database, 'fields', ())]
+    if missing:
+        print(f"The {', '.join(missing)} field(s) of the close approaches aren't loaded; "
+              f"load them with `--fields {' '.join(missing)}`.", file=sys.stderr)
+        return
+    with profiling.stage('query') as timing:
+        # Look up the matching rows in the cache, if there is one.
+        key = filters_key(filters)
+        rows = None
+        if cache is not None and key is not None:
+            rows = cache.get(database, key)
+            if rows is None:
+                rows = database.match_rows(filters)
+                cache.put(database, key, rows)
+
+        # Aggregate the matches without listing them.
+        if getattr(args, 'count', False):
+            summary = timing.rows = len(rows) if rows is not None else database.count(filters)
+        elif getattr(args, 'stats', False):
+            summary = database.summarize(rows) if rows is not None else database.stats(filters)
+            timing.rows = summary['count']
+        else:
+            summary = None
+
+            # Select the top matches, if they are to be sorted.
+            sort_by = getattr(args, 'sort_by', None)
+            if sort_by:
+                if rows is None:
+                    rows = database.match_rows(filters)
+                k = args.limit or (None if args.outfile else 10)
+                rows = database.sort_rows(rows, sort_by, descending=args.desc, k=k)
+
+            # Query the database with the collection of filters.
+            results = database.query(filters) if rows is None else database.approaches_at(rows)
+            if profiling.active() is not None:
+                # Collect the results, so that the query and the output are timed apart.
+                results = list(limit(results, args.limit or (None if args.outfile else 10)))
+                timing.rows = len(results)
+
+    if getattr(args, 'count', False):
+        print(summary)
+        return
+    if summary is not None:
+        print_stats(summary)
+        return
+
+    with profiling.stage('write'):
+        if not args.outfile:
+            # Write the results to stdout, limiting to 10 entries if not specified.
+            for result in limit(results, args.limit or 10):
+                print(result)
+        else:
+            # Write the results to a file.
+            if args.outfile.suffix == '.csv':
+                write_to_csv(limit(results, args.limit), args.outfile)
+            elif args.outfile.suffix == '.json':
+                write_to_json(limit(results, args.limit), args.outfile)
+            elif args.outfile.suffix in ('.ndjson', '.jsonl'):
+                write_to_ndjson(limit(results, args.limit), args.outfile)
+            else:
+                print("Please use an output file that ends with `.csv`, `.json`, "
+                      "`.ndjson` or `.jsonl`.", file=sys.stderr)
+
+
+def filters_from_args(args):
+    """Create the collection of filters of the options of a `query` command.
+    :param args: The arguments of a `query` command, as parsed by its parser.
+    :return: A collection of filters, as from `create_filters`.
+    """
+    return create_filters(
         date=args.date, start_date=args.start_date, end_date=args.end_date,
         distance_min=args.distance_min, distance_max=args.distance_max,
         velocity_min=args.velocity_min, velocity_max=args.velocity_max,
         diameter_min=args.diameter_min, diameter_max=args.diameter_max,
-        hazardous=args.hazardous
+        hazardous=args.hazardous, dist_min_max=getattr(args, 'dist_min_max', None),
+        h_max=getattr(args, 'h_max', None), v_inf_min=getattr(args, 'v_inf_min', None),
+        named=getattr(args, 'named', None)
     )
-    # Query the database with the collection of filters.
-    results = database.query(filters)
 
-    if not args.outfile:
-        # Write the results to stdout, limiting to 10 entries if not specified.
-        for result in limit(results, args.limit or 10):
-            print(result)
-    else:
-        # Write the results to a file.
-        if args.outfile.suffix == '.csv':
-            write_to_csv(limit(results, args.limit), args.outfile)
-        elif args.outfile.suffix == '.json':
-            write_to_json(limit(results, args.limit), args.outfile)
+
+def read_batch(specfile, query_parser):
+    """Parse a file of `query` commands, one per line.
+    Blank lines and lines starting with `#` are skipped.
+    :param specfile: A Path to the file of queries.
+    :param query_parser: The parser of the `query` subcommand.
+    :return: A list of the parsed arguments of each query.
+    :raises ValueError: If a line can't be parsed.
+    """
+    specs = []
+    with open(specfile) as infile:
+        for number, line in enumerate(infile, 1):
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            try:
+                specs.append(query_parser.parse_args(shlex.split(line)))
+            except (ValueError, SystemExit):
+                raise ValueError(f"{specfile}, line {number}: invalid query {line!r}") from None
+    return specs
+
+
+def batch(database, specs, chunk_size=4096):
+    """Perform the `batch` subcommand.
+    The matching rows of all the queries are found with one scan of the database
+    (`NEODatabase.match_many`). Then the matches of all the queries that are
+    written to an `--outfile` in the database's order are merged, and each chunk
+    of them is fetched once and handed to the writer (see `write.WRITERS`) of
+    every query it matches, so all the files are written in a single pass. The
+    other queries (printed ones, `--sort-by`, `--count` and `--stats`) run through
+    `query`, reusing the rows that were found. A database without `match_many`
+    (such as a `SQLiteNEODatabase`) runs each query through `query` instead.
+    :param database: The `NEODatabase` containing data on NEOs and their close approaches.
+    :param specs: A list of the parsed arguments of each query, as from `read_batch`.
+    :param chunk_size: The number of approaches fetched and dispatched at once.
+    """
+    if not hasattr(database, 'match_many'):
+        for spec in specs:
+            query(database, spec)
+        return
+
+    filter_sets = [filters_from_args(spec) for spec in specs]
+    with profiling.stage('query') as timing:
+        matches = database.match_many(filter_sets)
+        timing.rows = sum(len(rows) for rows in matches)
+
+    cache = QueryCache(len(specs))
+    streamed, others = [], []
+    for spec, filters, rows in zip(specs, filter_sets, matches):
+        if (spec.outfile and spec.outfile.suffix in WRITERS and not spec.sort_by
+                and not spec.count and not spec.stats):
+            streamed.append((spec, rows[:spec.limit] if spec.limit else rows))
         else:
-            print("Please use an output file that ends with `.csv` or `.json`.", file=sys.stderr)
+            cache.put(database, filters_key(filters), rows)
+            others.append(spec)
+
+    with profiling.stage('write') as timing:
+        merged = np.unique(np.concatenate([np.empty(0, dtype=np.int32)]
+                                          + [rows for _, rows in streamed]))
+        timing.rows = len(merged)
+        outputs = [(WRITERS[spec.outfile.suffix](spec.outfile), np.isin(merged, rows))
+                   for spec, rows in streamed]
+        try:
+            for start in range(0, len(merged), chunk_size):
+                approaches = list(database.approaches_at(merged[start:start + chunk_size]))
+                for writer, member in outputs:
+                    selected = np.flatnonzero(member[start:start + chunk_size]).tolist()
+                    if selected:
+                        writer.write([approaches[index] for index in selected])
+        finally:
+            for writer, _ in outputs:
+                writer.close()
+    for spec, rows in streamed:
+        print(f"Wrote {len(rows)} close approaches to {spec.outfile}.", file=sys.stderr)
+
+    for spec in others:
+        query(database, spec, cache=cache)
+
+
+def print_stats(summary):
+    """Print the aggregates of a query, as from `NEODatabase.stats`.
+    :param summary: A dictionary of the count and distance and velocity aggregates.
+    """
+    print(f"count: {summary['count']}")
+    for name, unit in (('distance', 'au'), ('velocity', 'km/s')):
+        aggregates = summary[name]
+        print(f"{name} ({unit}): min {aggregates['min']:.6g}, "
+              f"max {aggregates['max']:.6g}, mean {aggregates['mean']:.6g}")
+
+
+class QueryCache:
+    """A bounded LRU cache of query results for the interactive shell.
+
+    Results are kept as arrays of matching row numbers (see
+    `NEODatabase.match_rows`), keyed by the normalized filter set from
+    `filters.filters_key`. Entries belong to one version of one database:
+    looking up a result for any other database, or after the database has
+    changed (see `NEODatabase.version`), empties the cache first.
+    """
+
+    def __init__(self, maxsize=16):
+        """Create a new, empty `QueryCache`.
+        :param maxsize: The maximum number of results to keep.
+        """
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._database = None
+        self._version = None
+        self._entries = collections.OrderedDict()
+
+    def _check(self, database):
+        """Empty the cache if it holds results for a different database."""
+        version = getattr(database, 'version', 0)
+        if database is not self._database or version != self._version:
+            self.clear()
+            self._database = database
+            self._version = version
+
+    def get(self, database, key):
+        """Return the cached rows for a key, or None, counting a hit or a miss."""
+        self._check(database)
+        try:
+            rows = self._entries[key]
+        except KeyError:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return rows
+
+    def put(self, database, key, rows):
+        """Cache the rows for a key, evicting the least recently used result."""
+        self._check(database)
+        if self.maxsize <= 0:
+            return
+        self._entries[key] = rows
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        """Drop every cached result."""
+        self._entries.clear()
+
+    def __len__(self):
+        """Return the number of cached results."""
+        return len(self._entries)
+
+    def __str__(self):
+        """Summarize the cache's contents and counters."""
+        return (f"Query cache: {len(self)}/{self.maxsize} results, "
+                f"{self.hits} hits, {self.misses} misses.")
+
+
+def _completion_tail(completion, head):
+    """Return the rest of a completion after some normalized text.
+
+    :param completion: A name or designation whose normalized form starts
+    with `head` (see `search.normalize`).
+    :param head: The normalized text typed before the current word.
+    :return: The part of `completion` after `head` and any whitespace.
+    """
+    end = 0
+    while end < len(completion) and len(normalize(completion[:end])) < len(head):
+        end += 1
+    return completion[end:].lstrip()
 
 
 class NEOShell(cmd.Cmd):
@@ -229,13 +741,20 @@ class NEOShell(cmd.Cmd):
              "Type `help` or `?` to list commands and `exit` to exit.\n")
     prompt = '(neo) '
 
-    def __init__(self, database, inspect_parser, query_parser, aggressive=False, **kwargs):
+    def __init__(self, database, inspect_parser, query_parser, aggressive=False,
+                 cache_size=16, profile=False, data_files=None, watch=False,
+                 **kwargs):
         """Create a new `NEOShell`.
         Creating this object doesn't start the session - for that, use `.cmdloop()`.
         :param database: The `NEODatabase` containing data on NEOs and their close approaches.
         :param inspect_parser: The subparser for the `inspect` subcommand.
         :param query_parser: The subparser for the `query` subcommand.
         :param aggressive: Whether to kill the session whenever a project file is changed.
+        :param cache_size: The number of query results to keep in the `QueryCache`.
+        :param profile: Whether to print the timings of the stages of each command.
+        :param data_files: The `DataFiles` the database was loaded from, if it can
+        be reloaded.
+        :param watch: Whether to reload the changed data files before each command.
         :param kwargs: A dictionary of excess keyword arguments passed to the superclass.
         """
         super().__init__(**kwargs)
@@ -243,6 +762,10 @@ class NEOShell(cmd.Cmd):
         self.inspect = inspect_parser
         self.query = query_parser
         self.aggressive = aggressive
+        self.cache = QueryCache(cache_size)
+        self.profile = profile
+        self.data_files = data_files
+        self.watch = watch
 
     @classmethod
     def parse_arg_with(cls, arg, parser):
@@ -290,6 +813,26 @@ class NEOShell(cmd.Cmd):
                 pdes=args.pdes, name=args.name,
                 verbose=args.verbose)
 
+    def complete_inspect(self, text, line, begidx, endidx):
+        """Complete the designation after `--pdes` or the name after `--name`.
+        A designation may contain spaces, which readline treats as word breaks,
+        so the whole value typed after the option is matched, and only the
+        part of each completion from the current word on is returned. As the
+        matching ignores case and whitespace, that part is found by matching
+        the words typed before the current one against the completion.
+        """
+        found = _INSPECT_VALUE.search(line[:endidx])
+        if not found:
+            return [option for option in ('--pdes', '--name', '--verbose')
+                    if option.startswith(text)]
+        field = 'designation' if found.group(1) in ('-p', '--pdes') else 'name'
+        typed = found.group(2)
+        head = normalize(typed[:len(typed) - len(text)])
+        return [_completion_tail(completion, head) for completion in
+                self.db.name_index.complete(typed, field=field, limit=100)]
+
+    complete_i = complete_inspect
+
     def do_q(self, arg):
         """Shorthand for `query`."""
         self.do_query(arg)
@@ -301,7 +844,9 @@ class NEOShell(cmd.Cmd):
             (neo) query --date 2020-01-01
         You can use any of the other filters: `--start-date`, `--end-date`,
         `--min-distance`, `--max-distance`, `--min-velocity`, `--max-velocity`,
-        `--min-diameter`, `--max-diameter`, `--hazardous`, `--not-hazardous`.
+        `--min-diameter`, `--max-diameter`, `--hazardous`, `--not-hazardous`,
+        `--named`, `--unnamed`, and, if their fields were loaded with `--fields`, `--max-dist-min`, `--max-h`
+        and `--min-v-inf`.
         The number of results shown can be limited to a maximum number with `--limit`:
             (neo) query --limit 2
         The results can be saved to a file (instead of displayed to stdout) with
@@ -313,8 +858,50 @@ class NEOShell(cmd.Cmd):
         if not args:
             return
 
-        # Run the `inspect` subcommand.
-        query(self.db, args)
+        # Run the `query` subcommand.
+        query(self.db, args, cache=self.cache)
+
+    def do_cache(self, arg):
+        """Show the query cache's hit and miss counters, or empty it.
+        Repeating a query with the same filters (but perhaps a different
+        `--limit` or `--outfile`) reuses the cached matches:
+            (neo) cache
+            (neo) cache clear
+        """
+        if arg.strip() == 'clear':
+            self.cache.clear()
+        elif arg.strip():
+            print("Usage: cache [clear]", file=sys.stderr)
+            return
+        print(self.cache)
+
+    def do_reload(self, arg):
+        """Apply the changes to the data files to the loaded database.
+        Only the files that changed since they were (re)loaded are read, and only
+        the added, removed or changed NEOs and close approaches are applied:
+            (neo) reload
+        To reread both files anyway:
+            (neo) reload all
+        """
+        if arg.strip() not in ('', 'all'):
+            print("Usage: reload [all]", file=sys.stderr)
+            return
+        if self.data_files is None:
+            print("This database can't be reloaded.", file=sys.stderr)
+            return
+        roles = None if not arg.strip() else self.data_files.paths
+        self.print_reload(reload(self.db, self.data_files, roles))
+
+    @staticmethod
+    def print_reload(summary):
+        """Print a `delta.ReloadSummary`."""
+        if not summary.roles:
+            print("The data files haven't changed.")
+            return
+        print(f"Reloaded {' and '.join(summary.roles)}: "
+              f"NEOs +{summary.neos_added} -{summary.neos_removed} "
+              f"~{summary.neos_updated}, close approaches "
+              f"+{summary.approaches_added} -{summary.approaches_removed}.")
 
     def do_EOF(self, _arg):
         """Exit the interactive session."""
@@ -324,8 +911,31 @@ class NEOShell(cmd.Cmd):
     do_exit = do_EOF
     do_quit = do_EOF
 
+    def do_profile(self, arg):
+        """Turn the timings of the stages of each command on or off:
+            (neo) profile on
+            (neo) profile off
+        """
+        if arg.strip() in ('on', 'off'):
+            self.profile = arg.strip() == 'on'
+        elif arg.strip():
+            print("Usage: profile [on|off]", file=sys.stderr)
+            return
+        print(f"Profiling is {'on' if self.profile else 'off'}.")
+
+    def onecmd(self, line):
+        """Run a command, printing the timings of its stages if profiling is on."""
+        profiler = profiling.Profiler() if self.profile else None
+        with profiling.activate(profiler):
+            stop = super().onecmd(line)
+        if profiler is not None and self.profile and line.strip() and not stop:
+            profiler.report()
+        return stop
+
     def precmd(self, line):
-        """Watch for changes to the files in this project."""
+        """Watch for changes to the files in this project, and to the data files."""
+        if self.watch and self.data_files is not None and self.data_files.changed():
+            self.print_reload(reload(self.db, self.data_files))
         changed = [f for f in PROJECT_ROOT.glob('*.py') if f.stat().st_mtime > _START]
         if changed:
             print("The following file(s) have been modified since this interactive session began: "
@@ -345,16 +955,78 @@ def main():
     parser, inspect_parser, query_parser = make_parser()
     args = parser.parse_args()
 
+    profiler = profiling.Profiler() if args.profile else None
+    cprofile = cProfile.Profile() if args.profile_out else None
+    if cprofile is not None:
+        cprofile.enable()
+    try:
+        with profiling.activate(profiler):
+            run(args, inspect_parser, query_parser)
+    finally:
+        if cprofile is not None:
+            cprofile.disable()
+            cprofile.dump_stats(args.profile_out)
+            print(f"Saved profile data to {args.profile_out}; view it with "
+                  f"`python3 -m pstats {args.profile_out}`.", file=sys.stderr)
+        if profiler is not None and args.cmd != 'interactive':
+            profiler.report()
+
+
+def run(args, inspect_parser, query_parser):
+    """Load the database and run the subcommand chosen at the command line.
+    :param args: All arguments from the command line, as parsed by the top-level parser.
+    :param inspect_parser: The parser of the `inspect` subcommand.
+    :param query_parser: The parser of the `query` subcommand.
+    """
+    if args.cmd == 'ingest':
+        ingest(args)
+        return
+    if args.cmd == 'batch':
+        # Check every query before loading the data.
+        try:
+            specs = read_batch(args.specfile, query_parser)
+        except (OSError, ValueError) as err:
+            print(err, file=sys.stderr)
+            return
+
+    # Load the optional fields that were selected or that the queries compare.
+    fields = set(args.fields)
+    if args.cmd == 'query':
+        fields.update(required_fields(filters_from_args(args)))
+    elif args.cmd == 'batch':
+        for spec in specs:
+            fields.update(required_fields(filters_from_args(spec)))
+    fields = [field for field in APPROACH_FIELDS if field in fields]
+
     # Extract data from the data files into structured Python objects.
-    database = NEODatabase(load_neos(args.neofile), load_approaches(args.cadfile))
+    data_files = None
+    if args.sqlite:
+        if fields:
+            print("The optional close approach fields can't be loaded from a SQLite "
+                  "database; drop `--sqlite` to use them.", file=sys.stderr)
+            return
+        database = open_sqlite_database(args.sqlite, args.neofile, args.cadfile)
+    else:
+        data_files = DataFiles(args.neofile, args.cadfile)
+        database = load_database(args.neofile, args.cadfile, snapshot=args.snapshot,
+                                 parallel=args.parallel, fields=fields)
 
     # Run the chosen subcommand.
     if args.cmd == 'inspect':
         inspect(database, pdes=args.pdes, name=args.name, verbose=args.verbose)
     elif args.cmd == 'query':
         query(database, args)
+    elif args.cmd == 'batch':
+        batch(database, specs)
     elif args.cmd == 'interactive':
-        NEOShell(database, inspect_parser, query_parser, aggressive=args.aggressive).cmdloop()
+        if profiling.active() is not None:
+            # Each command is timed on its own; show the time spent loading now.
+            profiling.active().report()
+        NEOShell(database, inspect_parser, query_parser, aggressive=args.aggressive,
+                 cache_size=args.cache_size, profile=args.profile,
+                 data_files=data_files, watch=args.watch).cmdloop()
+    elif args.cmd == 'serve':
+        serve(database, host=args.host, port=args.port)
 
 
 if __name__ == '__main__':
@@ -6,11 +6,17 @@ for whether the object is potentially hazardous.
 
 The `CloseApproach` class represents a close approach to Earth by an NEO. Each
 has an approach datetime, a nominal approach distance, and a relative approach
-velocity.
+velocity. The approach time is stored as integer minutes since the epoch (see
+`helpers.cd_to_minutes`), and the `datetime` is built from it on access.
 
 A `NearEarthObject` maintains a collection of its close approaches, and a
 `CloseApproach` maintains a reference to its NEO.
 
+There are hundreds of thousands of close approaches in the full data set, so
+both classes are compact: they declare `__slots__` instead of carrying a
+per-instance `__dict__`, and designations are interned so that every approach
+shares the designation string of its NEO.
+
 The functions that construct these objects use information extracted from the
 data files from NASA, so these objects should be able to handle all of the
 quirks of the data set, such as missing names and unknown diameters.
@@ -19,7 +25,10 @@ You'll edit this file in Task 1.
 """
 
 
-from helpers import cd_to_datetime, datetime_to_str
+import sys
+
+from helpers import (cd_to_datetime, datetime_to_str, datetime_to_minutes,
+                     minutes_to_datetime)
 
 
 class NearEarthObject:
@@ -35,13 +44,15 @@ class NearEarthObject:
     `NEODatabase` constructor.
     """
 
+    __slots__ = ('designation', 'name', 'diameter', 'hazardous', 'approaches')
+
     def __init__(self, **info):
         """Create a new `NearEarthObject`.
 
         :param info: A dictionary of excess keyword arguments
         supplied to the constructor.
         """
-        self.designation = str(info['pdes'])
+        self.designation = sys.intern(str(info['pdes']))
         self.name = info['name'] if ('name' in info) else None
 
         if 'diameter' in info:
@@ -107,19 +118,41 @@ class CloseApproach:
     referenced NEO is eventually replaced in the`NEODatabase` constructor.
     """
 
+    __slots__ = ('_designation', 'minutes', 'distance', 'velocity', 'neo')
+
     def __init__(self, **info):
         """Create a new `CloseApproach`.
 
+        The approach time is given either as a `cd` calendar date string or,
+        if it has already been converted in bulk, as `minutes` since the epoch.
+
         :param info: A dictionary of excess keyword arguments supplied to
         the constructor.
         """
-        self._designation = info['des']
-        self.time = cd_to_datetime(info['cd']) if 'cd' in info else None
+        self._designation = sys.intern(str(info['des']))
+        if 'minutes' in info:
+            self.minutes = int(info['minutes'])
+        elif 'cd' in info:
+            self.minutes = datetime_to_minutes(cd_to_datetime(info['cd']))
+        else:
+            self.minutes = None
         self.distance = float(info['dist']) if 'dist' in info else 0.0
         self.velocity = float(info['v_rel']) if 'v_rel' in info else 0.0
 
         self.neo = None
 
+    @property
+    def time(self):
+        """Approach time as a naive `datetime`, or `None` if unknown."""
+        if self.minutes is None:
+            return None
+        return minutes_to_datetime(self.minutes)
+
+    @time.setter
+    def time(self, value):
+        """Set the approach time from a naive `datetime` (or `None`)."""
+        self.minutes = None if value is None else datetime_to_minutes(value)
+
     @property
     def time_str(self):
         """Approach Time.
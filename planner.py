@@ -0,0 +1,214 @@
+"""Plan the evaluation of a collection of filters over the database columns.
+
+`filters.create_filters` returns a flat collection of filters, one per
+command-line option. Before `NEODatabase.query` scans any rows, `plan_query`
+rewrites that collection into a `QueryPlan`:
+
+- The bounds on each attribute (for example `--min-distance` and
+  `--max-distance`) are merged into a single `RangePredicate`.
+- Contradictory bounds (a minimum above a maximum, or both `--hazardous` and
+  `--not-hazardous`) mark the whole plan as empty, so nothing is scanned.
+- Ranges on indexed attributes (the sorted time index of `NEODatabase`) are
+  pushed down to the index instead of being evaluated row by row.
+- Attributes with a bitmap index (see `bitmap.Bitmap`) restrict the rows to
+  scan before any column is read: a yes/no attribute compared for equality is
+  answered by its bitmap (or its complement) alone, and a range on a float
+  attribute, which never matches a missing (NaN) value, only needs to be
+  checked on the rows whose value is known.
+- The remaining predicates are ordered by their estimated selectivity, taken
+  from a `ColumnStatistics` sample of each column, so that the predicate
+  expected to reject the most rows runs first and later ones only look at
+  the rows that survive it.
+
+Filters that aren't simple comparisons of a known column are kept as they
+are and evaluated after the range predicates.
+"""
+import math
+import operator
+
+import numpy as np
+
+
+# The number of values sampled from each column to estimate selectivity.
+SAMPLE_SIZE = 4096
+
+
+class RangePredicate:
+    """A range of allowed values for a single column.
+
+    Each bound is either inclusive or exclusive, and may be infinite. An
+    equality comparison is a range whose bounds coincide.
+    """
+
+    def __init__(self, attr):
+        """Create an unbounded `RangePredicate` on the `attr` column.
+
+        :param attr: The name of the column the predicate restricts.
+        """
+        self.attr = attr
+        self.low, self.low_inclusive = -math.inf, True
+        self.high, self.high_inclusive = math.inf, True
+
+    def restrict(self, op, value):
+        """Narrow the range by a comparison `column OP value`.
+
+        :param op: One of `operator.eq`, `ge`, `gt`, `le` or `lt`.
+        :param value: The reference value of the comparison.
+        """
+        if op in (operator.eq, operator.ge, operator.gt):
+            inclusive = op is not operator.gt
+            if (value > self.low
+                    or (value == self.low and not inclusive)):
+                self.low, self.low_inclusive = value, inclusive
+        if op in (operator.eq, operator.le, operator.lt):
+            inclusive = op is not operator.lt
+            if (value < self.high
+                    or (value == self.high and not inclusive)):
+                self.high, self.high_inclusive = value, inclusive
+
+    @property
+    def empty(self):
+        """Whether no value can satisfy the range."""
+        if self.low == self.high:
+            return not (self.low_inclusive and self.high_inclusive)
+        return self.low > self.high
+
+    def mask(self, columns):
+        """Evaluate the range over a column.
+
+        :param columns: A mapping from attribute name to a column array.
+        :return: A boolean array, `True` where the value is in range.
+        """
+        values = columns[self.attr]
+        mask = np.ones(len(values), dtype=bool)
+        if self.low != -math.inf:
+            mask &= (values >= self.low if self.low_inclusive
+                     else values > self.low)
+        if self.high != math.inf:
+            mask &= (values <= self.high if self.high_inclusive
+                     else values < self.high)
+        return mask
+
+    def __repr__(self):
+        """Return `repr(self)`, a computer-readable representation."""
+        return (f"RangePredicate({self.attr!r}, "
+                f"{'[' if self.low_inclusive else '('}{self.low}, "
+                f"{self.high}{']' if self.high_inclusive else ')'})")
+
+
+class ColumnStatistics:
+    """A sorted sample of a column, for estimating predicate selectivity."""
+
+    def __init__(self, column, sample_size=SAMPLE_SIZE):
+        """Summarize a column.
+
+        Evenly spaced rows are sampled, NaNs (which no comparison matches)
+        are counted and dropped, and the rest are sorted.
+
+        :param column: A NumPy array.
+        :param sample_size: The maximum number of values to keep.
+        """
+        step = max(len(column) // sample_size, 1)
+        sample = np.asarray(column[::step])
+        if sample.dtype.kind == 'f':
+            valid = ~np.isnan(sample)
+            self.valid_fraction = valid.mean() if len(sample) else 0.0
+            sample = sample[valid]
+        else:
+            self.valid_fraction = 1.0
+        self.sample = np.sort(sample)
+
+    def selectivity(self, predicate):
+        """Estimate the fraction of rows that satisfy a `RangePredicate`."""
+        if not len(self.sample):
+            return 0.0
+        start = np.searchsorted(self.sample, predicate.low,
+                                side='left' if predicate.low_inclusive
+                                else 'right')
+        stop = np.searchsorted(self.sample, predicate.high,
+                               side='right' if predicate.high_inclusive
+                               else 'left')
+        return self.valid_fraction * max(stop - start, 0) / len(self.sample)
+
+
+class QueryPlan:
+    """The rewritten form of a collection of filters.
+
+    :ivar empty: Whether the filters contradict each other.
+    :ivar index_ranges: A mapping from indexed attribute to the
+    `RangePredicate` to look up in its index.
+    :ivar predicates: Column predicates (objects with a `mask` method), most
+    selective first.
+    :ivar row_filters: Any other callables, to apply per `CloseApproach`.
+    :ivar bitmaps: A list of (attribute, flag) pairs: every matching row is
+    in the attribute's bitmap index if the flag is `True`, and out of it if
+    the flag is `False`.
+    """
+
+    def __init__(self, empty=False, index_ranges=None, predicates=(),
+                 row_filters=(), bitmaps=()):
+        """Create a new `QueryPlan`."""
+        self.empty = empty
+        self.index_ranges = index_ranges or {}
+        self.predicates = list(predicates)
+        self.row_filters = list(row_filters)
+        self.bitmaps = list(bitmaps)
+
+    def __repr__(self):
+        """Return `repr(self)`, a computer-readable representation."""
+        return (f"QueryPlan(empty={self.empty!r}, "
+                f"index_ranges={self.index_ranges!r}, "
+                f"bitmaps={self.bitmaps!r}, "
+                f"predicates={self.predicates!r}, "
+                f"row_filters={self.row_filters!r})")
+
+
+# The comparisons that a `RangePredicate` can represent.
+RANGE_OPS = (operator.eq, operator.ge, operator.gt, operator.le, operator.lt)
+
+
+def plan_query(filters, statistics, indexed=(), bitmaps=()):
+    """Rewrite a collection of filters into a `QueryPlan`.
+
+    :param filters: A collection of filters, as from `create_filters`.
+    :param statistics: A mapping from column name to `ColumnStatistics`.
+    :param indexed: The names of columns with an index that answers ranges.
+    :param bitmaps: The names of columns with a bitmap index, which marks the
+    rows whose value is `True` (for a boolean column) or known (for a float
+    column).
+    :return: A `QueryPlan`.
+    """
+    ranges = {}
+    other_predicates = []
+    row_filters = []
+    for filt in filters:
+        attr = getattr(filt, 'attr', None)
+        if attr in statistics and getattr(filt, 'op', None) in RANGE_OPS:
+            predicate = ranges.setdefault(attr, RangePredicate(attr))
+            predicate.restrict(filt.op, filt.operand)
+        elif hasattr(filt, 'mask'):
+            other_predicates.append(filt)
+        else:
+            row_filters.append(filt)
+
+    if any(predicate.empty for predicate in ranges.values()):
+        return QueryPlan(empty=True)
+
+    index_ranges = {attr: ranges.pop(attr) for attr in indexed
+                    if attr in ranges}
+    bitmap_terms = []
+    for attr in bitmaps:
+        predicate = ranges.get(attr)
+        if predicate is None:
+            continue
+        if (isinstance(predicate.low, (bool, np.bool_))
+                and predicate.low == predicate.high):
+            bitmap_terms.append((attr, bool(predicate.low)))
+            del ranges[attr]
+        elif statistics[attr].sample.dtype.kind == 'f':
+            bitmap_terms.append((attr, True))
+    predicates = sorted(ranges.values(), key=lambda predicate:
+                        statistics[predicate.attr].selectivity(predicate))
+    return QueryPlan(index_ranges=index_ranges,
+                     predicates=predicates + other_predicates,
+                     row_filters=row_filters, bitmaps=bitmap_terms)
@@ -0,0 +1,136 @@
+"""Time the stages of a run of the command line tool.
+
+A `Profiler` records the wall-clock time, the CPU time of this process and a
+row count for each named stage of a run: reading the data files, linking and
+indexing the database, filtering and writing results. The stages are marked
+in the code with the module-level `stage` context manager:
+
+    with profiling.stage('load_neos') as timing:
+        neos = ...
+        timing.rows = len(neos)
+
+which does nothing unless a profiler has been made active with `activate`,
+so the stages cost next to nothing in a normal run. A stage that is entered
+several times (or in several places) accumulates its times and rows.
+
+The CPU time is that of this process only, so work done in worker processes
+(see `extract.load_data`) shows up as wall-clock time alone.
+"""
+import contextlib
+import sys
+import time
+
+
+class StageTiming:
+    """The accumulated timings of one stage.
+
+    :ivar name: The name of the stage.
+    :ivar wall: The wall-clock time spent in the stage, in seconds.
+    :ivar cpu: The CPU time of this process spent in the stage, in seconds.
+    :ivar rows: The number of rows the stage produced, if known.
+    :ivar calls: The number of times the stage was entered.
+    """
+
+    def __init__(self, name):
+        """Create the timing of a stage that hasn't run yet."""
+        self.name = name
+        self.wall = 0.0
+        self.cpu = 0.0
+        self.rows = None
+        self.calls = 0
+
+    def __repr__(self):
+        """Return `repr(self)`, a computer-readable representation."""
+        return (f"StageTiming(name={self.name!r}, wall={self.wall:.6f}, "
+                f"cpu={self.cpu:.6f}, rows={self.rows!r}, calls={self.calls!r})")
+
+
+class Profiler:
+    """A record of the time spent in each stage of a run, in order of first use."""
+
+    def __init__(self):
+        """Create a new `Profiler` with no stages, and start its total time."""
+        self.stages = {}
+        self._start = time.perf_counter(), time.process_time()
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        """Time a stage, adding to any earlier timing of the same stage.
+
+        The rows of the stage can be counted by adding to (or setting) the
+        `rows` of the yielded `StageTiming`.
+
+        :param name: The name of the stage.
+        :yield: The `StageTiming` of the stage.
+        """
+        timing = self.stages.get(name)
+        if timing is None:
+            timing = self.stages[name] = StageTiming(name)
+        rows = timing.rows
+        timing.rows = None
+        wall, cpu = time.perf_counter(), time.process_time()
+        try:
+            yield timing
+        finally:
+            timing.wall += time.perf_counter() - wall
+            timing.cpu += time.process_time() - cpu
+            timing.calls += 1
+            if rows is not None:
+                timing.rows = rows + (timing.rows or 0)
+
+    def report(self, file=None):
+        """Print a table of the stages and of the total time since creation.
+
+        Each stage's share of the total wall-clock time is shown. A stage
+        entered within another (such as building the name index during a
+        search) is also counted in the outer one.
+
+        :param file: The file to print to, by default standard error.
+        """
+        file = file or sys.stderr
+        total = StageTiming('total')
+        total.wall = time.perf_counter() - self._start[0]
+        total.cpu = time.process_time() - self._start[1]
+        print(f"{'stage':<16} {'wall s':>9} {'cpu s':>9} {'%':>6} {'rows':>10}",
+              file=file)
+        for timing in [*self.stages.values(), total]:
+            rows = '' if timing.rows is None else timing.rows
+            share = 100 * timing.wall / total.wall if total.wall else 0.0
+            print(f"{timing.name:<16} {timing.wall:9.4f} {timing.cpu:9.4f} "
+                  f"{share:6.1f} {rows:>10}", file=file)
+
+
+# The profiler that `stage` records into, if any.
+_active = None
+
+
+def active():
+    """Return the active `Profiler`, or `None` if profiling is disabled."""
+    return _active
+
+
+def stage(name):
+    """Time a stage with the active profiler, if there is one.
+
+    :param name: The name of the stage.
+    :return: A context manager yielding the `StageTiming` of the stage (a
+    throwaway one if no profiler is active).
+    """
+    if _active is None:
+        return contextlib.nullcontext(StageTiming(name))
+    return _active.stage(name)
+
+
+@contextlib.contextmanager
+def activate(profiler):
+    """Make a profiler the active one for the duration of a block.
+
+    :param profiler: A `Profiler`, or `None` to disable profiling.
+    :yield: The profiler.
+    """
+    global _active
+    previous, _active = _active, profiler
+    try:
+        yield profiler
+    finally:
+        _active = previous
@@ -0,0 +1,216 @@
+"""Search near-Earth objects by approximate name or primary designation.
+
+`NEODatabase.get_neo_by_designation` and `get_neo_by_name` only find exact
+matches. A `NameIndex` also answers lookups that are off by case, spacing, a
+missing suffix or a typo:
+
+- Every name and designation is normalized (case-folded, with whitespace
+  removed, so that "2020 AY1" and "2020ay1" are the same key) and kept in a
+  sorted list, so that all keys with a given prefix are found by binary
+  search.
+- Every normalized key is also split into trigrams (runs of three
+  characters), with a posting array of the keys containing each trigram. A
+  key within edit distance `d` of the query shares all but at most `3 * d` of
+  the query's trigrams, so the shared trigrams of every key are counted at
+  once (with `np.bincount` over the query's posting arrays), and the edit
+  distance is only computed for the keys that share enough of them, most
+  promising first, until no remaining key can rank among the results.
+
+The edit distance is the Levenshtein distance: the number of characters
+inserted, deleted or substituted.
+
+Matches are ranked with exact (normalized) matches first, then prefix matches
+in sorted order, then fuzzy matches by increasing edit distance.
+"""
+import bisect
+import collections
+
+import numpy as np
+
+
+# A ranked match for a query. `kind` is 'exact', 'prefix' or 'fuzzy', and
+# `distance` is the edit distance between the normalized key and the query.
+Match = collections.namedtuple('Match', 'neo key field kind distance')
+
+# The largest edit distance tried for fuzzy matches.
+MAX_DISTANCE = 3
+
+
+def normalize(text):
+    """Normalize a name or designation for searching.
+
+    :param text: A name or designation, as a string.
+    :return: The case-folded string without whitespace.
+    """
+    return ''.join(text.casefold().split())
+
+
+def trigrams(key):
+    """Return the set of trigrams of a normalized key.
+
+    The key is padded so that its first and last characters also start
+    and end trigrams of their own.
+    """
+    padded = f"  {key} "
+    return {padded[index:index + 3] for index in range(len(padded) - 2)}
+
+
+def edit_distance(first, second, limit=None):
+    """Compute the Levenshtein distance between two strings.
+
+    :param first: A string.
+    :param second: A string.
+    :param limit: If given, stop as soon as the distance is known to exceed it.
+    :return: The edit distance, or `limit + 1` if it exceeds `limit`.
+    """
+    if limit is not None and abs(len(first) - len(second)) > limit:
+        return limit + 1
+    previous = list(range(len(second) + 1))
+    for row, char in enumerate(first, 1):
+        current = [row]
+        for column, other in enumerate(second, 1):
+            current.append(min(previous[column] + 1,
+                               current[column - 1] + 1,
+                               previous[column - 1] + (char != other)))
+        if limit is not None and min(current) > limit:
+            return limit + 1
+        previous = current
+    return previous[-1]
+
+
+class NameIndex:
+    """A search index over the names and designations of NEOs."""
+
+    def __init__(self, neos):
+        """Index the names and primary designations of a collection of NEOs.
+
+        :param neos: A collection of `NearEarthObject`s.
+        """
+        entries = []
+        for neo in neos:
+            entries.append((normalize(neo.designation), neo.designation,
+                            'designation', neo))
+            if neo.name:
+                entries.append((normalize(neo.name), neo.name, 'name', neo))
+        entries.sort(key=lambda entry: entry[:3])
+
+        self._keys = [entry[0] for entry in entries]
+        self._labels = [entry[1] for entry in entries]
+        self._fields = [entry[2] for entry in entries]
+        self._neos = [entry[3] for entry in entries]
+
+        self._lengths = np.array([len(key) for key in self._keys], dtype=np.int64)
+        postings = collections.defaultdict(list)
+        for entry, key in enumerate(self._keys):
+            for trigram in trigrams(key):
+                postings[trigram].append(entry)
+        self._postings = {trigram: np.array(entries, dtype=np.int32)
+                          for trigram, entries in postings.items()}
+
+    def __len__(self):
+        """Return the number of indexed keys."""
+        return len(self._keys)
+
+    def _prefix_range(self, key):
+        """Return the range of entries whose key starts with `key`."""
+        start = bisect.bisect_left(self._keys, key)
+        stop = bisect.bisect_left(self._keys, key + '\U0010ffff', lo=start)
+        return range(start, stop)
+
+    def _fuzzy_candidates(self, key, max_distance):
+        """Find the entries that may be within `max_distance` of `key`.
+
+        :return: A list of (lower bound of the edit distance, entry) pairs,
+        sorted by the lower bound.
+        """
+        grams = trigrams(key)
+        postings = [self._postings[gram] for gram in grams
+                    if gram in self._postings]
+        # Count how many of the query's trigrams each key contains. Each
+        # edit removes at most three of them.
+        shared = np.bincount(
+            np.concatenate([np.empty(0, dtype=np.int32)] + postings),
+            minlength=len(self._keys))
+        lower_bound = np.maximum(-(-(len(grams) - shared) // 3),
+                                 np.abs(self._lengths - len(key)))
+        entries = np.flatnonzero(lower_bound <= max_distance)
+        entries = entries[np.argsort(lower_bound[entries], kind='stable')]
+        return list(zip(lower_bound[entries].tolist(), entries.tolist()))
+
+    def search(self, text, limit=10, max_distance=None, field=None):
+        """Find the NEOs whose name or designation best matches some text.
+
+        Each NEO appears at most once, under its best-ranked key.
+
+        :param text: The (partial or misspelled) name or designation to find.
+        :param limit: The maximum number of matches to return.
+        :param max_distance: The largest edit distance of a fuzzy match. By
+        default, it is 1 for queries of 4 to 9 characters and grows by one
+        for every 10 more, up to `MAX_DISTANCE`; shorter queries only match
+        exactly or by prefix.
+        :param field: 'name' or 'designation' to only search that field.
+        :return: A list of `Match`es, best first.
+        """
+        key = normalize(text)
+        if not key:
+            return []
+        if max_distance is None:
+            max_distance = (0 if len(key) < 4
+                            else min(1 + len(key) // 10, MAX_DISTANCE))
+
+        matches = []
+        seen = set()
+
+        def add(entry, kind, distance):
+            neo = self._neos[entry]
+            if id(neo) in seen or (field and self._fields[entry] != field):
+                return
+            seen.add(id(neo))
+            matches.append(Match(neo, self._labels[entry], self._fields[entry],
+                                 kind, distance))
+
+        prefix = self._prefix_range(key)
+        for entry in prefix:
+            if self._keys[entry] != key:
+                break
+            add(entry, 'exact', 0)
+        for entry in prefix:
+            if len(matches) >= limit:
+                return matches
+            add(entry, 'prefix', len(self._keys[entry]) - len(key))
+
+        if max_distance > 0 and len(matches) < limit:
+            scored = []
+            for lower_bound, entry in self._fuzzy_candidates(key, max_distance):
+                # Stop once no remaining key can beat the matches so far.
+                if len(scored) >= limit and lower_bound > scored[limit - 1][0]:
+                    break
+                if field and self._fields[entry] != field:
+                    continue
+                distance = edit_distance(key, self._keys[entry], max_distance)
+                if 0 < distance <= max_distance:
+                    bisect.insort(scored, (distance, self._keys[entry], entry))
+            for distance, _, entry in scored:
+                if len(matches) >= limit:
+                    break
+                add(entry, 'fuzzy', distance)
+        return matches[:limit]
+
+    def complete(self, text, field=None, limit=None):
+        """List the names or designations that start with some text.
+
+        The comparison is case-insensitive, but the completions are returned
+        as they appear in the data set.
+
+        :param text: The beginning of a name or designation.
+        :param field: 'name' or 'designation' to only complete that field.
+        :param limit: The maximum number of completions to return.
+        :return: A sorted list of completions.
+        """
+        completions = []
+        for entry in self._prefix_range(normalize(text)):
+            if limit is not None and len(completions) >= limit:
+                break
+            if field is None or self._fields[entry] == field:
+                completions.append(self._labels[entry])
+        return completions
@@ -0,0 +1,387 @@
+"""Serve `inspect` and `query` over a local HTTP/JSON API.
+
+Every run of `main.py` loads the data files (or a snapshot of them) before
+answering a single query. `serve` loads a database once and answers any
+number of requests from an asyncio HTTP/1.1 server:
+
+    GET /inspect?pdes=433
+    GET /inspect?name=Halley&verbose=1
+    GET /query?start_date=2020-01-01&distance_max=0.05&limit=100
+    GET /query?hazardous=true&sort_by=velocity&desc=1&limit=5
+    GET /query?start_date=2020-01-01&count=1
+    GET /query?hazardous=false&stats=1
+
+The parameters of `/query` are the keyword arguments of
+`filters.create_filters` (dates as YYYY-MM-DD, `hazardous` and `named` as
+true or false), plus `limit`, `sort_by` (one of `database.SORT_KEYS`),
+`desc`, `count`, `stats` and `format` (`json` for one JSON array, or
+`ndjson` for one JSON object per line). The approaches are formatted as by `write.write_to_json`.
+
+The matching approaches are streamed with chunked transfer encoding, a chunk
+of `chunk_size` approaches at a time. Between chunks, the server waits for
+the client to read what was sent and lets other requests run, so a large
+result neither piles up in memory nor holds up smaller requests. The scans,
+sorts and aggregates, and the formatting of each chunk, run in the event
+loop's default executor rather than on the loop itself, so that the other
+connections are answered while they run. Connections are kept alive between
+requests, unless the client asks otherwise.
+
+Errors are answered with a JSON object with an `error` message: 400 for an
+invalid parameter, 404 for an unknown path or NEO, and 405 for any method
+other than GET.
+"""
+import asyncio
+import datetime
+import functools
+import http
+import json
+import sys
+import urllib.parse
+
+from database import SORT_KEYS
+from filters import create_filters, limit, required_fields
+from write import _approach_dict
+
+
+# The number of approaches formatted and sent in each chunk of a response.
+_CHUNK_SIZE = 512
+
+# The longest request line or header line that is accepted, in bytes.
+_MAX_LINE = 8192
+
+
+class BadRequest(ValueError):
+    """A request has a missing or invalid parameter."""
+
+
+def _parse_date(text):
+    """Parse a YYYY-MM-DD date."""
+    return datetime.date.fromisoformat(text)
+
+
+def _parse_bool(text):
+    """Parse a true or false flag."""
+    lowered = text.lower()
+    if lowered in ('1', 'true', 'yes', 'y'):
+        return True
+    if lowered in ('0', 'false', 'no', 'n'):
+        return False
+    raise ValueError(f"{text!r} is not true or false")
+
+
+def _parse_limit(text):
+    """Parse a limit on the number of results, which can't be negative."""
+    value = int(text)
+    if value < 0:
+        raise ValueError(f"{value} is negative")
+    return value
+
+
+# The parameters of `/query` that are passed to `create_filters`.
+FILTER_PARAMETERS = {
+    'date': _parse_date, 'start_date': _parse_date, 'end_date': _parse_date,
+    'distance_min': float, 'distance_max': float,
+    'velocity_min': float, 'velocity_max': float,
+    'diameter_min': float, 'diameter_max': float,
+    'hazardous': _parse_bool, 'named': _parse_bool,
+    'dist_min_max': float, 'h_max': float, 'v_inf_min': float,
+}
+
+# The other parameters of `/query`.
+QUERY_PARAMETERS = {
+    'limit': _parse_limit, 'sort_by': str, 'desc': _parse_bool, 'count': _parse_bool,
+    'stats': _parse_bool, 'format': str,
+}
+
+
+def parse_parameters(query_string, parsers):
+    """Parse the parameters of a request's query string.
+
+    :param query_string: The query string of a request URL.
+    :param parsers: A dictionary mapping each allowed parameter to a function
+    that parses its value.
+    :return: A dictionary of the parsed values of the given parameters.
+    :raises BadRequest: If a parameter is unknown, repeated or invalid.
+    """
+    values = {}
+    for name, value in urllib.parse.parse_qsl(query_string,
+                                              keep_blank_values=True):
+        if name not in parsers:
+            raise BadRequest(f"Unknown parameter {name!r}.")
+        if name in values:
+            raise BadRequest(f"Parameter {name!r} is given more than once.")
+        try:
+            values[name] = parsers[name](value)
+        except ValueError as err:
+            raise BadRequest(f"Invalid value for {name!r}: {err}.") from None
+    return values
+
+
+def neo_dict(neo, verbose=False):
+    """Map a `NearEarthObject` to the JSON output structure of `/inspect`.
+
+    :param neo: A `NearEarthObject`.
+    :param verbose: Whether to include the NEO's close approaches.
+    :return: A dictionary.
+    """
+    info = {'designation': neo.designation,
+            'name': neo.name if neo.name is not None else '',
+            'diameter_km': neo.diameter,
+            'potentially_hazardous': neo.hazardous}
+    if verbose:
+        info['approaches'] = [_approach_dict(approach)
+                              for approach in neo.approaches]
+    return info
+
+
+class NEOServer:
+    """An asyncio HTTP server answering `inspect` and `query` requests."""
+
+    def __init__(self, database, chunk_size=_CHUNK_SIZE):
+        """Create a new `NEOServer`.
+
+        :param database: The `NEODatabase` (or `SQLiteNEODatabase`) to query.
+        :param chunk_size: The number of approaches in each chunk of a response.
+        """
+        self.database = database
+        self.chunk_size = chunk_size
+        self.requests = 0
+
+    async def start(self, host='127.0.0.1', port=8000):
+        """Start listening for connections.
+
+        :param host: The address to listen on.
+        :param port: The port to listen on, or 0 for any free port.
+        :return: The `asyncio.Server`.
+        """
+        return await asyncio.start_server(self.handle, host, port,
+                                          limit=_MAX_LINE)
+
+    async def handle(self, reader, writer):
+        """Answer the requests of one connection until it is closed."""
+        try:
+            while True:
+                request = await self._read_request(reader)
+                if request is None:
+                    break
+                method, target, headers = request
+                keep_alive = headers.get('connection', '').lower() != 'close'
+                await self.respond(writer, method, target, keep_alive)
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError,
+                asyncio.LimitOverrunError, ValueError):
+            pass
+        except Exception as err:
+            print(f"Error while answering a request: {err!r}", file=sys.stderr)
+        finally:
+            writer.close()
+
+    @staticmethod
+    async def _read_request(reader):
+        """Read a request line and headers.
+
+        :return: A tuple of the method, the target and a dictionary of
+        lowercase header names to values, or `None` at the end of the stream.
+        """
+        line = await reader.readline()
+        if not line.strip():
+            return None
+        method, target, _version = line.decode('latin-1').split()
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+        return method, target, headers
+
+    async def respond(self, writer, method, target, keep_alive=True):
+        """Answer one request.
+
+        :param writer: The `asyncio.StreamWriter` of the connection.
+        :param method: The HTTP method of the request.
+        :param target: The path and query string of the request.
+        :param keep_alive: Whether the connection stays open afterwards.
+        """
+        self.requests += 1
+        url = urllib.parse.urlsplit(target)
+        try:
+            if method != 'GET':
+                await self._send_json(writer, http.HTTPStatus.METHOD_NOT_ALLOWED,
+                                      {'error': "Only GET is supported."}, keep_alive)
+            elif url.path == '/inspect':
+                status, body = self.inspect(url.query)
+                await self._send_json(writer, status, body, keep_alive)
+            elif url.path == '/query':
+                await self.query(writer, url.query, keep_alive)
+            else:
+                await self._send_json(writer, http.HTTPStatus.NOT_FOUND,
+                                      {'error': f"Unknown path {url.path!r}."},
+                                      keep_alive)
+        except BadRequest as err:
+            await self._send_json(writer, http.HTTPStatus.BAD_REQUEST,
+                                  {'error': str(err)}, keep_alive)
+
+    def inspect(self, query_string):
+        """Look up an NEO by primary designation or by name, as `main.inspect`.
+
+        :param query_string: The query string, with `pdes` or `name`, and
+        optionally `verbose`.
+        :return: A tuple of the HTTP status and the JSON body.
+        """
+        params = parse_parameters(query_string, {'pdes': str, 'name': str,
+                                                 'verbose': _parse_bool})
+        pdes, name = params.get('pdes'), params.get('name')
+        if not pdes and not name:
+            raise BadRequest("Give the `pdes` or the `name` of an NEO.")
+        if pdes:
+            neo = self.database.get_neo_by_designation(pdes)
+        else:
+            neo = self.database.get_neo_by_name(name)
+
+        if not neo:
+            field = 'designation' if pdes else 'name'
+            matches = self.database.search_neos(pdes or name, limit=5, field=field)
+            exact = [match for match in matches if match.kind == 'exact']
+            if len(exact) != 1:
+                return http.HTTPStatus.NOT_FOUND, {
+                    'error': "No matching NEOs exist in the database.",
+                    'suggestions': [match.key for match in matches]}
+            neo = self.database.get_neo_by_designation(exact[0].neo.designation)
+        return http.HTTPStatus.OK, neo_dict(neo, params.get('verbose', False))
+
+    async def query(self, writer, query_string, keep_alive=True):
+        """Answer a `/query` request, streaming the matching approaches.
+
+        :param writer: The `asyncio.StreamWriter` of the connection.
+        :param query_string: The query string, as described in this module.
+        :param keep_alive: Whether the connection stays open afterwards.
+        """
+        params = parse_parameters(query_string,
+                                  {**FILTER_PARAMETERS, **QUERY_PARAMETERS})
+        filters = create_filters(**{name: value for name, value in params.items()
+                                    if name in FILTER_PARAMETERS})
+        missing = [field for field in required_fields(filters)
+                   if field not in getattr(self.database, 'fields', ())]
+        if missing:
+            raise BadRequest(f"The {', '.join(missing)} field(s) of the close "
+                             f"approaches aren't loaded.")
+        sort_by = params.get('sort_by')
+        if sort_by is not None and sort_by not in SORT_KEYS:
+            raise BadRequest(f"Can't sort by {sort_by!r}; "
+                             f"expected one of {', '.join(SORT_KEYS)}.")
+        output = params.get('format', 'json')
+        if output not in ('json', 'ndjson'):
+            raise BadRequest("The format must be 'json' or 'ndjson'.")
+
+        # Scanning, sorting and formatting run in the default executor, so
+        # that a large query doesn't hold up the other connections.
+        loop = asyncio.get_running_loop()
+        if params.get('count'):
+            count = await loop.run_in_executor(None, self.database.count, filters)
+            await self._send_json(writer, http.HTTPStatus.OK, {'count': count},
+                                  keep_alive)
+            return
+        if params.get('stats'):
+            stats = await loop.run_in_executor(None, self.database.stats, filters)
+            await self._send_json(writer, http.HTTPStatus.OK, stats, keep_alive)
+            return
+
+        if sort_by:
+            rows = await loop.run_in_executor(None, functools.partial(
+                self._sorted_rows, filters, sort_by,
+                descending=params.get('desc', False), k=params.get('limit') or None))
+            results = self.database.approaches_at(rows)
+        else:
+            results = self.database.query(filters)
+        results = limit(results, params.get('limit'))
+
+        content_type = ('application/json' if output == 'json'
+                        else 'application/x-ndjson')
+        self._write_head(writer, http.HTTPStatus.OK, content_type, keep_alive,
+                         {'Transfer-Encoding': 'chunked'})
+        separator = ', ' if output == 'json' else '\n'
+        opening, closing = ('[', ']') if output == 'json' else ('', '')
+        first = True
+        while True:
+            chunk = await loop.run_in_executor(None, self._format_chunk, results)
+            if not chunk:
+                break
+            text = separator.join(chunk)
+            if output == 'ndjson':
+                text += '\n'
+            elif first:
+                text = opening + text
+            else:
+                text = separator + text
+            first = False
+            self._write_chunk(writer, text.encode('utf-8'))
+            await writer.drain()
+            # Let the other requests run between chunks.
+            await asyncio.sleep(0)
+        if first and opening:
+            self._write_chunk(writer, opening.encode('utf-8'))
+        if closing:
+            self._write_chunk(writer, closing.encode('utf-8'))
+        writer.write(b'0\r\n\r\n')
+        await writer.drain()
+
+    def _sorted_rows(self, filters, by, descending=False, k=None):
+        """Return the rows matching `filters`, sorted as by `sort_rows`."""
+        return self.database.sort_rows(self.database.match_rows(filters), by,
+                                       descending=descending, k=k)
+
+    def _format_chunk(self, results):
+        """Format the next `chunk_size` approaches of `results` as JSON.
+
+        :param results: An iterator of `CloseApproach` objects.
+        :return: A list of JSON objects, empty once `results` is exhausted.
+        """
+        return [json.dumps(_approach_dict(approach)) for _, approach
+                in zip(range(self.chunk_size), results)]
+
+    @staticmethod
+    def _write_head(writer, status, content_type, keep_alive, headers=None):
+        """Write the status line and headers of a response."""
+        lines = [f'HTTP/1.1 {status.value} {status.phrase}',
+                 f'Content-Type: {content_type}',
+                 f"Connection: {'keep-alive' if keep_alive else 'close'}"]
+        lines.extend(f'{name}: {value}' for name, value in (headers or {}).items())
+        writer.write(('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1'))
+
+    @staticmethod
+    def _write_chunk(writer, data):
+        """Write one chunk of a response with chunked transfer encoding."""
+        writer.write(f'{len(data):x}\r\n'.encode('latin-1') + data + b'\r\n')
+
+    async def _send_json(self, writer, status, body, keep_alive=True):
+        """Send a complete JSON response."""
+        data = json.dumps(body).encode('utf-8')
+        self._write_head(writer, status, 'application/json', keep_alive,
+                         {'Content-Length': len(data)})
+        writer.write(data)
+        await writer.drain()
+
+
+def serve(database, host='127.0.0.1', port=8000):
+    """Answer requests about a database until interrupted.
+
+    :param database: The `NEODatabase` (or `SQLiteNEODatabase`) to query.
+    :param host: The address to listen on.
+    :param port: The port to listen on.
+    """
+    async def run():
+        server = await NEOServer(database).start(host, port)
+        for sock in server.sockets:
+            address = sock.getsockname()
+            print(f"Serving on http://{address[0]}:{address[1]}/ "
+                  "(press Ctrl-C to stop).", file=sys.stderr)
+        async with server:
+            await server.serve_forever()
+
+    try:
+        asyncio.run(run())
+    except KeyboardInterrupt:
+        pass
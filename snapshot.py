@@ -0,0 +1,261 @@
+"""Snapshot cache of a parsed and linked NEO database.
+
+Parsing `neos.csv` and `cad.json` dominates the start-up time of the command
+line tool. After a database has been built once, `save_snapshot` writes a
+compact binary form of it - typed columns plus string tables - next to the
+close approach data file, and `load_snapshot` reads it back on later runs
+with memory mapping instead of parsing the source files again. The stored
+approaches are already sorted by time and linked to their NEOs (by the index
+of each one's NEO), so `NEODatabase.from_snapshot` adopts the columns as
+they are, and only creates NEO and close approach objects as they are used.
+
+A snapshot is keyed by the size, modification time and content hash of both
+source files. If either file changes (or a different `--neofile` or
+`--cadfile` is given), the key no longer matches, `load_snapshot` returns
+`None`, and the caller rebuilds the database and saves a fresh snapshot.
+
+The optional close approach fields of the database (see `NEODatabase.fields`)
+are stored as columns too, and their names are recorded in the header, so a
+run that loads some of them can use a snapshot that has them all; a snapshot
+without one of them is rebuilt with it.
+
+Records added with `ingest` are only kept in the snapshot, not in the source
+files, so such a snapshot is marked as holding ingested records (see
+`holds_ingested`), has every optional field, and is never replaced by a
+database rebuilt from the source files.
+
+The file layout is a magic string, the length of a JSON header, the JSON
+header itself (the source key, the names of the optional fields, whether it
+holds ingested records, and the dtype, shape and offset of every column), and then the raw column data, each
+column aligned to 64 bytes.
+"""
+import hashlib
+import json
+import os
+import struct
+
+import numpy as np
+
+import profiling
+from database import NEODatabase
+
+
+MAGIC = b'NEOSNAP2'
+_ALIGN = 64
+_HEADER_LENGTH = struct.Struct('<Q')
+
+# The prefix of the names of the columns of optional close approach fields.
+_FIELD_PREFIX = 'field_'
+
+
+def snapshot_path(cadfile):
+    """Return the path of the snapshot kept next to a close approach file.
+
+    :param cadfile: A Path to a JSON file of close approach data.
+    :return: The Path of the corresponding snapshot file.
+    """
+    return cadfile.with_name(cadfile.name + '.snapshot')
+
+
+def _file_digest(path):
+    """Return the hex SHA-1 digest of a file's contents."""
+    digest = hashlib.sha1()
+    with open(path, 'rb') as infile:
+        for block in iter(lambda: infile.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _file_stat(path):
+    """Return the size and modification time of a file, for a source key."""
+    stat = os.stat(path)
+    return {'path': str(path), 'size': stat.st_size,
+            'mtime_ns': stat.st_mtime_ns}
+
+
+def _key_matches(path, recorded):
+    """Check whether a source file still matches its recorded key.
+
+    The size and modification time are compared first. Only if the
+    modification time differs (e.g. the file was copied or touched) is the
+    content hash computed and compared.
+    """
+    current = _file_stat(path)
+    if (current['path'] != recorded['path']
+            or current['size'] != recorded['size']):
+        return False
+    if current['mtime_ns'] == recorded['mtime_ns']:
+        return True
+    return _file_digest(path) == recorded['sha1']
+
+
+def _source_key(neofile, cadfile):
+    """Build the key identifying the source files of a snapshot."""
+    key = {}
+    for role, path in (('neofile', neofile), ('cadfile', cadfile)):
+        key[role] = _file_stat(path)
+        key[role]['sha1'] = _file_digest(path)
+    return key
+
+
+def _database_columns(database):
+    """Collect the typed columns and string tables of a database.
+
+    :param database: An `NEODatabase`.
+    :return: A dictionary mapping column names to NumPy arrays.
+    """
+    neos = database._neos
+    approaches = database._approaches
+    designations, approach_designation = np.unique(
+        np.array([approach._designation for approach in approaches],
+                 dtype=str),
+        return_inverse=True)
+    return {
+        'neo_designation': np.array([neo.designation for neo in neos],
+                                    dtype=str),
+        'neo_name': np.array([neo.name or '' for neo in neos], dtype=str),
+        'neo_diameter': np.array([neo.diameter for neo in neos],
+                                 dtype=np.float64),
+        'neo_hazardous': np.array([neo.hazardous for neo in neos],
+                                  dtype=bool),
+        'designations': designations,
+        'approach_designation': approach_designation.astype(np.int32),
+        'approach_time': database._time,
+        'approach_distance': database._columns['distance'],
+        'approach_velocity': database._columns['velocity'],
+        'approach_neo_index': database._neo_index,
+        **{_FIELD_PREFIX + name: database._columns[name]
+           for name in database.fields},
+    }
+
+
+def _read_header(path):
+    """Read the header of a snapshot.
+
+    :return: A tuple of the JSON header and its length in bytes, or `None`
+    if the file isn't a snapshot.
+    """
+    with open(path, 'rb') as infile:
+        if infile.read(len(MAGIC)) != MAGIC:
+            return None
+        (length,) = _HEADER_LENGTH.unpack(infile.read(_HEADER_LENGTH.size))
+        return json.loads(infile.read(length).decode('utf-8')), length
+
+
+def holds_ingested(cadfile):
+    """Check whether the snapshot next to a close approach file holds records
+    added with `ingest`, which a database rebuilt from the files lacks.
+
+    :param cadfile: A Path to the JSON file of close approach data.
+    :return: Whether there is such a snapshot, whatever its source key.
+    """
+    try:
+        found = _read_header(snapshot_path(cadfile))
+    except (OSError, ValueError):
+        return False
+    return found is not None and found[0].get('ingested', False)
+
+
+def save_snapshot(database, neofile, cadfile, ingested=False):
+    """Write a snapshot of a database built from the given source files.
+
+    The snapshot is written to a temporary file and moved into place, so a
+    concurrent reader never sees a partial snapshot.
+
+    :param database: The `NEODatabase` built from `neofile` and `cadfile`.
+    :param neofile: A Path to the CSV file of near-Earth objects.
+    :param cadfile: A Path to the JSON file of close approach data.
+    :param ingested: Whether the database holds records added with `ingest`.
+    :return: The Path of the written snapshot.
+    """
+    columns = _database_columns(database)
+    layout = {}
+    offset = 0
+    for name, column in columns.items():
+        layout[name] = {'dtype': column.dtype.str,
+                        'shape': list(column.shape),
+                        'offset': offset}
+        offset += -(-column.nbytes // _ALIGN) * _ALIGN
+
+    header = json.dumps({'key': _source_key(neofile, cadfile),
+                         'fields': list(database.fields),
+                         'ingested': ingested,
+                         'columns': layout}).encode('utf-8')
+    data_start = len(MAGIC) + _HEADER_LENGTH.size + len(header)
+    data_start = -(-data_start // _ALIGN) * _ALIGN
+
+    path = snapshot_path(cadfile)
+    temp_path = path.with_name(path.name + f'.{os.getpid()}.tmp')
+    with open(temp_path, 'wb') as outfile:
+        outfile.write(MAGIC)
+        outfile.write(_HEADER_LENGTH.pack(len(header)))
+        outfile.write(header)
+        for name, column in columns.items():
+            outfile.seek(data_start + layout[name]['offset'])
+            outfile.write(np.ascontiguousarray(column).tobytes())
+        outfile.truncate(data_start + offset)
+    os.replace(temp_path, path)
+    return path
+
+
+def _read_columns(path, neofile, cadfile, fields=()):
+    """Memory-map the columns of a snapshot if its key still matches.
+
+    :param fields: The names of optional close approach fields that the
+    snapshot must have.
+    :return: A tuple of a dictionary of read-only column arrays and the
+    names of the snapshot's optional fields, or `None`.
+    """
+    found = _read_header(path)
+    if found is None:
+        return None
+    header, length = found
+
+    key = header['key']
+    if not set(fields) <= set(header['fields']):
+        return None
+    if not (_key_matches(neofile, key['neofile'])
+            and _key_matches(cadfile, key['cadfile'])):
+        return None
+
+    data_start = len(MAGIC) + _HEADER_LENGTH.size + length
+    data_start = -(-data_start // _ALIGN) * _ALIGN
+    columns = {}
+    for name, spec in header['columns'].items():
+        shape = tuple(spec['shape'])
+        if not all(shape):
+            columns[name] = np.empty(shape, dtype=spec['dtype'])
+            continue
+        columns[name] = np.memmap(path, dtype=spec['dtype'], mode='r',
+                                  offset=data_start + spec['offset'],
+                                  shape=shape)
+    return columns, header['fields']
+
+
+def load_snapshot(neofile, cadfile, fields=()):
+    """Load the database saved in a snapshot.
+
+    If there is no snapshot next to `cadfile`, it was built from different
+    source files, or it lacks one of `fields`, return `None` instead.
+
+    :param neofile: A Path to the CSV file of near-Earth objects.
+    :param cadfile: A Path to the JSON file of close approach data.
+    :param fields: Names of optional close approach fields that are needed.
+    The database has every optional field stored in the snapshot.
+    :return: An `NEODatabase` (see `NEODatabase.from_snapshot`), or `None`.
+    """
+    path = snapshot_path(cadfile)
+    try:
+        found = _read_columns(path, neofile, cadfile, fields)
+    except (OSError, ValueError, KeyError):
+        return None
+    if found is None:
+        return None
+
+    columns, stored = found
+    with profiling.stage('load_snapshot') as timing:
+        database = NEODatabase.from_snapshot(
+            columns, {name: columns[_FIELD_PREFIX + name] for name in stored})
+        timing.rows = len(columns['approach_time'])
+    return database
+
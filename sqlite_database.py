@@ -0,0 +1,557 @@
+"""An NEO database kept in a SQLite file, with persistent indexes.
+
+`NEODatabase` rebuilds its objects and columns from the data files in every
+process. On a shared host it can be cheaper to import the data once into a
+SQLite file with `import_data`, and have every process open it with
+`SQLiteNEODatabase`, which offers the same interface as `NEODatabase`:
+`get_neo_by_designation`, `get_neo_by_name` and `query`, as well as the
+`count`, `stats`, `match_rows`, `sort_rows` and `search_neos` methods used by
+`main.py`.
+
+Each close approach row also holds the diameter and hazardous flag of its NEO,
+so that every filter of `create_filters` is a condition on a single indexed
+column of the `approaches` table. Dates are compared as ranges of the
+`minutes` column, whose index also yields the results in order of time. The
+filters are translated into the `WHERE` clause of one SQL query; any other
+filters are applied to the resulting `CloseApproach` objects.
+
+The row numbers used by `match_rows`, `sort_rows` and `approaches_at` are the
+`id`s of the `approaches` table, which follow the order of the data file.
+
+Later batches of NEOs or close approaches are added to an existing file with
+`append_data`, which skips the records that are already there.
+"""
+import operator
+import os
+import sqlite3
+
+import numpy as np
+
+from database import SORT_KEYS, aggregate, order_rows
+from extract import iter_approach_columns, load_neo_columns
+from filters import compile_filters
+from helpers import MINUTES_PER_DAY
+from models import NearEarthObject, CloseApproach
+from search import NameIndex
+
+
+# The number of rows inserted by each `executemany` call during an import.
+_BATCH_SIZE = 10000
+
+# The number of `id`s looked up by each query of `approaches_at`.
+_LOOKUP_SIZE = 500
+
+_SCHEMA = """
+CREATE TABLE neos (
+    id INTEGER PRIMARY KEY,
+    designation TEXT NOT NULL UNIQUE,
+    name TEXT,
+    diameter REAL,
+    hazardous INTEGER NOT NULL
+);
+CREATE TABLE approaches (
+    id INTEGER PRIMARY KEY,
+    neo_id INTEGER REFERENCES neos (id),
+    designation TEXT NOT NULL,
+    minutes INTEGER,
+    distance REAL NOT NULL,
+    velocity REAL NOT NULL,
+    diameter REAL,
+    hazardous INTEGER NOT NULL
+);
+"""
+
+# Created after the bulk import, which is much faster than updating them
+# row by row.
+_INDEXES = """
+CREATE INDEX neos_name ON neos (name);
+CREATE INDEX approaches_neo ON approaches (neo_id, minutes);
+CREATE INDEX approaches_minutes ON approaches (minutes);
+CREATE INDEX approaches_distance ON approaches (distance);
+CREATE INDEX approaches_velocity ON approaches (velocity);
+CREATE INDEX approaches_diameter ON approaches (diameter);
+CREATE INDEX approaches_hazardous ON approaches (hazardous);
+CREATE INDEX approaches_designation ON approaches (designation, minutes);
+"""
+
+# Looks up the approaches of a designation when appending data. Files
+# imported before this index was added get it on their first append.
+_APPEND_INDEXES = """
+CREATE INDEX IF NOT EXISTS approaches_designation
+    ON approaches (designation, minutes);
+"""
+
+# The column of the `approaches` table (or, for `named`, the expression over
+# its NEO) that each filter attribute compares.
+_FILTER_COLUMNS = {'distance': 'distance', 'velocity': 'velocity',
+                   'diameter': 'diameter', 'hazardous': 'hazardous',
+                   'named': "(COALESCE((SELECT name FROM neos "
+                            "WHERE neos.id = approaches.neo_id), '') != '')"}
+_SQL_OPS = {operator.eq: '=', operator.ge: '>=', operator.gt: '>',
+            operator.le: '<=', operator.lt: '<'}
+
+# A comparison of the approach day with a day, as ranges of `minutes`, whose
+# index also orders the results.
+_DAY_CONDITIONS = {
+    operator.eq: ('minutes >= ? AND minutes < ?', lambda day: (day, day + 1)),
+    operator.ge: ('minutes >= ?', lambda day: (day,)),
+    operator.gt: ('minutes >= ?', lambda day: (day + 1,)),
+    operator.le: ('minutes < ?', lambda day: (day + 1,)),
+    operator.lt: ('minutes < ?', lambda day: (day,)),
+}
+_SORT_COLUMNS = {'time': 'minutes', 'distance': 'distance',
+                 'velocity': 'velocity', 'diameter': 'diameter'}
+
+_APPROACH_COLUMNS = 'id, neo_id, designation, minutes, distance, velocity'
+_NEO_COLUMNS = 'id, designation, name, diameter, hazardous'
+
+
+def _batches(rows, size=_BATCH_SIZE):
+    """Split an iterator of rows into lists of at most `size` rows."""
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def import_data(path, neofile, cadfile, batch_size=_BATCH_SIZE):
+    """Import the NEO and close approach data files into a new SQLite file.
+
+    The rows are inserted in batches with `executemany`, all in a single
+    transaction, and the indexes are built at the end. The database is
+    written to a temporary file and moved into place, so a concurrent reader
+    never sees a partial import.
+
+    :param path: A Path to the SQLite file to create (or replace).
+    :param neofile: A Path to the CSV file of near-Earth objects.
+    :param cadfile: A Path to the JSON file of close approach data.
+    :param batch_size: The number of rows per `executemany` call.
+    :return: The number of NEOs and the number of close approaches imported.
+    """
+    temp_path = path.with_name(path.name + f'.{os.getpid()}.tmp')
+    if temp_path.exists():
+        temp_path.unlink()
+    connection = sqlite3.connect(temp_path)
+    try:
+        connection.execute('PRAGMA journal_mode = OFF')
+        connection.execute('PRAGMA synchronous = OFF')
+        connection.executescript(_SCHEMA)
+        with connection:
+            neo_count = _import_neos(connection, neofile, batch_size)
+            approach_count = _import_approaches(connection, cadfile, batch_size)
+        connection.executescript(_INDEXES)
+        connection.execute('ANALYZE')
+    finally:
+        connection.close()
+    os.replace(temp_path, path)
+    return neo_count, approach_count
+
+
+def _import_neos(connection, neofile, batch_size):
+    """Insert the rows of the `neos` table from a NEO CSV file."""
+    columns = load_neo_columns(neofile)
+    rows = ((index, pdes, name, None if diameter != diameter else diameter,
+             int(pha))
+            for index, (pdes, name, diameter, pha) in enumerate(zip(
+                columns['pdes'], columns['name'],
+                columns['diameter'].tolist(), columns['pha'].tolist())))
+    for batch in _batches(rows, batch_size):
+        connection.executemany('INSERT INTO neos VALUES (?, ?, ?, ?, ?)',
+                               batch)
+    return len(columns['pdes'])
+
+
+def _import_approaches(connection, cadfile, batch_size):
+    """Insert the rows of the `approaches` table from a close approach file.
+
+    Each row is linked to its NEO and copies the NEO's diameter and
+    hazardous flag; an approach of an unknown NEO has no diameter and is
+    not hazardous, as in `NEODatabase`.
+    """
+    neos = {designation: (neo_id, diameter, hazardous)
+            for neo_id, designation, diameter, hazardous in connection.execute(
+                'SELECT id, designation, diameter, hazardous FROM neos')}
+    unknown = (None, None, 0)
+
+    def rows():
+        row_id = 0
+        for columns in iter_approach_columns(cadfile):
+            for des, minutes, dist, v_rel in zip(
+                    columns['des'], columns['minutes'], columns['dist'],
+                    columns['v_rel']):
+                neo_id, diameter, hazardous = neos.get(des, unknown)
+                yield (row_id, neo_id, des, minutes,
+                       0.0 if dist is None else float(dist),
+                       0.0 if v_rel is None else float(v_rel),
+                       diameter, hazardous)
+                row_id += 1
+
+    count = 0
+    for batch in _batches(rows(), batch_size):
+        connection.executemany(
+            'INSERT INTO approaches VALUES (?, ?, ?, ?, ?, ?, ?, ?)', batch)
+        count += len(batch)
+    return count
+
+
+def append_data(path, neofile=None, cadfile=None, batch_size=_BATCH_SIZE):
+    """Append new NEOs and close approaches to a SQLite file from `import_data`.
+
+    NEOs whose designation is already in the file are skipped, and so are
+    close approaches of a designation at a time that is already in the file
+    (or earlier in `cadfile`). Approaches imported before their NEO are
+    linked to it. Every lookup uses an index, so appending takes time
+    proportional to the size of the new files rather than of the database.
+    Everything is appended in a single transaction.
+
+    :param path: A Path to the SQLite file.
+    :param neofile: A Path to a CSV file of new near-Earth objects, if any.
+    :param cadfile: A Path to a JSON file of new close approaches, if any.
+    :param batch_size: The number of rows per `executemany` call.
+    :return: The number of NEOs and the number of close approaches added.
+    """
+    connection = sqlite3.connect(path)
+    try:
+        connection.executescript(_APPEND_INDEXES)
+        with connection:
+            neo_count = (_append_neos(connection, neofile)
+                         if neofile is not None else 0)
+            approach_count = (_append_approaches(connection, cadfile, batch_size)
+                              if cadfile is not None else 0)
+    finally:
+        connection.close()
+    return neo_count, approach_count
+
+
+def _next_id(connection, table):
+    """Return the first unused `id` after the rows of a table."""
+    (next_id,) = connection.execute(
+        f'SELECT COALESCE(MAX(id) + 1, 0) FROM {table}').fetchone()
+    return next_id
+
+
+def _append_neos(connection, neofile):
+    """Insert the new rows of a NEO CSV file, and link their approaches."""
+    columns = load_neo_columns(neofile)
+    neo_id = _next_id(connection, 'neos')
+    count = 0
+    for pdes, name, diameter, pha in zip(columns['pdes'], columns['name'],
+                                         columns['diameter'].tolist(),
+                                         columns['pha'].tolist()):
+        diameter = None if diameter != diameter else diameter
+        inserted = connection.execute(
+            'INSERT OR IGNORE INTO neos VALUES (?, ?, ?, ?, ?)',
+            (neo_id, pdes, name, diameter, int(pha))).rowcount
+        if inserted:
+            connection.execute(
+                'UPDATE approaches SET neo_id = ?, diameter = ?, hazardous = ? '
+                'WHERE designation = ? AND neo_id IS NULL',
+                (neo_id, diameter, int(pha), pdes))
+            neo_id += 1
+            count += 1
+    return count
+
+
+def _append_approaches(connection, cadfile, batch_size):
+    """Insert the new rows of a close approach file, as in `_import_approaches`."""
+    neos = {}
+    unknown = (None, None, 0)
+
+    def neo_of(des):
+        if des not in neos:
+            neos[des] = connection.execute(
+                'SELECT id, diameter, hazardous FROM neos WHERE designation = ?',
+                (des,)).fetchone() or unknown
+        return neos[des]
+
+    def rows():
+        row_id = _next_id(connection, 'approaches')
+        seen = set()
+        for columns in iter_approach_columns(cadfile):
+            for des, minutes, dist, v_rel in zip(
+                    columns['des'], columns['minutes'], columns['dist'],
+                    columns['v_rel']):
+                if (des, minutes) in seen or connection.execute(
+                        'SELECT 1 FROM approaches '
+                        'WHERE designation = ? AND minutes IS ?',
+                        (des, minutes)).fetchone():
+                    continue
+                seen.add((des, minutes))
+                neo_id, diameter, hazardous = neo_of(des)
+                yield (row_id, neo_id, des, minutes,
+                       0.0 if dist is None else float(dist),
+                       0.0 if v_rel is None else float(v_rel),
+                       diameter, hazardous)
+                row_id += 1
+
+    count = 0
+    for batch in _batches(rows(), batch_size):
+        connection.executemany(
+            'INSERT INTO approaches VALUES (?, ?, ?, ?, ?, ?, ?, ?)', batch)
+        count += len(batch)
+    return count
+
+
+def _translate(filters):
+    """Translate a collection of filters into an SQL condition.
+
+    :param filters: A collection of filters, as from `create_filters`.
+    :return: A tuple of a `WHERE` clause (or an empty string), its
+    parameters, and a list of the filters that couldn't be translated.
+    """
+    conditions, parameters, row_filters = [], [], []
+    for filt in filters:
+        attr = getattr(filt, 'attr', None)
+        op = getattr(filt, 'op', None)
+        if attr == 'time' and op in _DAY_CONDITIONS:
+            condition, bounds = _DAY_CONDITIONS[op]
+            conditions.append(condition)
+            parameters.extend(day * MINUTES_PER_DAY
+                              for day in bounds(filt.operand))
+        elif attr in _FILTER_COLUMNS and op in _SQL_OPS:
+            conditions.append(f'{_FILTER_COLUMNS[attr]} {_SQL_OPS[op]} ?')
+            parameters.append(filt.operand)
+        else:
+            row_filters.append(filt)
+    where = f" WHERE {' AND '.join(conditions)}" if conditions else ''
+    return where, parameters, row_filters
+
+
+class SQLiteNEODatabase:
+    """A database of near-Earth objects and their close approaches in SQLite.
+
+    Objects are only built for the NEOs and close approaches that are looked
+    up or queried. Each NEO is built once per `SQLiteNEODatabase`, so all
+    the approaches of an NEO share it; its `.approaches` are filled in when
+    it is looked up with `get_neo_by_designation` or `get_neo_by_name`.
+    """
+
+    def __init__(self, path):
+        """Open a SQLite file created by `import_data`, read-only.
+
+        :param path: A Path to the SQLite file.
+        """
+        self.path = path
+        self._connection = sqlite3.connect(f'file:{path}?mode=ro', uri=True,
+                                           check_same_thread=False)
+        self._neos = {}
+        self._loaded = set()
+        self._name_index = None
+
+    def close(self):
+        """Close the connection to the SQLite file."""
+        self._connection.close()
+
+    def _neo(self, row):
+        """Return the `NearEarthObject` of a row of the `neos` table."""
+        neo_id, designation, name, diameter, hazardous = row
+        neo = self._neos.get(neo_id)
+        if neo is None:
+            info = {'pdes': designation, 'pha': 'Y' if hazardous else 'N'}
+            if name is not None:
+                info['name'] = name
+            if diameter is not None:
+                info['diameter'] = diameter
+            neo = self._neos[neo_id] = NearEarthObject(**info)
+        return neo
+
+    def _neo_by_id(self, neo_id):
+        """Return the `NearEarthObject` with an id, or `None`."""
+        if neo_id is None:
+            return None
+        neo = self._neos.get(neo_id)
+        if neo is None:
+            row = self._connection.execute(
+                f'SELECT {_NEO_COLUMNS} FROM neos WHERE id = ?',
+                (neo_id,)).fetchone()
+            neo = self._neo(row)
+        return neo
+
+    def _approach(self, row):
+        """Return a linked `CloseApproach` for a row of the `approaches` table."""
+        _, neo_id, designation, minutes, distance, velocity = row
+        info = {'des': designation, 'dist': distance, 'v_rel': velocity}
+        if minutes is not None:
+            info['minutes'] = minutes
+        approach = CloseApproach(**info)
+        approach.neo = self._neo_by_id(neo_id)
+        return approach
+
+    def _lookup(self, where, parameters):
+        """Find one NEO by a condition, with its close approaches."""
+        row = self._connection.execute(
+            f'SELECT {_NEO_COLUMNS} FROM neos WHERE {where}',
+            parameters).fetchone()
+        if row is None:
+            return None
+        neo = self._neo(row)
+        if row[0] not in self._loaded:
+            self._loaded.add(row[0])
+            neo.approaches = [self._approach(approach) for approach in
+                              self._connection.execute(
+                                  f'SELECT {_APPROACH_COLUMNS} FROM approaches '
+                                  'WHERE neo_id = ? ORDER BY minutes, id',
+                                  (row[0],))]
+        return neo
+
+    def get_neo_by_designation(self, designation):
+        """Find and return an NEO by its primary designation.
+
+        :param designation: The primary designation of the NEO to search for.
+        :return: The `NearEarthObject` with the desired primary designation,
+        or `None`.
+        """
+        return self._lookup('designation = ?', (designation,))
+
+    def get_neo_by_name(self, name):
+        """Find and return an NEO by its name.
+
+        :param name: The name, as a string, of the NEO to search for.
+        :return: The `NearEarthObject` with the desired name, or `None`.
+        """
+        if not name:
+            return None
+        return self._lookup('name = ?', (name,))
+
+    @property
+    def name_index(self):
+        """The `search.NameIndex` of NEO names and designations, built on first use."""
+        if self._name_index is None:
+            self._name_index = NameIndex(
+                self._neo(row) for row in self._connection.execute(
+                    f'SELECT {_NEO_COLUMNS} FROM neos'))
+        return self._name_index
+
+    def search_neos(self, text, limit=10, field=None):
+        """Find the NEOs whose name or designation best matches some text.
+
+        :param text: The (partial or misspelled) name or designation to find.
+        :param limit: The maximum number of matches to return.
+        :param field: 'name' or 'designation' to only search that field.
+        :return: A list of `search.Match`es, best first.
+        """
+        return self.name_index.search(text, limit=limit, field=field)
+
+    def query(self, filters):
+        """Query close approaches to generate those that match filters.
+
+        The approaches are generated in order of time, and in the order of
+        the data file for equal times, as in `NEODatabase.query`.
+
+        :param filters: A collection of filters capturing
+        user-specified criteria.
+        :return: A stream of matching `CloseApproach` objects.
+        """
+        where, parameters, row_filters = _translate(filters)
+        matches = compile_filters(row_filters)
+        cursor = self._connection.execute(
+            f'SELECT {_APPROACH_COLUMNS} FROM approaches{where} '
+            'ORDER BY minutes, id', parameters)
+        for row in cursor:
+            approach = self._approach(row)
+            if matches(approach):
+                yield approach
+
+    def match_rows(self, filters):
+        """Find the ids of all close approaches that match filters.
+
+        :param filters: A collection of filters capturing
+        user-specified criteria.
+        :return: An int32 array of matching ids, in the order of `query`.
+        """
+        where, parameters, row_filters = _translate(filters)
+        if row_filters:
+            matches = compile_filters(row_filters)
+            rows = [row[0] for row in self._connection.execute(
+                        f'SELECT {_APPROACH_COLUMNS} FROM approaches{where} '
+                        'ORDER BY minutes, id', parameters)
+                    if matches(self._approach(row))]
+        else:
+            rows = [row_id for (row_id,) in self._connection.execute(
+                f'SELECT id FROM approaches{where} ORDER BY minutes, id',
+                parameters)]
+        return np.array(rows, dtype=np.int32)
+
+    def _column(self, rows, column):
+        """Fetch a column of the approaches with the given ids, as floats."""
+        values = {}
+        rows = np.asarray(rows).tolist()
+        for start in range(0, len(rows), _LOOKUP_SIZE):
+            batch = rows[start:start + _LOOKUP_SIZE]
+            values.update(self._connection.execute(
+                f'SELECT id, {column} FROM approaches '
+                f'WHERE id IN ({", ".join("?" * len(batch))})', batch))
+        return np.array([values[row] for row in rows], dtype=np.float64)
+
+    def approaches_at(self, rows):
+        """Generate the close approaches with the given ids.
+
+        :param rows: An iterable of ids, as from `match_rows`.
+        :return: A stream of `CloseApproach` objects.
+        """
+        rows = np.asarray(rows).tolist()
+        for start in range(0, len(rows), _LOOKUP_SIZE):
+            batch = rows[start:start + _LOOKUP_SIZE]
+            found = {row[0]: row for row in self._connection.execute(
+                f'SELECT {_APPROACH_COLUMNS} FROM approaches '
+                f'WHERE id IN ({", ".join("?" * len(batch))})', batch)}
+            for row in batch:
+                yield self._approach(found[row])
+
+    def sort_rows(self, rows, by, descending=False, k=None):
+        """Order approach ids by the value of a column, keeping the first `k`.
+
+        See `NEODatabase.sort_rows`.
+        """
+        if by not in SORT_KEYS:
+            raise ValueError(f"Can't sort by {by!r}; expected one of {SORT_KEYS}.")
+        keys = self._column(rows, _SORT_COLUMNS[by])
+        return order_rows(rows, keys, descending=descending, k=k)
+
+    def count(self, filters):
+        """Count the close approaches that match filters.
+
+        :param filters: A collection of filters capturing
+        user-specified criteria.
+        :return: The number of matching close approaches.
+        """
+        where, parameters, row_filters = _translate(filters)
+        if row_filters:
+            return len(self.match_rows(filters))
+        (count,) = self._connection.execute(
+            f'SELECT COUNT(*) FROM approaches{where}', parameters).fetchone()
+        return count
+
+    def summarize(self, rows):
+        """Aggregate the distance and velocity of close approaches by id.
+
+        :param rows: An array of ids, as from `match_rows`.
+        :return: A dictionary of aggregates, as from `NEODatabase.summarize`.
+        """
+        return {'count': len(rows),
+                'distance': aggregate(self._column(rows, 'distance')),
+                'velocity': aggregate(self._column(rows, 'velocity'))}
+
+    def stats(self, filters):
+        """Aggregate the distance and velocity of the matching close approaches.
+
+        :param filters: A collection of filters capturing
+        user-specified criteria.
+        :return: A dictionary of aggregates, as from `NEODatabase.summarize`.
+        """
+        where, parameters, row_filters = _translate(filters)
+        if row_filters:
+            return self.summarize(self.match_rows(filters))
+        row = self._connection.execute(
+            'SELECT COUNT(*), MIN(distance), MAX(distance), AVG(distance), '
+            'MIN(velocity), MAX(velocity), AVG(velocity) '
+            f'FROM approaches{where}', parameters).fetchone()
+        nan = float('nan')
+        values = [nan if value is None else float(value) for value in row[1:]]
+        return {'count': row[0],
+                'distance': dict(zip(('min', 'max', 'mean'), values[:3])),
+                'velocity': dict(zip(('min', 'max', 'mean'), values[3:]))}
@@ -0,0 +1,150 @@
+"""Check the packed bitmap indexes and the queries that use them.
+
+To run these tests from the project root, run:
+
+    $ python3 -m unittest --verbose tests.test_bitmap
+"""
+import datetime
+import pathlib
+import unittest
+
+import numpy as np
+
+from bitmap import Bitmap
+from database import NEODatabase
+from extract import load_neos, load_approaches
+from filters import create_filters
+from models import NearEarthObject
+from planner import plan_query
+
+
+TESTS_ROOT = (pathlib.Path(__file__).parent).resolve()
+TEST_NEO_FILE = TESTS_ROOT / 'test-neos-2020.csv'
+TEST_CAD_FILE = TESTS_ROOT / 'test-cad-2020.json'
+
+
+class TestBitmap(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        self.first = rng.random(101) < 0.3
+        self.second = rng.random(101) < 0.6
+
+    def test_bitwise_operations_match_masks(self):
+        first, second = Bitmap.from_mask(self.first), Bitmap.from_mask(self.second)
+        np.testing.assert_array_equal((first & second).mask(), self.first & self.second)
+        np.testing.assert_array_equal((first | second).mask(), self.first | self.second)
+        np.testing.assert_array_equal((~first).mask(), ~self.first)
+        self.assertEqual((~first).count(), np.count_nonzero(~self.first))
+        with self.assertRaises(ValueError):
+            first & Bitmap.from_mask(self.second[:-1])
+
+    def test_windows(self):
+        bitmap = Bitmap.from_mask(self.first)
+        for start, stop in ((0, 101), (3, 5), (7, 17), (16, 96), (50, 200), (60, 60)):
+            with self.subTest(start=start, stop=stop):
+                expected = self.first[start:stop]
+                np.testing.assert_array_equal(bitmap.mask(start, stop), expected)
+                self.assertEqual(bitmap.count(start, stop), np.count_nonzero(expected))
+                np.testing.assert_array_equal(bitmap.rows(start, stop),
+                                              np.flatnonzero(expected) + start)
+
+    def test_extend(self):
+        bitmap = Bitmap.from_mask(self.first[:13])
+        for stop in (14, 30, 31, 64, 101):
+            bitmap.extend(self.first[len(bitmap):stop])
+        self.assertEqual(len(bitmap), 101)
+        np.testing.assert_array_equal(bitmap.mask(), self.first)
+        self.assertEqual(bitmap.count(), np.count_nonzero(self.first))
+
+    def test_set_rows(self):
+        bitmap = Bitmap.from_mask(self.first)
+        expected = self.first.copy()
+        rows = np.array([0, 3, 8, 9, 50, 100])
+        mask = np.array([True, False, True, False, True, True])
+        bitmap.set_rows(rows, mask)
+        expected[rows] = mask
+        np.testing.assert_array_equal(bitmap.mask(), expected)
+        self.assertEqual(bitmap.count(), np.count_nonzero(expected))
+
+
+class TestBitmapQueries(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.db = NEODatabase(load_neos(TEST_NEO_FILE), load_approaches(TEST_CAD_FILE))
+
+    def test_bitmaps_mark_the_rows_of_each_attribute(self):
+        approaches = self.db._approaches
+        self.assertEqual(self.db._bitmaps['hazardous'].mask().tolist(),
+                         [bool(approach.neo and approach.neo.hazardous)
+                          for approach in approaches])
+        self.assertEqual(self.db._bitmaps['diameter'].mask().tolist(),
+                         [bool(approach.neo) and not np.isnan(approach.neo.diameter)
+                          for approach in approaches])
+        self.assertEqual(self.db._bitmaps['named'].mask().tolist(),
+                         [bool(approach.neo and approach.neo.name)
+                          for approach in approaches])
+
+    def test_named_criterion_is_answered_by_its_bitmap(self):
+        for named in (True, False):
+            with self.subTest(named=named):
+                plan = plan_query(create_filters(named=named, distance_max=0.1),
+                                  self.db._statistics, indexed=('time',),
+                                  bitmaps=self.db._bitmaps)
+                self.assertEqual(plan.bitmaps, [('named', named)])
+                self.assertEqual([predicate.attr for predicate in plan.predicates],
+                                 ['distance'])
+
+    def test_queries_agree_with_a_full_scan(self):
+        for criteria in ({'hazardous': True, 'distance_max': 0.05},
+                         {'hazardous': False},
+                         {'start_date': datetime.date(2020, 3, 1), 'hazardous': True},
+                         {'diameter_min': 0.5, 'hazardous': False},
+                         {'diameter_max': 1.5, 'velocity_min': 10},
+                         {'named': True},
+                         {'named': False, 'distance_max': 0.1},
+                         {'named': True, 'hazardous': False, 'diameter_min': 0.1}):
+            with self.subTest(criteria=criteria):
+                filters = create_filters(**criteria)
+                expected = [approach for approach in self.db._approaches
+                            if approach.neo is not None
+                            and all(filt(approach) for filt in filters)]
+                self.assertEqual(list(self.db.query(filters)), expected)
+                self.assertEqual(self.db.count(filters), len(expected))
+                self.assertEqual(self.db.match_many([filters])[0].tolist(),
+                                 self.db.match_rows(filters).tolist())
+
+
+class TestNamedBitmapUpdates(unittest.TestCase):
+    def setUp(self):
+        neos = load_neos(TEST_NEO_FILE)
+        self.toro = next(neo for neo in neos if neo.name == 'Toro')
+        neos.remove(self.toro)
+        self.db = NEODatabase(neos, load_approaches(TEST_CAD_FILE))
+        self.filters = create_filters(named=True)
+
+    def named_designations(self):
+        return {approach._designation for approach in self.db.query(self.filters)}
+
+    def test_added_neos_update_the_bitmap(self):
+        self.assertNotIn(self.toro.designation, self.named_designations())
+        self.db.add_neos([self.toro])
+        self.assertIn(self.toro.designation, self.named_designations())
+        self.assertEqual(self.db.count(self.filters),
+                         sum(bool(approach.neo and approach.neo.name)
+                             for approach in self.db._approaches))
+
+    def test_renamed_neos_update_the_bitmap(self):
+        self.db.apply_neo_delta(added=[self.toro])
+        self.assertIn(self.toro.designation, self.named_designations())
+        unnamed = NearEarthObject(pdes=self.toro.designation,
+                                  pha='Y' if self.toro.hazardous else 'N',
+                                  diameter=self.toro.diameter)
+        self.db.apply_neo_delta(updated=[(self.toro, unnamed)])
+        self.assertNotIn(self.toro.designation, self.named_designations())
+        self.assertEqual(self.db._bitmaps['named'].mask().tolist(),
+                         [bool(approach.neo and approach.neo.name)
+                          for approach in self.db._approaches])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,278 @@
+"""Check that reloading changed data files matches building a new database.
+
+To run these tests from the project root, run:
+
+    $ python3 -m unittest --verbose tests.test_delta
+"""
+import csv
+import datetime
+import json
+import os
+import pathlib
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+from database import NEODatabase
+from delta import DataFiles, reload
+from extract import load_data, load_neos, load_approaches
+from filters import create_filters
+from models import NearEarthObject, CloseApproach
+from sqlite_database import SQLiteNEODatabase, append_data, import_data
+
+
+TESTS_ROOT = (pathlib.Path(__file__).parent).resolve()
+TEST_NEO_FILE = TESTS_ROOT / 'test-neos-2020.csv'
+TEST_CAD_FILE = TESTS_ROOT / 'test-cad-2020.json'
+
+CRITERIA = [
+    {},
+    {'date': datetime.date(2020, 3, 2)},
+    {'start_date': datetime.date(2020, 3, 1), 'end_date': datetime.date(2020, 3, 31),
+     'distance_max': 0.1},
+    {'velocity_min': 20, 'hazardous': True},
+    {'diameter_min': 0.5, 'diameter_max': 1.5, 'hazardous': False},
+]
+
+
+def _summary(approach):
+    """Identify a close approach by value, with its NEO's attributes."""
+    neo = approach.neo
+    return (approach._designation, approach.minutes, approach.distance,
+            approach.velocity, neo and neo.designation, neo and neo.hazardous)
+
+
+class TestReload(unittest.TestCase):
+    def setUp(self):
+        self.tempdir = pathlib.Path(tempfile.mkdtemp())
+        self.neofile = self.tempdir / 'neos.csv'
+        self.cadfile = self.tempdir / 'cad.json'
+        shutil.copy(TEST_NEO_FILE, self.neofile)
+        shutil.copy(TEST_CAD_FILE, self.cadfile)
+        self.files = DataFiles(self.neofile, self.cadfile)
+        self.db = NEODatabase(load_neos(self.neofile), load_approaches(self.cadfile))
+
+    def tearDown(self):
+        shutil.rmtree(self.tempdir)
+
+    def edit_approaches(self, edit):
+        """Rewrite the close approach file's rows with a function."""
+        with open(self.cadfile) as infile:
+            payload = json.load(infile)
+        payload['data'] = edit(payload['data'])
+        with open(self.cadfile, 'w') as outfile:
+            json.dump(payload, outfile)
+        self.touch(self.cadfile)
+
+    def edit_neos(self, edit):
+        """Rewrite the NEO file's rows (as dictionaries) with a function."""
+        with open(self.neofile) as infile:
+            reader = csv.DictReader(infile)
+            fieldnames = reader.fieldnames
+            rows = edit(list(reader))
+        with open(self.neofile, 'w', newline='') as outfile:
+            writer = csv.DictWriter(outfile, fieldnames=fieldnames)
+            writer.writeheader()
+            writer.writerows(rows)
+        self.touch(self.neofile)
+
+    @staticmethod
+    def touch(path):
+        """Move a file's modification time forward, as a later edit would."""
+        stat = os.stat(path)
+        os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+
+    def assertMatchesFreshDatabase(self):
+        fresh = NEODatabase(load_neos(self.neofile), load_approaches(self.cadfile))
+        np.testing.assert_array_equal(self.db._time, fresh._time)
+        for name, bitmap in fresh._bitmaps.items():
+            self.assertEqual(self.db._bitmaps[name].count(), bitmap.count())
+        for criteria in CRITERIA:
+            with self.subTest(criteria=criteria):
+                filters = create_filters(**criteria)
+                self.assertEqual(sorted(map(_summary, self.db.query(filters))),
+                                 sorted(map(_summary, fresh.query(filters))))
+                self.assertEqual(self.db.count(filters), fresh.count(filters))
+        for approach in self.db._approaches:
+            if approach.neo is not None:
+                self.assertEqual(approach.neo.designation, approach._designation)
+                self.assertIn(approach, approach.neo.approaches)
+        for neo in self.db._neos:
+            self.assertIs(self.db.get_neo_by_designation(neo.designation), neo)
+            self.assertEqual(len(neo.approaches),
+                             len(fresh.get_neo_by_designation(neo.designation).approaches))
+
+    def test_unchanged_files_are_not_reloaded(self):
+        summary = reload(self.db, self.files)
+        self.assertEqual(summary.roles, [])
+        self.assertEqual(self.db.version, 0)
+
+    def test_reload_added_and_removed_approaches(self):
+        def edit(rows):
+            moved = list(rows[10])
+            moved[3] = '2020-Dec-31 23:59'
+            added = list(rows[20])
+            added[3] = '2020-Feb-02 12:00'
+            return rows[:5] + rows[8:] + [added, moved, rows[30]]
+        self.edit_approaches(edit)
+
+        summary = reload(self.db, self.files)
+        self.assertEqual(summary.roles, ['approaches'])
+        self.assertEqual(summary.approaches_added, 3)
+        self.assertEqual(summary.approaches_removed, 3)
+        self.assertEqual(self.db.version, 1)
+        self.assertMatchesFreshDatabase()
+        self.assertEqual(reload(self.db, self.files).roles, [])
+
+    def test_reload_changed_neos(self):
+        removed = []
+
+        def edit(rows):
+            removed.append(rows[2]['pdes'])
+            rows[0]['pha'] = 'N' if rows[0]['pha'] == 'Y' else 'Y'
+            rows[1]['diameter'] = '12.5'
+            return rows[:2] + rows[3:]
+        self.edit_neos(edit)
+
+        summary = reload(self.db, self.files)
+        self.assertEqual(summary.roles, ['neos'])
+        self.assertEqual((summary.neos_added, summary.neos_removed,
+                          summary.neos_updated), (0, 1, 2))
+        self.assertIsNone(self.db.get_neo_by_designation(removed[0]))
+        self.assertMatchesFreshDatabase()
+
+    def test_reload_new_neo_with_new_approaches(self):
+        def edit_neos(rows):
+            new = dict(rows[0], pdes='2099 ZZ9', name='Reloaded', full_name='2099 ZZ9 Reloaded',
+                       id='a9999999', spkid='9999999')
+            return rows + [new]
+
+        def edit_approaches(rows):
+            new = list(rows[0])
+            new[0] = '2099 ZZ9'
+            new[3] = '2020-Jun-15 08:30'
+            return rows + [new]
+        self.edit_neos(edit_neos)
+        self.edit_approaches(edit_approaches)
+
+        summary = reload(self.db, self.files)
+        self.assertEqual(summary.roles, ['neos', 'approaches'])
+        neo = self.db.get_neo_by_name('Reloaded')
+        self.assertEqual(len(neo.approaches), 1)
+        self.assertEqual(self.db.search_neos('reloaded')[0].neo, neo)
+        self.assertMatchesFreshDatabase()
+
+    def test_reload_keeps_optional_fields(self):
+        neos, approaches, fields = load_data(self.neofile, self.cadfile, parallel=False,
+                                             fields=['dist_min', 'h'])
+        self.db = NEODatabase(neos, approaches, fields)
+
+        def edit(rows):
+            added = list(rows[20])
+            added[3], added[5], added[10] = '2020-Feb-02 12:00', '0.000123', '17.5'
+            return rows[5:] + [added]
+        self.edit_approaches(edit)
+        reload(self.db, self.files)
+
+        def values(database):
+            # NaN values are compared by their representation.
+            return sorted((_summary(approach), repr(float(database._columns['dist_min'][row])),
+                           repr(float(database._columns['h'][row])))
+                          for row, approach in enumerate(database._approaches))
+        fresh = NEODatabase(*load_data(self.neofile, self.cadfile, parallel=False,
+                                       fields=['dist_min', 'h']))
+        self.assertEqual(values(self.db), values(fresh))
+        self.assertEqual(self.db.count(create_filters(dist_min_max=0.0002)),
+                         fresh.count(create_filters(dist_min_max=0.0002)))
+
+
+class TestIngest(unittest.TestCase):
+    def setUp(self):
+        self.neos = load_neos(TEST_NEO_FILE)
+        self.approaches = load_approaches(TEST_CAD_FILE)
+        self.db = NEODatabase(load_neos(TEST_NEO_FILE), load_approaches(TEST_CAD_FILE))
+
+    def batch(self, minutes, designations=('2020 AY1', '2019 YK')):
+        return [CloseApproach(des=des, minutes=minutes, dist=0.01, v_rel=10.0)
+                for des in designations]
+
+    def assertMatchesFreshDatabase(self, neos, approaches):
+        fresh = NEODatabase(neos, approaches)
+        np.testing.assert_array_equal(self.db._time, fresh._time)
+        for name, column in fresh._columns.items():
+            np.testing.assert_array_equal(self.db._columns[name], column)
+        for name, bitmap in fresh._bitmaps.items():
+            np.testing.assert_array_equal(self.db._bitmaps[name].mask(), bitmap.mask())
+        for criteria in CRITERIA:
+            with self.subTest(criteria=criteria):
+                filters = create_filters(**criteria)
+                self.assertEqual(list(map(_summary, self.db.query(filters))),
+                                 list(map(_summary, fresh.query(filters))))
+
+    def test_add_later_approaches_appends_in_place(self):
+        last = int(self.db._time[-1])
+        added = self.db.add_approaches(self.batch(last + 1))
+        self.assertEqual(len(added), 2)
+        buffer = self.db._columns['distance'].base
+        self.assertIsNotNone(buffer)
+        self.assertEqual(len(self.db.add_approaches(self.batch(last + 2))), 2)
+        self.assertIs(self.db._columns['distance'].base, buffer)
+        self.assertEqual(self.db.version, 2)
+        self.assertMatchesFreshDatabase(
+            self.neos, self.approaches + self.batch(last + 1) + self.batch(last + 2))
+
+    def test_add_approaches_skips_duplicates(self):
+        known = self.approaches[0]
+        duplicate = CloseApproach(des=known._designation, minutes=known.minutes,
+                                  dist=1.0, v_rel=1.0)
+        batch = self.batch(known.minutes + 1) * 2 + [duplicate]
+        self.assertEqual(len(self.db.add_approaches(batch)), 2)
+        self.assertEqual(self.db.add_approaches([duplicate]), [])
+        self.assertMatchesFreshDatabase(self.neos,
+                                        self.approaches + self.batch(known.minutes + 1))
+
+    def test_add_approaches_keeps_their_fields_aligned(self):
+        neos, approaches, fields = load_data(TEST_NEO_FILE, TEST_CAD_FILE, parallel=False,
+                                             fields=['h'])
+        db = NEODatabase(neos, approaches, fields=fields)
+        known = approaches[0]
+        duplicate = CloseApproach(des=known._designation, minutes=known.minutes,
+                                  dist=1.0, v_rel=1.0)
+        batch = [duplicate, *self.batch(known.minutes + 1)]
+        added = db.add_approaches(batch, fields={'h': np.array([1.0, 2.0, 3.0])})
+        self.assertEqual(added, batch[1:])
+        self.assertEqual(sorted(db._columns['h'][db._approaches.index(approach)]
+                                for approach in added), [2.0, 3.0])
+
+    def test_add_neos_links_earlier_approaches(self):
+        self.db.add_approaches(self.batch(self.approaches[0].minutes, ['2099 ZZ9']))
+        self.assertIsNone(self.db._approaches[1].neo)
+        neo = NearEarthObject(pdes='2099 ZZ9', name='Ingested', diameter=2.5, pha='Y')
+        bitmaps = dict(self.db._bitmaps)
+        self.assertEqual(self.db.add_neos([neo, self.neos[0]]), [neo])
+        for name, bitmap in bitmaps.items():
+            self.assertIs(self.db._bitmaps[name], bitmap)
+        self.assertEqual(len(neo.approaches), 1)
+        self.assertIs(self.db.get_neo_by_name('Ingested'), neo)
+        self.assertEqual(self.db.search_neos('ingested')[0].neo, neo)
+        self.assertMatchesFreshDatabase(
+            self.neos + [NearEarthObject(pdes='2099 ZZ9', name='Ingested',
+                                         diameter=2.5, pha='Y')],
+            self.approaches + self.batch(self.approaches[0].minutes, ['2099 ZZ9']))
+
+    def test_append_to_sqlite_file(self):
+        with tempfile.TemporaryDirectory() as tempdir:
+            path = pathlib.Path(tempdir) / 'neos.sqlite'
+            import_data(path, TEST_NEO_FILE, TEST_CAD_FILE)
+            self.assertEqual(append_data(path, TEST_NEO_FILE, TEST_CAD_FILE), (0, 0))
+            database = SQLiteNEODatabase(path)
+            try:
+                self.assertEqual(database.count(create_filters()), len(self.approaches))
+            finally:
+                database.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
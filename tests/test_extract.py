@@ -10,13 +10,22 @@ To run these tests from the project root, run:
 
 These tests should pass when Task 2 is complete.
 """
+import collections
 import collections.abc
+import concurrent.futures
+import csv
 import datetime
+import json
 import pathlib
 import math
+import tracemalloc
 import unittest
+from unittest import mock
 
-from extract import load_neos, load_approaches
+import numpy as np
+
+from extract import (APPROACH_FIELDS, load_neos, load_approaches, load_data,
+                     load_neo_columns, iter_approach_rows, sigma_to_minutes)
 from models import NearEarthObject, CloseApproach
 
 
@@ -78,6 +87,29 @@ class TestLoadNEOs(unittest.TestCase):
         self.assertEqual(neo.hazardous, True)
 
 
+class TestLoadNEOColumns(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        with open(TEST_NEO_FILE) as neocsv:
+            cls.rows = list(csv.DictReader(neocsv))
+
+    def assertColumnsMatchRows(self, columns):
+        self.assertEqual(columns['pdes'], [row['pdes'] for row in self.rows])
+        self.assertEqual(columns['name'], [row['name'] or None for row in self.rows])
+        self.assertEqual(columns['pha'].tolist(), [row['pha'] == 'Y' for row in self.rows])
+        for diameter, row in zip(columns['diameter'].tolist(), self.rows):
+            if row['diameter']:
+                self.assertEqual(diameter, float(row['diameter']))
+            else:
+                self.assertTrue(math.isnan(diameter))
+
+    def test_single_chunk(self):
+        self.assertColumnsMatchRows(load_neo_columns(TEST_NEO_FILE, workers=1))
+
+    def test_chunks_parsed_in_worker_processes(self):
+        self.assertColumnsMatchRows(load_neo_columns(TEST_NEO_FILE, workers=3, min_chunk_bytes=1))
+
+
 class TestLoadApproaches(unittest.TestCase):
     @classmethod
     def setUpClass(cls):
@@ -112,11 +144,100 @@ class TestLoadApproaches(unittest.TestCase):
         self.assertIsNotNone(approach)
         self.assertIsInstance(approach.distance, float)
 
+    def test_approach_has_no_instance_dict(self):
+        approach = self.get_first_approach_or_none()
+        self.assertIsNotNone(approach)
+        self.assertFalse(hasattr(approach, '__dict__'))
+
     def test_approach_velocity_is_float(self):
         approach = self.get_first_approach_or_none()
         self.assertIsNotNone(approach)
         self.assertIsInstance(approach.velocity, float)
 
 
+class TestStreamApproaches(unittest.TestCase):
+    def test_streamed_rows_match_json_load(self):
+        with open(TEST_CAD_FILE) as jfile:
+            payload = json.load(jfile)
+        expected = [dict(zip(payload['fields'], row)) for row in payload['data']]
+        self.assertEqual(list(iter_approach_rows(TEST_CAD_FILE)), expected)
+
+    def test_streaming_peak_memory_is_below_json_load(self):
+        tracemalloc.start()
+        try:
+            collections.deque(iter_approach_rows(TEST_CAD_FILE), maxlen=0)
+            _, streamed_peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+        tracemalloc.start()
+        try:
+            with open(TEST_CAD_FILE) as jfile:
+                payload = json.load(jfile)
+            _, loaded_peak = tracemalloc.get_traced_memory()
+            del payload
+        finally:
+            tracemalloc.stop()
+
+        self.assertLess(streamed_peak * 4, loaded_peak)
+
+
+class TestLoadData(unittest.TestCase):
+    def assertSameData(self, loaded):
+        neos, approaches = loaded
+        self.assertEqual([neo.designation for neo in neos],
+                         [neo.designation for neo in load_neos(TEST_NEO_FILE)])
+        self.assertEqual([(a._designation, a.minutes, a.distance, a.velocity) for a in approaches],
+                         [(a._designation, a.minutes, a.distance, a.velocity)
+                          for a in load_approaches(TEST_CAD_FILE)])
+
+    def load_in_parallel(self, **kwargs):
+        """Load the test data with a worker process, even on a single CPU."""
+        executor = mock.Mock(wraps=concurrent.futures.ProcessPoolExecutor)
+        sequential = AssertionError("The data was loaded sequentially.")
+        with mock.patch('extract.os.cpu_count', return_value=2), \
+                mock.patch('concurrent.futures.ProcessPoolExecutor', executor), \
+                mock.patch('extract.load_approaches', side_effect=sequential), \
+                mock.patch('extract._load_approaches_and_fields', side_effect=sequential):
+            loaded = load_data(TEST_NEO_FILE, TEST_CAD_FILE, parallel=True, **kwargs)
+        executor.assert_called_once_with(max_workers=1)
+        return loaded
+
+    def test_parallel_load_matches_sequential_load(self):
+        self.assertSameData(self.load_in_parallel())
+
+    def test_sequential_load(self):
+        self.assertSameData(load_data(TEST_NEO_FILE, TEST_CAD_FILE, parallel=False))
+
+    def test_optional_fields_are_typed_columns(self):
+        with open(TEST_CAD_FILE) as jfile:
+            payload = json.load(jfile)
+        rows = [dict(zip(payload['fields'], row)) for row in payload['data']]
+        for parallel in (False, True):
+            with self.subTest(parallel=parallel):
+                if parallel:
+                    loaded = self.load_in_parallel(fields=APPROACH_FIELDS)
+                else:
+                    loaded = load_data(TEST_NEO_FILE, TEST_CAD_FILE, parallel=False,
+                                       fields=APPROACH_FIELDS)
+                neos, approaches, fields = loaded
+                self.assertSameData((neos, approaches))
+                self.assertEqual(list(fields), list(APPROACH_FIELDS))
+                for name, dtype in APPROACH_FIELDS.items():
+                    self.assertEqual(fields[name].dtype, dtype)
+                    self.assertEqual(len(fields[name]), len(approaches))
+                np.testing.assert_array_equal(fields['dist_min'],
+                                              [float(row['dist_min']) for row in rows])
+                np.testing.assert_array_equal(fields['h'],
+                                              np.array([row['h'] for row in rows],
+                                                       dtype=np.float32))
+
+    def test_sigma_to_minutes(self):
+        self.assertEqual(sigma_to_minutes('< 00:01'), 1)
+        self.assertEqual(sigma_to_minutes('13:05'), 13 * 60 + 5)
+        self.assertEqual(sigma_to_minutes('3_08:05'), (3 * 24 + 8) * 60 + 5)
+        self.assertTrue(math.isnan(sigma_to_minutes(None)))
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,49 @@
+"""Check that the synthetic benchmark data loads like NASA's data.
+
+To run these tests from the project root, run:
+
+    $ python3 -m unittest --verbose tests.test_generate
+"""
+import pathlib
+import shutil
+import tempfile
+import unittest
+
+from benchmarks.generate import generate, UNIT_NEOS, UNIT_APPROACHES
+from database import NEODatabase
+from extract import load_neos, load_approaches
+
+
+class TestGenerate(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.tmpdir = pathlib.Path(tempfile.mkdtemp())
+        cls.neofile, cls.cadfile = generate(cls.tmpdir, scale=0.5, seed=1)
+        cls.neos = load_neos(cls.neofile)
+        cls.approaches = load_approaches(cls.cadfile)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.tmpdir)
+
+    def test_sizes_follow_the_scale(self):
+        self.assertEqual(len(self.neos), UNIT_NEOS // 2)
+        self.assertEqual(len(self.approaches), UNIT_APPROACHES // 2)
+
+    def test_approaches_are_chronological(self):
+        times = [approach.time for approach in self.approaches]
+        self.assertEqual(times, sorted(times))
+
+    def test_every_approach_links_to_a_neo(self):
+        NEODatabase(self.neos, self.approaches)
+        self.assertTrue(all(approach.neo is not None for approach in self.approaches))
+
+    def test_generation_is_reproducible(self):
+        other = self.tmpdir / 'other'
+        neofile, cadfile = generate(other, scale=0.5, seed=1)
+        self.assertEqual(neofile.read_bytes(), self.neofile.read_bytes())
+        self.assertEqual(cadfile.read_bytes(), self.cadfile.read_bytes())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,67 @@
+"""Check that the batch date conversion agrees with `cd_to_datetime`.
+
+To run these tests from the project root, run:
+
+    $ python3 -m unittest --verbose tests.test_helpers
+"""
+import datetime
+import json
+import pathlib
+import unittest
+
+from helpers import (cd_to_datetime, cd_to_minutes, datetime_to_minutes,
+                     minutes_to_datetime, minutes_to_strs, date_to_day,
+                     datetime_to_str, MINUTES_PER_DAY)
+
+
+TESTS_ROOT = (pathlib.Path(__file__).parent).resolve()
+TEST_CAD_FILE = TESTS_ROOT / 'test-cad-2020.json'
+
+
+class TestCdToMinutes(unittest.TestCase):
+    def assertMatchesStrptime(self, calendar_dates):
+        expected = [datetime_to_minutes(cd_to_datetime(cd)) for cd in calendar_dates]
+        self.assertEqual(cd_to_minutes(calendar_dates).tolist(), expected)
+
+    def test_matches_strptime_on_test_data(self):
+        with open(TEST_CAD_FILE) as jfile:
+            payload = json.load(jfile)
+        cd = payload['fields'].index('cd')
+        self.assertMatchesStrptime([row[cd] for row in payload['data']])
+
+    def test_matches_strptime_on_edge_cases(self):
+        self.assertMatchesStrptime([
+            '1900-Jan-01 00:11', '1969-Jul-20 20:17', '2020-Feb-29 10:00',
+            '2099-Dec-31 23:59', '2020-dec-31 12:00', '2020-Jan-1 0:05',
+        ])
+
+    def test_empty_column(self):
+        self.assertEqual(len(cd_to_minutes([])), 0)
+
+    def test_rejects_malformed_dates(self):
+        for calendar_date in ('2021-Feb-29 10:00', '2020-Foo-01 00:00',
+                              '2020-Jan-01 24:00', 'not a date'):
+            with self.assertRaises(ValueError):
+                cd_to_minutes([calendar_date])
+
+    def test_minutes_round_trip(self):
+        dt = datetime.datetime(1969, 7, 20, 20, 17)
+        self.assertEqual(minutes_to_datetime(datetime_to_minutes(dt)), dt)
+
+    def test_date_to_day_agrees_with_minutes(self):
+        dt = datetime.datetime(1969, 7, 20, 20, 17)
+        self.assertEqual(date_to_day(dt.date()), datetime_to_minutes(dt) // MINUTES_PER_DAY)
+
+
+class TestMinutesToStrs(unittest.TestCase):
+    def test_matches_datetime_to_str(self):
+        minutes = [-36816469, -236383, 0, 26382840, 68374079]
+        expected = [datetime_to_str(minutes_to_datetime(m)) for m in minutes]
+        self.assertEqual(minutes_to_strs(minutes), expected)
+
+    def test_missing_times_are_empty(self):
+        self.assertEqual(minutes_to_strs([None, 0, None]), ['', '1970-01-01 00:00', ''])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,211 @@
+"""Check the `query` subcommand's aggregates and the shell's result cache.
+
+To run these tests from the project root, run::
+
+    $ python3 -m unittest --verbose tests.test_main
+"""
+import argparse
+import contextlib
+import datetime
+import io
+import json
+import pathlib
+import shutil
+import tempfile
+import unittest
+
+from database import NEODatabase
+from extract import load_neos, load_approaches
+from filters import create_filters, filters_key
+from main import (NEOShell, QueryCache, batch, ingest, load_database, make_parser,
+                  query, read_batch)
+from snapshot import holds_ingested, save_snapshot
+
+
+TESTS_ROOT = (pathlib.Path(__file__).parent).resolve()
+TEST_NEO_FILE = TESTS_ROOT / 'test-neos-2020.csv'
+TEST_CAD_FILE = TESTS_ROOT / 'test-cad-2020.json'
+
+
+def _query_args(**kwargs):
+    """Build the parsed arguments of a `query` subcommand."""
+    args = dict(date=None, start_date=None, end_date=None,
+                distance_min=None, distance_max=None,
+                velocity_min=None, velocity_max=None,
+                diameter_min=None, diameter_max=None,
+                hazardous=None, limit=None, outfile=None,
+                count=False, stats=False)
+    args.update(kwargs)
+    return argparse.Namespace(**args)
+
+
+class TestQueryCache(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.db = NEODatabase(load_neos(TEST_NEO_FILE), load_approaches(TEST_CAD_FILE))
+
+    def run_query(self, cache, **kwargs):
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            query(self.db, _query_args(**kwargs), cache=cache)
+        return output.getvalue()
+
+    def test_filters_key_ignores_order(self):
+        first = create_filters(distance_max=0.1, velocity_min=5)
+        self.assertEqual(filters_key(first), filters_key(list(reversed(first))))
+        self.assertNotEqual(filters_key(first), filters_key(create_filters(distance_max=0.1)))
+
+    def test_repeated_query_hits_cache(self):
+        cache = QueryCache()
+        date = datetime.date(2020, 1, 1)
+        uncached = self.run_query(None, date=date, limit=3)
+        self.assertEqual(self.run_query(cache, date=date, limit=3), uncached)
+        self.assertEqual(self.run_query(cache, date=date, limit=3), uncached)
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+
+    def test_count_uses_cached_rows(self):
+        cache = QueryCache()
+        listed = self.run_query(cache, distance_max=0.1, outfile=None, limit=10000)
+        self.assertEqual(self.run_query(cache, distance_max=0.1, count=True),
+                         f"{len(listed.splitlines())}\n")
+        self.assertEqual(cache.hits, 1)
+
+    def test_least_recently_used_result_is_evicted(self):
+        cache = QueryCache(maxsize=2)
+        for distance_max in (0.1, 0.2, 0.1, 0.3):
+            self.run_query(cache, distance_max=distance_max, limit=1)
+        self.assertEqual(len(cache), 2)
+        self.run_query(cache, distance_max=0.1, limit=1)
+        self.run_query(cache, distance_max=0.2, limit=1)
+        self.assertEqual((cache.hits, cache.misses), (2, 4))
+
+    def test_cache_is_invalidated_for_a_new_database(self):
+        cache = QueryCache()
+        key = filters_key(create_filters())
+        cache.put(self.db, key, [0])
+        self.assertIsNone(cache.get(object(), key))
+        self.assertEqual(len(cache), 0)
+
+    def test_cache_is_invalidated_when_the_database_changes(self):
+        cache = QueryCache()
+        key = filters_key(create_filters())
+        cache.put(self.db, key, [0])
+        self.db.apply_approach_delta()
+        self.assertIsNotNone(cache.get(self.db, key))
+        self.db.apply_neo_delta()
+        self.assertIsNone(cache.get(self.db, key))
+
+
+class TestBatch(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.db = NEODatabase(load_neos(TEST_NEO_FILE), load_approaches(TEST_CAD_FILE))
+        cls.query_parser = make_parser()[2]
+
+    def test_batch_writes_the_same_files_as_query(self):
+        queries = ['--start-date 2020-03-01 --max-distance 0.1 --outfile {}/a.csv',
+                   '--hazardous --outfile {}/b.json',
+                   '--hazardous --max-distance 0.1 --limit 5 --outfile {}/c.ndjson',
+                   '--hazardous --sort-by velocity --limit 3 --outfile {}/d.csv']
+        with tempfile.TemporaryDirectory() as tempdir:
+            specfile = pathlib.Path(tempdir) / 'batch.txt'
+            specfile.write_text('# reports\n\n' + '\n'.join(
+                line.format(tempdir + '/batch') for line in queries))
+            (pathlib.Path(tempdir) / 'batch').mkdir()
+            (pathlib.Path(tempdir) / 'single').mkdir()
+            specs = read_batch(specfile, self.query_parser)
+            self.assertEqual(len(specs), len(queries))
+            with contextlib.redirect_stderr(io.StringIO()):
+                batch(self.db, specs)
+            for line in queries:
+                query(self.db, self.query_parser.parse_args(
+                    line.format(tempdir + '/single').split()))
+            for name in ('a.csv', 'b.json', 'c.ndjson', 'd.csv'):
+                self.assertEqual((pathlib.Path(tempdir) / 'batch' / name).read_text(),
+                                 (pathlib.Path(tempdir) / 'single' / name).read_text())
+
+    def test_invalid_query_is_reported_with_its_line(self):
+        with tempfile.TemporaryDirectory() as tempdir:
+            specfile = pathlib.Path(tempdir) / 'batch.txt'
+            specfile.write_text('--hazardous\n--colour red\n')
+            with contextlib.redirect_stderr(io.StringIO()):
+                with self.assertRaisesRegex(ValueError, 'line 2'):
+                    read_batch(specfile, self.query_parser)
+
+
+class TestCompleteInspect(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        db = NEODatabase(load_neos(TEST_NEO_FILE), load_approaches(TEST_CAD_FILE))
+        _, inspect_parser, query_parser = make_parser()
+        cls.shell = NEOShell(db, inspect_parser, query_parser)
+
+    def complete(self, line):
+        text = line.split(' ')[-1]
+        return self.shell.complete_inspect(text, line, len(line) - len(text), len(line))
+
+    def test_completions_continue_the_current_word(self):
+        self.assertEqual(self.complete('inspect --name TOR'), ['Toro'])
+        self.assertIn('2020 AB2', self.complete('inspect --pdes 2020'))
+        for line in ('inspect --pdes 2020 ab', 'inspect --pdes 2020  ab',
+                     'inspect --pdes  2020 ab'):
+            with self.subTest(line=line):
+                self.assertIn('AB2', self.complete(line))
+                self.assertTrue(all(completion.startswith('AB')
+                                    for completion in self.complete(line)))
+
+
+
+class TestIngest(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = pathlib.Path(tempfile.mkdtemp())
+        self.neofile = self.tmpdir / TEST_NEO_FILE.name
+        self.cadfile = self.tmpdir / TEST_CAD_FILE.name
+        shutil.copy(TEST_NEO_FILE, self.neofile)
+        shutil.copy(TEST_CAD_FILE, self.cadfile)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def ingest_approach(self):
+        """Ingest one new close approach of 2020 AY1 in 2030."""
+        payload = json.loads(TEST_CAD_FILE.read_text())
+        row = dict(zip(payload['fields'], payload['data'][0]))
+        row.update(des='2020 AY1', cd='2030-Jan-01 00:00', h='30.5')
+        payload['data'] = [[row[field] for field in payload['fields']]]
+        payload['count'] = '1'
+        batchfile = self.tmpdir / 'batch.json'
+        batchfile.write_text(json.dumps(payload))
+        args = argparse.Namespace(neos=None, approaches=batchfile, sqlite=None,
+                                  snapshot=True, neofile=self.neofile,
+                                  cadfile=self.cadfile, parallel=False)
+        with contextlib.redirect_stdout(io.StringIO()):
+            ingest(args)
+
+    def count_2030(self, fields=()):
+        database = load_database(self.neofile, self.cadfile, parallel=False,
+                                 fields=fields)
+        return database.count(create_filters(start_date=datetime.date(2030, 1, 1),
+                                             h_max=40 if fields else None))
+
+    def test_ingested_records_survive_a_query_of_another_field(self):
+        load_database(self.neofile, self.cadfile, parallel=False)
+        self.ingest_approach()
+        self.assertEqual(self.count_2030(), 1)
+        self.assertEqual(self.count_2030(fields=['h']), 1)
+        self.assertEqual(self.count_2030(), 1)
+
+    def test_snapshot_with_ingested_records_is_not_replaced(self):
+        database = load_database(self.neofile, self.cadfile, parallel=False)
+        save_snapshot(database, self.neofile, self.cadfile, ingested=True)
+        with contextlib.redirect_stderr(io.StringIO()) as stderr:
+            load_database(self.neofile, self.cadfile, parallel=False, fields=['h'])
+        self.assertIn('ingested', stderr.getvalue())
+        self.assertTrue(holds_ingested(self.cadfile))
+        with contextlib.redirect_stderr(io.StringIO()):
+            self.ingest_approach()
+        self.assertEqual(self.count_2030(), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,86 @@
+"""Check that the query planner merges, orders and short-circuits filters.
+
+To run these tests from the project root, run:
+
+    $ python3 -m unittest --verbose tests.test_planner
+"""
+import datetime
+import operator
+import pathlib
+import unittest
+
+from database import NEODatabase
+from extract import load_neos, load_approaches
+from filters import create_filters
+from planner import RangePredicate, plan_query
+
+
+TESTS_ROOT = (pathlib.Path(__file__).parent).resolve()
+TEST_NEO_FILE = TESTS_ROOT / 'test-neos-2020.csv'
+TEST_CAD_FILE = TESTS_ROOT / 'test-cad-2020.json'
+
+
+class TestRangePredicate(unittest.TestCase):
+    def test_bounds_are_merged(self):
+        predicate = RangePredicate('distance')
+        predicate.restrict(operator.ge, 0.1)
+        predicate.restrict(operator.le, 0.4)
+        predicate.restrict(operator.ge, 0.2)
+        self.assertEqual((predicate.low, predicate.high), (0.2, 0.4))
+        self.assertFalse(predicate.empty)
+
+    def test_exclusive_equal_bounds_are_empty(self):
+        predicate = RangePredicate('distance')
+        predicate.restrict(operator.ge, 0.1)
+        predicate.restrict(operator.lt, 0.1)
+        self.assertTrue(predicate.empty)
+
+
+class TestPlanQuery(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.db = NEODatabase(load_neos(TEST_NEO_FILE), load_approaches(TEST_CAD_FILE))
+
+    def plan(self, **criteria):
+        return plan_query(create_filters(**criteria), self.db._statistics, indexed=('time',))
+
+    def test_conflicting_bounds_give_an_empty_plan(self):
+        self.assertTrue(self.plan(diameter_min=1.5, diameter_max=0.5).empty)
+        self.assertTrue(self.plan(start_date=datetime.date(2020, 10, 1),
+                                  end_date=datetime.date(2020, 4, 1)).empty)
+        self.assertTrue(self.plan(date=datetime.date(2020, 3, 2),
+                                  end_date=datetime.date(2020, 3, 1)).empty)
+
+    def test_min_and_max_merge_into_one_predicate(self):
+        plan = self.plan(distance_min=0.1, distance_max=0.4)
+        self.assertEqual(len(plan.predicates), 1)
+        self.assertEqual(plan.predicates[0].attr, 'distance')
+
+    def test_date_bounds_are_pushed_down_to_the_time_index(self):
+        plan = self.plan(start_date=datetime.date(2020, 3, 1), distance_max=0.4)
+        self.assertIn('time', plan.index_ranges)
+        self.assertEqual([predicate.attr for predicate in plan.predicates], ['distance'])
+
+    def test_most_selective_predicate_runs_first(self):
+        plan = self.plan(velocity_min=1, distance_max=0.001, hazardous=False)
+        self.assertEqual(plan.predicates[0].attr, 'distance')
+        self.assertEqual(plan.predicates[-1].attr, 'velocity')
+
+    def test_bitmap_attributes_restrict_the_rows_to_scan(self):
+        plan = plan_query(create_filters(hazardous=True, distance_max=0.05),
+                          self.db._statistics, bitmaps=self.db._bitmaps)
+        self.assertEqual(plan.bitmaps, [('hazardous', True)])
+        self.assertEqual([predicate.attr for predicate in plan.predicates], ['distance'])
+        plan = plan_query(create_filters(diameter_min=0.5, hazardous=False),
+                          self.db._statistics, bitmaps=self.db._bitmaps)
+        self.assertEqual(sorted(plan.bitmaps), [('diameter', True), ('hazardous', False)])
+        self.assertEqual([predicate.attr for predicate in plan.predicates], ['diameter'])
+
+    def test_other_callables_are_kept_as_row_filters(self):
+        filters = create_filters(distance_max=0.4) + [lambda approach: True]
+        plan = plan_query(filters, self.db._statistics)
+        self.assertEqual(len(plan.row_filters), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,58 @@
+"""Check the stage timings of `profiling` and where the tool records them.
+
+To run these tests from the project root, run::
+
+    $ python3 -m unittest --verbose tests.test_profiling
+"""
+import io
+import pathlib
+import unittest
+
+import profiling
+from database import NEODatabase
+from extract import load_neos, load_approaches
+
+
+TESTS_ROOT = (pathlib.Path(__file__).parent).resolve()
+TEST_NEO_FILE = TESTS_ROOT / 'test-neos-2020.csv'
+TEST_CAD_FILE = TESTS_ROOT / 'test-cad-2020.json'
+
+
+class TestProfiler(unittest.TestCase):
+    def test_stage_accumulates_time_and_rows(self):
+        profiler = profiling.Profiler()
+        for rows in (3, 4):
+            with profiler.stage('work') as timing:
+                timing.rows = rows
+        timing = profiler.stages['work']
+        self.assertEqual((timing.calls, timing.rows), (2, 7))
+        self.assertGreaterEqual(timing.wall, 0.0)
+
+    def test_stage_does_nothing_without_an_active_profiler(self):
+        self.assertIsNone(profiling.active())
+        with profiling.stage('work') as timing:
+            timing.rows = 1
+        profiler = profiling.Profiler()
+        with profiling.activate(profiler):
+            self.assertIs(profiling.active(), profiler)
+        self.assertIsNone(profiling.active())
+        self.assertEqual(profiler.stages, {})
+
+    def test_loading_and_linking_are_recorded(self):
+        profiler = profiling.Profiler()
+        with profiling.activate(profiler):
+            NEODatabase(load_neos(TEST_NEO_FILE), load_approaches(TEST_CAD_FILE))
+        self.assertEqual(list(profiler.stages),
+                         ['load_neos', 'load_approaches', 'link', 'build_columns'])
+        self.assertEqual(profiler.stages['load_approaches'].rows,
+                         profiler.stages['link'].rows)
+
+        output = io.StringIO()
+        profiler.report(file=output)
+        lines = output.getvalue().splitlines()
+        self.assertEqual(len(lines), 6)
+        self.assertTrue(lines[-1].startswith('total'))
+
+
+if __name__ == '__main__':
+    unittest.main()
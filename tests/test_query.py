@@ -13,12 +13,14 @@ To run these tests from the project root, run::
 These tests should pass when Tasks 3a and 3b are complete.
 """
 import datetime
+import operator
 import pathlib
 import unittest
 
 from database import NEODatabase
-from extract import load_neos, load_approaches
-from filters import create_filters
+from extract import APPROACH_FIELDS, load_data, load_neos, load_approaches
+from filters import (AttributeFilter, UnsupportedCriterionError, create_filters,
+                     filters_key, limit)
 
 
 TESTS_ROOT = (pathlib.Path(__file__).parent).resolve()
@@ -312,6 +314,46 @@ class TestQuery(unittest.TestCase):
 
         self.assertEqual(expected, received, msg="Computed results do not match expected results.")
 
+    def test_query_with_plain_callable_filter(self):
+        distance_max = 0.4
+
+        expected = set(
+            approach for approach in self.approaches
+            if approach.distance <= distance_max
+            and approach.neo.name is not None
+        )
+        self.assertGreater(len(expected), 0)
+
+        filters = create_filters(distance_max=distance_max)
+        filters.append(lambda approach: approach.neo.name is not None)
+        received = set(self.db.query(filters))
+
+        self.assertEqual(expected, received, msg="Computed results do not match expected results.")
+
+    def test_filters_called_per_row_match_query(self):
+        filters = create_filters(
+            start_date=datetime.date(2020, 3, 1), end_date=datetime.date(2020, 5, 31),
+            distance_max=0.5, velocity_min=5, diameter_max=1.5, hazardous=False
+        )
+        expected = set(
+            approach for approach in self.approaches
+            if all(filt(approach) for filt in filters)
+        )
+        self.assertGreater(len(expected), 0)
+
+        received = set(self.db.query(filters))
+        self.assertEqual(expected, received, msg="Computed results do not match expected results.")
+
+    def test_query_results_are_sorted_by_time(self):
+        received = [approach.time for approach in self.db.query(create_filters())]
+        self.assertEqual(received, sorted(approach.time for approach in self.approaches))
+
+    def test_limited_query_is_a_prefix_of_the_full_query(self):
+        filters = create_filters(start_date=datetime.date(2020, 4, 1), distance_max=0.1)
+        expected = list(self.db.query(filters))[:5]
+        self.assertEqual(len(expected), 5)
+        self.assertEqual(list(limit(self.db.query(filters), 5)), expected)
+
     ###########################
     # Combinations of filters #
     ###########################
@@ -528,6 +570,147 @@ class TestQuery(unittest.TestCase):
         received = set(self.db.query(filters))
         self.assertEqual(expected, received, msg="Computed results do not match expected results.")
 
+    def test_match_rows_agrees_with_query(self):
+        filters = create_filters(start_date=datetime.date(2020, 3, 1),
+                                 distance_max=0.1, hazardous=False)
+        rows = self.db.match_rows(filters)
+        self.assertEqual(list(self.db.approaches_at(rows)), list(self.db.query(filters)))
+
+    def test_compiled_filters_agree_with_filters(self):
+        for criteria in ({},
+                         {'date': datetime.date(2020, 3, 2)},
+                         {'start_date': datetime.date(2020, 3, 1),
+                          'end_date': datetime.date(2020, 3, 31), 'distance_max': 0.1},
+                         {'distance_min': 0.1, 'velocity_max': 20, 'hazardous': False},
+                         {'diameter_min': 0.5, 'diameter_max': 1.5, 'hazardous': True},
+                         {'distance_min': 0.5, 'distance_max': 0.1}):
+            with self.subTest(criteria=criteria):
+                filters = create_filters(**criteria)
+                compiled = create_filters(**criteria, compiled=True)
+                self.assertEqual(list(map(repr, compiled)), list(map(repr, filters)))
+                self.assertEqual(filters_key(compiled), filters_key(filters))
+                self.assertEqual([compiled(approach) for approach in self.approaches],
+                                 [all(filt(approach) for filt in filters)
+                                  for approach in self.approaches])
+                self.assertEqual(list(self.db.query(compiled)), list(self.db.query(filters)))
+
+    def test_compiled_filters_call_other_filters(self):
+        compiled = create_filters(distance_max=0.1, compiled=True)
+        compiled.append(lambda approach: approach.velocity > 10)
+        compiled = type(compiled)(compiled)
+        self.assertEqual([compiled(approach) for approach in self.approaches],
+                         [approach.distance <= 0.1 and approach.velocity > 10
+                          for approach in self.approaches])
+
+    def test_compiled_filters_follow_changes_to_the_list(self):
+        compiled = create_filters(distance_max=0.1, compiled=True)
+        self.assertTrue(any(compiled(approach) for approach in self.approaches))
+        compiled.append(lambda approach: False)
+        self.assertFalse(any(compiled(approach) for approach in self.approaches))
+        compiled[-1] = lambda approach: approach.velocity > 10
+        self.assertEqual([compiled(approach) for approach in self.approaches],
+                         [approach.distance <= 0.1 and approach.velocity > 10
+                          for approach in self.approaches])
+        del compiled[:]
+        self.assertTrue(all(compiled(approach) for approach in self.approaches))
+
+    def test_compiled_filters_reject_unknown_attributes(self):
+        compiled = create_filters(compiled=True)
+        compiled.append(AttributeFilter(operator.le, 1, attr='colour'))
+        with self.assertRaises(UnsupportedCriterionError):
+            type(compiled)(compiled)(self.approaches[0])
+
+    def test_match_many_agrees_with_match_rows(self):
+        filter_sets = [create_filters(),
+                       create_filters(start_date=datetime.date(2020, 3, 1),
+                                      end_date=datetime.date(2020, 3, 31)),
+                       create_filters(start_date=datetime.date(2020, 3, 1),
+                                      distance_max=0.1, hazardous=False),
+                       create_filters(distance_max=0.1, hazardous=True),
+                       create_filters(distance_max=0.1),
+                       create_filters(distance_min=0.5, distance_max=0.1),
+                       create_filters(date=datetime.date(1900, 1, 1))]
+        for filters, rows in zip(filter_sets, self.db.match_many(filter_sets)):
+            self.assertEqual(rows.tolist(), self.db.match_rows(filters).tolist())
+
+    def test_count_agrees_with_query(self):
+        for filters in (create_filters(),
+                        create_filters(start_date=datetime.date(2020, 3, 1),
+                                       end_date=datetime.date(2020, 3, 31)),
+                        create_filters(distance_max=0.1, hazardous=True),
+                        create_filters(distance_min=0.5, distance_max=0.1)):
+            self.assertEqual(self.db.count(filters), len(list(self.db.query(filters))))
+
+    def test_stats_agree_with_query(self):
+        filters = create_filters(velocity_min=20, hazardous=False)
+        matches = list(self.db.query(filters))
+        stats = self.db.stats(filters)
+        self.assertEqual(stats['count'], len(matches))
+        distances = [approach.distance for approach in matches]
+        self.assertAlmostEqual(stats['distance']['min'], min(distances))
+        self.assertAlmostEqual(stats['distance']['max'], max(distances))
+        self.assertAlmostEqual(stats['distance']['mean'], sum(distances) / len(distances))
+        velocities = [approach.velocity for approach in matches]
+        self.assertAlmostEqual(stats['velocity']['min'], min(velocities))
+
+    def test_sort_rows_selects_top_k(self):
+        filters = create_filters(start_date=datetime.date(2020, 3, 1))
+        rows = self.db.match_rows(filters)
+        matches = list(self.db.query(filters))
+        for by, key in (('distance', lambda approach: approach.distance),
+                        ('velocity', lambda approach: approach.velocity),
+                        ('time', lambda approach: approach.time)):
+            for descending in (False, True):
+                expected = sorted(matches, key=key, reverse=descending)
+                received = list(self.db.approaches_at(
+                    self.db.sort_rows(rows, by, descending=descending, k=20)))
+                self.assertEqual([key(approach) for approach in received],
+                                 [key(approach) for approach in expected[:20]])
+                self.assertEqual(len(list(self.db.sort_rows(rows, by, descending))), len(matches))
+
+    def test_sort_by_diameter_puts_missing_diameters_last(self):
+        rows = self.db.match_rows(create_filters())
+        for descending in (False, True):
+            diameters = [approach.neo.diameter for approach in
+                         self.db.approaches_at(self.db.sort_rows(rows, 'diameter', descending))]
+            known = [diameter for diameter in diameters if diameter == diameter]
+            self.assertGreater(len(known), 0)
+            self.assertEqual(diameters[:len(known)], sorted(known, reverse=descending))
+
+
+class TestQueryOptionalFields(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        neos, approaches, fields = load_data(TEST_NEO_FILE, TEST_CAD_FILE,
+                                             parallel=False, fields=APPROACH_FIELDS)
+        cls.values = {(approach._designation, approach.minutes):
+                      {name: column[row] for name, column in fields.items()}
+                      for row, approach in enumerate(approaches)}
+        cls.db = NEODatabase(neos, approaches, fields)
+
+    def expected(self, predicate, **criteria):
+        filters = create_filters(**criteria)
+        return [approach for approach in self.db._approaches
+                if all(filt(approach) for filt in filters)
+                and predicate(self.values[approach._designation, approach.minutes])]
+
+    def test_optional_field_filters(self):
+        for criteria, predicate in (
+                ({'dist_min_max': 0.01}, lambda values: values['dist_min'] <= 0.01),
+                ({'h_max': 22}, lambda values: values['h'] <= 22),
+                ({'v_inf_min': 20, 'hazardous': False},
+                 lambda values: values['v_inf'] >= 20)):
+            with self.subTest(criteria=criteria):
+                filters = create_filters(**criteria)
+                self.assertEqual(list(self.db.query(filters)),
+                                 self.expected(predicate, hazardous=criteria.get('hazardous')))
+                self.assertEqual(self.db.count(filters), len(list(self.db.query(filters))))
+
+    def test_optional_field_filters_need_the_columns(self):
+        database = NEODatabase(load_neos(TEST_NEO_FILE), load_approaches(TEST_CAD_FILE))
+        with self.assertRaises(UnsupportedCriterionError):
+            list(database.query(create_filters(h_max=22)))
+
 
 if __name__ == '__main__':
     unittest.main()
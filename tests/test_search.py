@@ -0,0 +1,92 @@
+"""Check the approximate name and designation search of `search.NameIndex`.
+
+To run these tests from the project root, run::
+
+    $ python3 -m unittest --verbose tests.test_search
+"""
+import pathlib
+import unittest
+
+from database import NEODatabase
+from extract import load_neos, load_approaches
+from search import NameIndex, edit_distance, normalize
+
+
+TESTS_ROOT = (pathlib.Path(__file__).parent).resolve()
+TEST_NEO_FILE = TESTS_ROOT / 'test-neos-2020.csv'
+TEST_CAD_FILE = TESTS_ROOT / 'test-cad-2020.json'
+
+
+class TestSearchHelpers(unittest.TestCase):
+    def test_normalize_ignores_case_and_whitespace(self):
+        self.assertEqual(normalize(' 2020  AY1 '), '2020ay1')
+        self.assertEqual(normalize('Halley'), normalize('HALLEY'))
+
+    def test_edit_distance(self):
+        self.assertEqual(edit_distance('kitten', 'sitting'), 3)
+        self.assertEqual(edit_distance('', 'eros'), 4)
+        self.assertEqual(edit_distance('toro', 'toro'), 0)
+        self.assertEqual(edit_distance('kitten', 'sitting', limit=1), 2)
+
+
+class TestNameIndex(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.neos = load_neos(TEST_NEO_FILE)
+        cls.index = NameIndex(cls.neos)
+
+    def test_exact_match_ignores_case(self):
+        matches = self.index.search('toro')
+        self.assertEqual(matches[0].kind, 'exact')
+        self.assertEqual(matches[0].neo.name, 'Toro')
+
+    def test_prefix_matches_are_sorted(self):
+        matches = [match for match in self.index.search('2020 AY', limit=100, field='designation')
+                   if match.kind == 'prefix']
+        self.assertGreater(len(matches), 0)
+        self.assertTrue(all(match.key.startswith('2020 AY') for match in matches))
+        self.assertEqual([match.key for match in matches],
+                         sorted(match.key for match in matches))
+
+    def test_fuzzy_matches_are_ranked_by_distance(self):
+        matches = self.index.search('Apopis')
+        self.assertEqual(matches[0].neo.name, 'Apophis')
+        self.assertEqual(matches[0].kind, 'fuzzy')
+        distances = [match.distance for match in matches]
+        self.assertEqual(distances, sorted(distances))
+
+    def test_fuzzy_search_agrees_with_linear_scan(self):
+        for query in ('2020 AY2', 'Adonsi', '2019 YK1'):
+            key = normalize(query)
+            expected = {neo.designation for neo in self.neos
+                        if any(0 < edit_distance(key, normalize(text)) <= 1
+                               for text in (neo.designation, neo.name or ''))
+                        and not any(normalize(text).startswith(key)
+                                    for text in (neo.designation, neo.name or ''))}
+            received = {match.neo.designation
+                        for match in self.index.search(query, limit=1000)
+                        if match.kind == 'fuzzy'}
+            self.assertEqual(received, expected)
+
+    def test_each_neo_matches_once(self):
+        matches = self.index.search('1685', limit=100)
+        self.assertEqual(len({id(match.neo) for match in matches}), len(matches))
+
+    def test_complete(self):
+        self.assertEqual(self.index.complete('tor', field='name'), ['Toro'])
+        completions = self.index.complete('2020 ay', field='designation')
+        self.assertIn('2020 AY1', completions)
+        self.assertEqual(completions, sorted(completions))
+        self.assertEqual(self.index.complete('Toro', field='designation'), [])
+
+
+class TestDatabaseSearch(unittest.TestCase):
+    def test_search_neos(self):
+        db = NEODatabase(load_neos(TEST_NEO_FILE), load_approaches(TEST_CAD_FILE))
+        self.assertIsNone(db.get_neo_by_name('hermes'))
+        match, = db.search_neos('hermes', limit=1)
+        self.assertIs(match.neo, db.get_neo_by_name('Hermes'))
+
+
+if __name__ == '__main__':
+    unittest.main()
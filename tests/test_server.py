@@ -0,0 +1,147 @@
+"""Check the answers of the HTTP/JSON query server.
+
+To run these tests from the project root, run:
+
+    $ python3 -m unittest --verbose tests.test_server
+"""
+import asyncio
+import datetime
+import json
+import pathlib
+import threading
+import unittest
+from unittest import mock
+
+from benchmarks.load_test import load_test
+from database import NEODatabase
+from extract import load_neos, load_approaches
+from filters import create_filters
+from server import NEOServer
+from write import _approach_dict
+
+
+TESTS_ROOT = (pathlib.Path(__file__).parent).resolve()
+TEST_NEO_FILE = TESTS_ROOT / 'test-neos-2020.csv'
+TEST_CAD_FILE = TESTS_ROOT / 'test-cad-2020.json'
+
+
+async def _get(port, path):
+    """Send a GET request on a new connection and read the whole response."""
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    writer.write(f'GET {path} HTTP/1.1\r\nConnection: close\r\n\r\n'.encode())
+    await writer.drain()
+    head, _, body = (await reader.read()).partition(b'\r\n\r\n')
+    writer.close()
+    status = int(head.split()[1])
+    if b'Transfer-Encoding: chunked' in head:
+        data = b''
+        while True:
+            size, _, body = body.partition(b'\r\n')
+            size = int(size, 16)
+            if not size:
+                break
+            data, body = data + body[:size], body[size + 2:]
+        body = data
+    return status, body.decode('utf-8')
+
+
+class TestServer(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.db = NEODatabase(load_neos(TEST_NEO_FILE), load_approaches(TEST_CAD_FILE))
+
+    def fetch(self, *paths):
+        """Start a server and fetch some paths from it concurrently."""
+        async def run():
+            server = await NEOServer(self.db, chunk_size=7).start(port=0)
+            port = server.sockets[0].getsockname()[1]
+            async with server:
+                return await asyncio.gather(*(_get(port, path) for path in paths))
+        return asyncio.run(run())
+
+    def test_query_streams_matches_as_json(self):
+        filters = create_filters(start_date=datetime.date(2020, 3, 1),
+                                 end_date=datetime.date(2020, 3, 31), distance_max=0.1)
+        expected = json.loads(json.dumps([_approach_dict(approach)
+                                          for approach in self.db.query(filters)]))
+        (status, body), (_, limited), (_, lines) = self.fetch(
+            '/query?start_date=2020-03-01&end_date=2020-03-31&distance_max=0.1',
+            '/query?start_date=2020-03-01&end_date=2020-03-31&distance_max=0.1&limit=3',
+            '/query?start_date=2020-03-01&end_date=2020-03-31&distance_max=0.1&format=ndjson')
+        self.assertEqual(status, 200)
+        self.assertEqual(json.loads(body), expected)
+        self.assertEqual(json.loads(limited), expected[:3])
+        self.assertEqual([json.loads(line) for line in lines.splitlines()], expected)
+
+    def test_query_aggregates_and_sorting(self):
+        (_, count), (_, named), (_, empty), (_, closest), (_, unlimited) = self.fetch(
+            '/query?hazardous=true&count=1', '/query?named=true&count=1',
+            '/query?date=1900-01-01', '/query?sort_by=distance&limit=2',
+            '/query?sort_by=distance&limit=0')
+        self.assertEqual(json.loads(count),
+                         {'count': self.db.count(create_filters(hazardous=True))})
+        self.assertEqual(json.loads(named),
+                         {'count': self.db.count(create_filters(named=True))})
+        self.assertEqual(json.loads(empty), [])
+        distances = [approach['distance_au'] for approach in json.loads(closest)]
+        self.assertEqual(distances, sorted(self.db._columns['distance'])[:2])
+        distances = [approach['distance_au'] for approach in json.loads(unlimited)]
+        self.assertEqual(distances, sorted(self.db._columns['distance']))
+
+    def test_inspect(self):
+        (status, body), (missing, _), (fuzzy, _) = self.fetch(
+            '/inspect?pdes=2020+AY1&verbose=1', '/inspect?pdes=nope',
+            '/inspect?pdes=2020ay1')
+        neo = self.db.get_neo_by_designation('2020 AY1')
+        self.assertEqual(status, 200)
+        self.assertEqual(json.loads(body)['designation'], '2020 AY1')
+        self.assertEqual(len(json.loads(body)['approaches']), len(neo.approaches))
+        self.assertEqual(missing, 404)
+        self.assertEqual(fuzzy, 200)
+
+    def test_slow_query_doesnt_block_other_connections(self):
+        release, returned = threading.Event(), threading.Event()
+
+        def count(filters):
+            release.wait(5)
+            returned.set()
+            return 0
+
+        async def run():
+            server = await NEOServer(self.db).start(port=0)
+            port = server.sockets[0].getsockname()[1]
+            async with server:
+                slow = asyncio.create_task(_get(port, '/query?count=1'))
+                status, _ = await _get(port, '/inspect?pdes=2020+AY1')
+                self.assertFalse(returned.is_set())
+                release.set()
+                return status, await slow
+
+        with mock.patch.object(self.db, 'count', count):
+            status, (slow_status, body) = asyncio.run(run())
+        self.assertEqual(status, 200)
+        self.assertEqual((slow_status, json.loads(body)), (200, {'count': 0}))
+
+    def test_errors(self):
+        statuses = [status for status, _ in self.fetch(
+            '/query?hazardous=maybe', '/query?colour=red', '/query?sort_by=name',
+            '/query?limit=-1', '/query?sort_by=distance&limit=-1', '/inspect',
+            '/nowhere')]
+        self.assertEqual(statuses, [400, 400, 400, 400, 400, 400, 404])
+
+    def test_load_test_reports_latencies(self):
+        async def run():
+            server = await NEOServer(self.db).start(port=0)
+            port = server.sockets[0].getsockname()[1]
+            async with server:
+                return await load_test(f'http://127.0.0.1:{port}',
+                                       ['/query?limit=5', '/query?count=1'], 4, 40)
+        results = asyncio.run(run())
+        self.assertEqual(results['requests'], 40)
+        self.assertEqual(results['errors'], 0)
+        self.assertLessEqual(results['p50_ms'], results['p99_ms'])
+        self.assertEqual(set(results['paths']), {'/query?limit=5', '/query?count=1'})
+
+
+if __name__ == '__main__':
+    unittest.main()
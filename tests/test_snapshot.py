@@ -0,0 +1,162 @@
+"""Check that a snapshot round-trips a database and goes stale with its sources.
+
+To run these tests from the project root, run:
+
+    $ python3 -m unittest --verbose tests.test_snapshot
+"""
+import concurrent.futures
+import datetime
+import math
+import os
+import pathlib
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+from database import NEODatabase
+from extract import load_data, load_neos, load_approaches
+from filters import create_filters
+from snapshot import load_snapshot, save_snapshot, snapshot_path
+
+
+TESTS_ROOT = (pathlib.Path(__file__).parent).resolve()
+TEST_NEO_FILE = TESTS_ROOT / 'test-neos-2020.csv'
+TEST_CAD_FILE = TESTS_ROOT / 'test-cad-2020.json'
+
+
+class TestSnapshot(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = pathlib.Path(tempfile.mkdtemp())
+        self.neofile = self.tmpdir / TEST_NEO_FILE.name
+        self.cadfile = self.tmpdir / TEST_CAD_FILE.name
+        shutil.copy(TEST_NEO_FILE, self.neofile)
+        shutil.copy(TEST_CAD_FILE, self.cadfile)
+        self.db = NEODatabase(load_neos(self.neofile), load_approaches(self.cadfile))
+        save_snapshot(self.db, self.neofile, self.cadfile)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_snapshot_is_written_next_to_cadfile(self):
+        self.assertTrue(snapshot_path(self.cadfile).exists())
+
+    def assertSameApproach(self, expected, received):
+        self.assertEqual(expected._designation, received._designation)
+        self.assertEqual(expected.time, received.time)
+        self.assertEqual(expected.distance, received.distance)
+        self.assertEqual(expected.velocity, received.velocity)
+        self.assertEqual(expected.neo is None, received.neo is None)
+        if expected.neo is not None:
+            self.assertEqual(expected.neo.designation, received.neo.designation)
+
+    def test_snapshot_round_trips_neos_and_approaches(self):
+        database = load_snapshot(self.neofile, self.cadfile)
+        neos, approaches = database._neos, database._approaches
+        self.assertEqual(len(neos), len(self.db._neos))
+        self.assertEqual(len(approaches), len(self.db._approaches))
+
+        for expected, received in zip(self.db._neos, neos):
+            self.assertEqual(expected.designation, received.designation)
+            self.assertEqual(expected.name, received.name)
+            self.assertEqual(expected.hazardous, received.hazardous)
+            if math.isnan(expected.diameter):
+                self.assertTrue(math.isnan(received.diameter))
+            else:
+                self.assertEqual(expected.diameter, received.diameter)
+            self.assertEqual(len(expected.approaches), len(received.approaches))
+
+        for expected, received in zip(self.db._approaches, approaches):
+            self.assertSameApproach(expected, received)
+
+    def test_snapshot_columns_are_adopted(self):
+        database = load_snapshot(self.neofile, self.cadfile)
+        for name, column in self.db._columns.items():
+            np.testing.assert_array_equal(database._columns[name], column)
+        for name, bitmap in self.db._bitmaps.items():
+            np.testing.assert_array_equal(database._bitmaps[name].mask(), bitmap.mask())
+        filters = create_filters(hazardous=True)
+        self.assertEqual(database.count(filters), self.db.count(filters))
+        self.assertEqual(database.stats(filters), self.db.stats(filters))
+        self.assertIsNotNone(database._lazy)
+
+    def test_snapshot_objects_are_created_on_first_use(self):
+        database = load_snapshot(self.neofile, self.cadfile)
+        filters = create_filters(start_date=datetime.date(2020, 3, 1), distance_max=0.1)
+        for expected, received in zip(self.db.query(filters), database.query(filters)):
+            self.assertSameApproach(expected, received)
+        rows = self.db.match_rows(filters)
+        self.assertEqual([id(approach) for approach in database.approaches_at(rows)],
+                         [id(approach) for approach in database.query(filters)])
+
+        neo = database.get_neo_by_designation('2020 AY1')
+        expected = self.db.get_neo_by_designation('2020 AY1')
+        self.assertEqual(len(neo.approaches), len(expected.approaches))
+        self.assertEqual(database.get_neo_by_name('Toro').designation,
+                         self.db.get_neo_by_name('Toro').designation)
+        self.assertIsNone(database.get_neo_by_designation('nope'))
+        lazy = database._lazy
+        self.assertIsNotNone(lazy)
+        self.assertLess(sum(approach is not None for approach in lazy.approaches),
+                        len(self.db._approaches))
+
+        # Creating the rest keeps the objects that were already handed out.
+        self.assertIs(database._neos[database._neo_positions['2020 AY1']], neo)
+        self.assertIsNone(database._lazy)
+        for approach in neo.approaches:
+            self.assertIs(approach.neo, neo)
+        self.assertEqual(sum(len(neo.approaches) for neo in database._neos),
+                         sum(len(neo.approaches) for neo in self.db._neos))
+
+    def test_concurrent_queries_see_whole_objects(self):
+        filters = create_filters()
+        expected = [(approach._designation, approach.minutes)
+                    for approach in self.db.query(filters)]
+        for _ in range(5):
+            database = load_snapshot(self.neofile, self.cadfile)
+            with concurrent.futures.ThreadPoolExecutor(max_workers=8) as pool:
+                results = list(pool.map(lambda _: list(database.query(filters)),
+                                        range(8)))
+            for approaches in results:
+                self.assertEqual([(approach._designation, approach.minutes)
+                                  for approach in approaches], expected)
+                self.assertTrue(all(approach.neo is None
+                                    or approach in approach.neo.approaches
+                                    for approach in approaches))
+
+    def test_snapshot_keeps_optional_fields(self):
+        self.assertIsNone(load_snapshot(self.neofile, self.cadfile, fields=['h']))
+        db = NEODatabase(*load_data(self.neofile, self.cadfile, parallel=False,
+                                    fields=['dist_min', 'h']))
+        save_snapshot(db, self.neofile, self.cadfile)
+        self.assertIsNone(load_snapshot(self.neofile, self.cadfile, fields=['v_inf']))
+        for fields in ((), ['h']):
+            with self.subTest(fields=fields):
+                database = load_snapshot(self.neofile, self.cadfile, fields=fields)
+                self.assertEqual(database.fields, ('dist_min', 'h'))
+                for name in database.fields:
+                    self.assertEqual(database._columns[name].dtype, db._columns[name].dtype)
+                    np.testing.assert_array_equal(database._columns[name],
+                                                  db._columns[name])
+                filters = create_filters(dist_min_max=0.01, h_max=25)
+                self.assertEqual(database.count(filters), db.count(filters))
+
+    def test_snapshot_is_stale_after_source_changes(self):
+        with open(self.cadfile, 'a') as cadfile:
+            cadfile.write('\n')
+        self.assertIsNone(load_snapshot(self.neofile, self.cadfile))
+
+    def test_snapshot_survives_touching_unchanged_source(self):
+        stat = os.stat(self.neofile)
+        os.utime(self.neofile, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+        self.assertIsNotNone(load_snapshot(self.neofile, self.cadfile))
+
+    def test_snapshot_is_keyed_by_source_paths(self):
+        other_neofile = self.tmpdir / 'other-neos.csv'
+        shutil.copy(self.neofile, other_neofile)
+        self.assertIsNone(load_snapshot(other_neofile, self.cadfile))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,102 @@
+"""Check that the SQLite backend answers like the in-memory `NEODatabase`.
+
+To run these tests from the project root, run:
+
+    $ python3 -m unittest --verbose tests.test_sqlite_database
+"""
+import datetime
+import pathlib
+import shutil
+import tempfile
+import unittest
+
+from database import NEODatabase
+from extract import load_neos, load_approaches
+from filters import create_filters
+from sqlite_database import SQLiteNEODatabase, import_data
+
+
+TESTS_ROOT = (pathlib.Path(__file__).parent).resolve()
+TEST_NEO_FILE = TESTS_ROOT / 'test-neos-2020.csv'
+TEST_CAD_FILE = TESTS_ROOT / 'test-cad-2020.json'
+
+CRITERIA = [
+    {},
+    {'date': datetime.date(2020, 3, 2)},
+    {'start_date': datetime.date(2020, 3, 1), 'end_date': datetime.date(2020, 3, 31),
+     'distance_max': 0.1},
+    {'velocity_min': 20, 'hazardous': True},
+    {'diameter_min': 0.5, 'diameter_max': 1.5, 'hazardous': False},
+    {'distance_min': 0.4, 'distance_max': 0.1},
+    {'named': True},
+    {'named': False, 'velocity_min': 20},
+]
+
+
+def _summary(approach):
+    """Identify a close approach by value."""
+    return approach._designation, approach.minutes, approach.distance, approach.velocity
+
+
+class TestSQLiteDatabase(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.tmpdir = pathlib.Path(tempfile.mkdtemp())
+        cls.path = cls.tmpdir / 'neos.sqlite'
+        cls.counts = import_data(cls.path, TEST_NEO_FILE, TEST_CAD_FILE, batch_size=1000)
+        cls.db = SQLiteNEODatabase(cls.path)
+        cls.memory = NEODatabase(load_neos(TEST_NEO_FILE), load_approaches(TEST_CAD_FILE))
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.db.close()
+        shutil.rmtree(cls.tmpdir)
+
+    def test_import_counts(self):
+        self.assertEqual(self.counts, (len(self.memory._neos), len(self.memory._approaches)))
+
+    def test_queries_match_in_memory_database(self):
+        for criteria in CRITERIA:
+            filters = create_filters(**criteria)
+            expected = [_summary(approach) for approach in self.memory.query(filters)]
+            received = [_summary(approach) for approach in self.db.query(filters)]
+            self.assertEqual(received, expected, msg=criteria)
+            self.assertEqual(self.db.count(filters), len(expected))
+
+    def test_stats_match_in_memory_database(self):
+        filters = create_filters(velocity_min=20, hazardous=True)
+        expected = self.memory.stats(filters)
+        received = self.db.stats(filters)
+        self.assertEqual(received['count'], expected['count'])
+        for name in ('distance', 'velocity'):
+            for key in ('min', 'max', 'mean'):
+                self.assertAlmostEqual(received[name][key], expected[name][key])
+        rows = self.db.match_rows(filters)
+        self.assertEqual(rows.dtype, self.memory.match_rows(filters).dtype)
+        self.assertEqual(self.db.summarize(rows)['count'], expected['count'])
+
+    def test_sorted_rows_match_in_memory_database(self):
+        filters = create_filters(start_date=datetime.date(2020, 6, 1))
+        expected = self.memory.approaches_at(
+            self.memory.sort_rows(self.memory.match_rows(filters), 'distance', k=10))
+        received = self.db.approaches_at(
+            self.db.sort_rows(self.db.match_rows(filters), 'distance', k=10))
+        self.assertEqual([_summary(approach) for approach in received],
+                         [_summary(approach) for approach in expected])
+
+    def test_get_neo_links_its_approaches(self):
+        neo = self.db.get_neo_by_name('Toro')
+        self.assertEqual(neo.designation, '1685')
+        self.assertIs(self.db.get_neo_by_designation('1685'), neo)
+        self.assertEqual([_summary(approach) for approach in neo.approaches],
+                         [_summary(approach) for approach in
+                          self.memory.get_neo_by_name('Toro').approaches])
+        self.assertTrue(all(approach.neo is neo for approach in neo.approaches))
+
+    def test_get_missing_neo(self):
+        self.assertIsNone(self.db.get_neo_by_designation('not-real-designation'))
+        self.assertIsNone(self.db.get_neo_by_name(''))
+
+
+if __name__ == '__main__':
+    unittest.main()
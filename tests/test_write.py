@@ -27,7 +27,8 @@ import unittest.mock
 
 from extract import load_neos, load_approaches
 from database import NEODatabase
-from write import write_to_csv, write_to_json
+from models import CloseApproach
+from write import write_to_csv, write_to_json, write_to_ndjson
 
 
 TESTS_ROOT = (pathlib.Path(__file__).parent).resolve()
@@ -131,6 +132,31 @@ class TestWriteToCSV(unittest.TestCase):
         self.assertGreater(len(rows), 0)
         self.assertSetEqual(set(fieldnames), set(rows[0].keys()))
 
+    def test_csv_data_matches_results(self):
+        buf = io.StringIO(self.value)
+        rows = tuple(csv.DictReader(buf))
+
+        for row, approach in zip(rows, build_results(5)):
+            self.assertEqual(row['datetime_utc'], approach.time_str)
+            self.assertEqual(float(row['distance_au']), approach.distance)
+            self.assertEqual(float(row['velocity_km_s']), approach.velocity)
+            self.assertEqual(row['designation'], approach.neo.designation)
+            self.assertEqual(row['name'], approach.neo.name or '')
+            self.assertIn(row['potentially_hazardous'], ('True', 'False'))
+
+    @unittest.mock.patch('write.open')
+    def test_csv_approach_without_time_has_empty_time(self, mock_file):
+        approach = build_results(1)[0]
+        untimed = CloseApproach(des=approach._designation, dist=approach.distance,
+                                v_rel=approach.velocity)
+        untimed.neo = approach.neo
+        with UncloseableStringIO() as buf:
+            mock_file.return_value = buf
+            write_to_csv([untimed, approach], None)
+            buf.seek(0)
+            rows = tuple(csv.DictReader(buf))
+        self.assertEqual([row['datetime_utc'] for row in rows], ['', approach.time_str])
+
 
 class TestWriteToJSON(unittest.TestCase):
     @classmethod
@@ -226,5 +252,35 @@ class TestWriteToJSON(unittest.TestCase):
         self.assertIsInstance(approach['neo']['potentially_hazardous'], bool)
 
 
+class TestWriteToNDJSON(unittest.TestCase):
+    @classmethod
+    @unittest.mock.patch('write.open')
+    def setUpClass(cls, mock_file):
+        results = build_results(5)
+
+        with UncloseableStringIO() as buf:
+            mock_file.return_value = buf
+            write_to_ndjson(iter(results), None)
+            buf.seek(0)
+            cls.value = buf.getvalue()
+
+    def test_ndjson_has_one_object_per_line(self):
+        lines = self.value.splitlines()
+        self.assertEqual(len(lines), 5)
+        for line in lines:
+            try:
+                self.assertIsInstance(json.loads(line), collections.abc.Mapping)
+            except json.JSONDecodeError as err:
+                raise self.failureException("write_to_ndjson produced an invalid JSON line") from err
+
+    def test_ndjson_lines_match_json_elements(self):
+        with UncloseableStringIO() as buf:
+            with unittest.mock.patch('write.open', return_value=buf):
+                write_to_json(build_results(5), None)
+            buf.seek(0)
+            expected = json.load(buf)
+        self.assertEqual([json.loads(line) for line in self.value.splitlines()], expected)
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -1,8 +1,12 @@
-"""Write a stream of close approaches to CSV or to JSON.
+"""Write a stream of close approaches to CSV, JSON or NDJSON.
 
-This module exports two functions: `write_to_csv` and `write_to_json`, each of
-which accept an `results` stream of close approaches and a path to which to
-write the data.
+This module exports three functions: `write_to_csv`, `write_to_json` and
+`write_to_ndjson`, each of which accept an `results` stream of close
+approaches and a path to which to write the data. Results are written as they
+are consumed from the stream, without collecting them first. The
+`CSVWriter`, `JSONWriter` and `NDJSONWriter` classes behind them are fed
+chunks of approaches instead, so several files can be written at once; the
+`WRITERS` dictionary maps each output file extension to one of them.
 
 These functions are invoked by the main module with the output of the `limit`
 function and the filename supplied by the user at the command line. The file's
@@ -13,10 +17,86 @@ You'll edit this file in Part 4.
 
 
 import csv
+import itertools
 import json
 import helpers
 
 
+# The number of results formatted and written to a CSV file at once.
+_CHUNK_SIZE = 4096
+
+# The size of the buffer of a CSV output file, in bytes.
+_BUFFER_SIZE = 1 << 20
+
+
+# The columns of a CSV output file.
+CSV_FIELDNAMES = ('datetime_utc', 'distance_au', 'velocity_km_s', 'designation',
+                  'name', 'diameter_km', 'potentially_hazardous')
+
+
+class _Writer:
+    """A base class for the writers of chunks of close approaches.
+
+    A writer is fed lists of approaches with `write` and finished with
+    `close`, so that one pass over a database can feed several output files
+    at once (see `main.batch`). It is also a context manager that closes it.
+    Subclasses open `self._file` and implement `write`.
+    """
+
+    def close(self):
+        """Close the file."""
+        self._file.close()
+
+    def __enter__(self):
+        """Return the writer itself, to be used in a `with` statement."""
+        return self
+
+    def __exit__(self, *exc_info):
+        """Close the writer at the end of a `with` statement."""
+        self.close()
+
+
+class CSVWriter(_Writer):
+    """Write chunks of close approaches to a CSV file, as `write_to_csv` does.
+
+    See `_Writer`.
+    """
+
+    def __init__(self, filename):
+        """Open a CSV file and write its header.
+
+        :param filename: A Path-like object pointing to where the data
+        should be saved.
+        """
+        self._file = open(filename, 'w', newline='', buffering=_BUFFER_SIZE)
+        self._writer = csv.writer(self._file)
+        self._writer.writerow(CSV_FIELDNAMES)
+        self._neo_columns = {}
+
+    def write(self, approaches):
+        """Write a list of `CloseApproach` objects as CSV rows.
+
+        The approach times of the list are formatted at once, and the NEO
+        columns are formatted once per NEO and shared by all of its
+        approaches.
+
+        :param approaches: A list of `CloseApproach` objects.
+        """
+        times = helpers.minutes_to_strs([res.minutes for res in approaches])
+        data_rows = []
+        for res, time_str in zip(approaches, times):
+            neo = res.neo
+            try:
+                name, diameter, hazardous = self._neo_columns[neo]
+            except KeyError:
+                name, diameter, hazardous = self._neo_columns[neo] = (
+                    neo.name if neo.name is not None else '',
+                    neo.diameter, neo.hazardous)
+            data_rows.append((time_str, res.distance, res.velocity,
+                              res._designation, name, diameter, hazardous))
+        self._writer.writerows(data_rows)
+
+
 def write_to_csv(results, filename):
     """Write an iterable of `CloseApproach` objects to a CSV file.
 
@@ -24,28 +104,94 @@ def write_to_csv(results, filename):
     row corresponds to the information in a single close approach from the
     `results` stream and its associated near-Earth object.
 
+    Results are consumed in chunks, and each chunk is written by a
+    `CSVWriter` with a single `writerows` call through a large file buffer.
+
     :param results: An iterable of `CloseApproach` objects.
     :param filename: A Path-like object pointing to where the data
     should be saved.
     """
-    fieldnames = ('datetime_utc', 'distance_au',
-                  'velocity_km_s', 'designation',
-                  'name', 'diameter_km',
-                  'potentially_hazardous')
+    results = iter(results)
+    with CSVWriter(filename) as writer:
+        while True:
+            chunk = list(itertools.islice(results, _CHUNK_SIZE))
+            if not chunk:
+                break
+            writer.write(chunk)
+
 
-    with open(filename, 'w') as csvfile:
-        f = csv.writer(csvfile)
-        f.writerow(fieldnames)
+def _approach_dict(res):
+    """Map a `CloseApproach` and its NEO to the JSON output structure.
 
-        for res in results:
-            data_row = (res.time, res.distance,
-                        res.velocity, res._designation,
-                        res.neo.name if res.neo.name is not None else '',
-                        res.neo.diameter, res.neo.hazardous)
+    :param res: A `CloseApproach` linked to its `NearEarthObject`.
+    :return: A dictionary, as described in `README.md`.
+    """
+    return {"datetime_utc": helpers.datetime_to_str(res.time),
+            "distance_au": res.distance,
+            "velocity_km_s": res.velocity,
+            "neo": {"designation": str(res._designation),
+                    "name": str(res.neo.name)
+                    if res.neo.name is not None else '',
+                    "diameter_km": res.neo.diameter,
+                    "potentially_hazardous": res.neo.hazardous
+                    }
+            }
+
+
+class JSONWriter(_Writer):
+    """Write chunks of close approaches to a JSON file, as `write_to_json` does.
+
+    See `_Writer`. The list is opened when the writer is created and
+    closed by `close`.
+    """
 
-            f.writerow(data_row)
+    def __init__(self, filename):
+        """Open a JSON file and start the list.
 
-        csvfile.close()
+        :param filename: A Path-like object pointing to where the data
+        should be saved.
+        """
+        self._file = open(filename, 'w')
+        self._file.write('[')
+        self._separator = ''
+
+    def write(self, approaches):
+        """Write an iterable of `CloseApproach` objects as list elements."""
+        for res in approaches:
+            self._file.write(self._separator)
+            self._file.write(json.dumps(_approach_dict(res)))
+            self._separator = ', '
+
+    def close(self):
+        """End the list and close the file."""
+        self._file.write(']')
+        super().close()
+
+
+class NDJSONWriter(_Writer):
+    """Write chunks of close approaches to an NDJSON file, as `write_to_ndjson` does.
+
+    See `_Writer`.
+    """
+
+    def __init__(self, filename):
+        """Open an NDJSON file.
+
+        :param filename: A Path-like object pointing to where the data
+        should be saved.
+        """
+        self._file = open(filename, 'w')
+
+    def write(self, approaches):
+        """Write an iterable of `CloseApproach` objects, one per line."""
+        for res in approaches:
+            self._file.write(json.dumps(_approach_dict(res)))
+            self._file.write('\n')
+
+
+# The writer of each output file extension.
+WRITERS = {'.csv': CSVWriter, '.json': JSONWriter,
+           '.ndjson': NDJSONWriter, '.jsonl': NDJSONWriter}
 
 
 def write_to_json(results, filename):
@@ -56,26 +202,28 @@ def write_to_json(results, filename):
     `CloseApproach` attributes to their values and the 'neo' key
     mapping to a dictionary of the associated NEO's attributes.
 
+    The list is written element by element as `results` is consumed, so
+    memory use doesn't grow with the number of results.
+
+    :param results: An iterable of `CloseApproach` objects.
+    :param filename: A Path-like object pointing to where the data
+    should be saved.
+    """
+    with JSONWriter(filename) as writer:
+        writer.write(results)
+
+
+def write_to_ndjson(results, filename):
+    """Write an iterable of `CloseApproach` objects to an NDJSON file.
+
+    Each line of the output is one JSON object, with the same structure as
+    the elements of the list written by `write_to_json`. Lines are written
+    as `results` is consumed, so a consumer can process the file while it is
+    still being written.
+
     :param results: An iterable of `CloseApproach` objects.
     :param filename: A Path-like object pointing to where the data
     should be saved.
     """
-    with open(filename, 'w') as jfile:
-        data_list = []
-
-        for res in results:
-            approcah_dict = {"datetime_utc": helpers.datetime_to_str(res.time),
-                             "distance_au": res.distance,
-                             "velocity_km_s": res.velocity,
-                             "neo": {"designation": str(res._designation),
-                                     "name": str(res.neo.name)
-                                     if res.neo.name is not None else '',
-                                     "diameter_km": res.neo.diameter,
-                                     "potentially_hazardous": res.neo.hazardous
-                                     }
-                             }
-
-            data_list.append(approcah_dict)
-
-        json.dump(data_list, jfile)
-        jfile.close()
+    with NDJSONWriter(filename) as writer:
+        writer.write(results)